@@ -0,0 +1,290 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#Applies UV operators to objects in many .blend files without opening the UI.
+#
+#Run from the root of the repository with
+#
+#   blender --background --factory-startup --python batch/batchUvTools.py -- [options] FILE...
+#
+#Each file is processed by its own background Blender instance.  Up to --jobs instances
+# run at once.
+#
+#Options:
+#   --operators LIST    Comma separated operators to apply in order (default: triplanar)
+#                       Available: triplanar, faces_to_grid, align_face_uvs, copy_symmetric
+#   --objects LIST      Comma separated object name patterns, eg Wall*,Floor_01 (default: all meshes)
+#   --set NAME=VALUE    Operator setting, eg --set triplanar.scale_u=2.  May be repeated.
+#   --select-all-faces  Apply to every face instead of the faces selected in each file
+#   --output-dir DIR    Save results to DIR instead of overwriting the input files
+#   --dry-run           Run the operators but do not save
+#   --jobs N            Number of Blender instances to run at once (default: 4)
+#   --timeout SECONDS   Give up on a file after this long (default: no limit)
+#   --report FILE       Write per-file results and a summary to FILE as JSON
+
+import bpy
+import sys
+import os
+import time
+import json
+import fnmatch
+import argparse
+import importlib
+import subprocess
+import tempfile
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+#Operator name -> (addon module, operator id, scene settings property)
+OPERATORS = {
+    "triplanar": ("triplanarUvUnwrap", "kitfox.triplanar_uv_unwrap", "triplanar_settings_props"),
+    "faces_to_grid": ("facesToGrid", "kitfox.face_uvs_to_grid_unwrap", "faces_to_grid_props"),
+    "align_face_uvs": ("facesToGrid", "kitfox.align_face_uvs", "faces_to_grid_props"),
+    "copy_symmetric": ("copySymmetricUvs", "kitfox.copy_symmetric_uvs", "kitfox_copy_symmetric_uvs"),
+}
+
+
+#Import addon modules directly from the source tree so the addon does not need to be installed
+def load_addon_module(name):
+    source_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "source")
+    if source_dir not in sys.path:
+        sys.path.insert(0, source_dir)
+    return importlib.import_module("operators." + name)
+
+
+#---------------------------
+#Worker.  Runs inside the Blender instance that has the file open.
+
+#Convert text from the command line to the type of an existing setting
+def parse_setting_value(current, text):
+    if isinstance(current, bool):
+        return text.lower() in ("1", "true", "yes", "on")
+    if isinstance(current, int):
+        return int(text)
+    if isinstance(current, float):
+        return float(text)
+    if isinstance(current, str):
+        return text
+    return [float(v) for v in text.split(",")]
+
+def apply_settings(scene, operators, settings):
+    for key, text in settings.items():
+        op_name, prop = key.split(".", 1)
+        if op_name not in operators:
+            continue
+        props = getattr(scene, OPERATORS[op_name][2])
+        setattr(props, prop, parse_setting_value(getattr(props, prop), text))
+
+def find_objects(patterns):
+    objs = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
+    if patterns:
+        objs = [obj for obj in objs if any(fnmatch.fnmatchcase(obj.name, p) for p in patterns)]
+    return objs
+
+def select_objects(objs):
+    view_layer = bpy.context.view_layer
+    if view_layer.objects.active != None and view_layer.objects.active.mode != 'OBJECT':
+        bpy.ops.object.mode_set(mode = 'OBJECT')
+
+    for obj in view_layer.objects:
+        obj.select_set(False)
+    for obj in objs:
+        obj.select_set(True)
+    view_layer.objects.active = objs[0]
+
+def run_worker(args):
+    result = {
+        "file": bpy.data.filepath,
+        "status": "ok",
+    }
+    t_start = time.perf_counter()
+
+    try:
+        operators = args.operators.split(",")
+        for name in sorted(set(OPERATORS[op][0] for op in operators)):
+            load_addon_module(name).register()
+
+        scene = bpy.context.scene
+        apply_settings(scene, operators, dict(s.split("=", 1) for s in args.set))
+
+        patterns = [p for p in args.objects.split(",") if p] if args.objects else []
+        objs = [obj for obj in find_objects(patterns) if obj.name in bpy.context.view_layer.objects]
+        result["objects"] = [obj.name for obj in objs]
+        result["faces"] = sum(len(obj.data.polygons) for obj in objs)
+
+        if len(objs) > 0:
+            select_objects(objs)
+            if args.select_all_faces:
+                for mesh in set(obj.data for obj in objs):
+                    mesh.polygons.foreach_set("select", [True] * len(mesh.polygons))
+
+            times = {}
+            for op_name in operators:
+                op_path = OPERATORS[op_name][1].split(".")
+                op = getattr(getattr(bpy.ops, op_path[0]), op_path[1])
+
+                t0 = time.perf_counter()
+                op_result = op()
+                times[op_name] = time.perf_counter() - t0
+                if 'FINISHED' not in op_result:
+                    raise RuntimeError("%s returned %s" % (op_name, str(op_result)))
+            result["operator_times"] = times
+
+        if not args.dry_run:
+            t0 = time.perf_counter()
+            if args.output_dir:
+                path = os.path.join(args.output_dir, os.path.basename(bpy.data.filepath))
+                bpy.ops.wm.save_as_mainfile(filepath = path, copy = True)
+            else:
+                path = bpy.data.filepath
+                bpy.ops.wm.save_mainfile()
+            result["saved_to"] = path
+            result["save_time"] = time.perf_counter() - t0
+
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = repr(e)
+        traceback.print_exc()
+
+    result["time"] = time.perf_counter() - t_start
+
+    with open(args.result, "w") as f:
+        json.dump(result, f)
+
+
+#---------------------------
+#Dispatcher.  Starts one background Blender per file.
+
+def worker_command(args, path, result_path):
+    cmd = [bpy.app.binary_path, "--background", "--factory-startup", path,
+        "--python", os.path.abspath(__file__), "--",
+        "--worker", "--result", result_path,
+        "--operators", args.operators]
+    if args.objects:
+        cmd += ["--objects", args.objects]
+    for s in args.set:
+        cmd += ["--set", s]
+    if args.select_all_faces:
+        cmd.append("--select-all-faces")
+    if args.output_dir:
+        cmd += ["--output-dir", os.path.abspath(args.output_dir)]
+    if args.dry_run:
+        cmd.append("--dry-run")
+    return cmd
+
+def process_file(args, path, temp_dir, index):
+    result_path = os.path.join(temp_dir, "result_%d.json" % index)
+    t0 = time.perf_counter()
+
+    try:
+        proc = subprocess.run(worker_command(args, path, result_path),
+            stdout = subprocess.PIPE, stderr = subprocess.STDOUT, text = True, timeout = args.timeout)
+        log = proc.stdout
+    except subprocess.TimeoutExpired as e:
+        return {"file": path, "status": "timeout", "time": time.perf_counter() - t0}
+
+    if os.path.exists(result_path):
+        with open(result_path) as f:
+            result = json.load(f)
+    else:
+        #Blender exited before the worker finished, eg the file could not be opened
+        result = {"file": path, "status": "error", "error": "Blender exited with code %d" % proc.returncode}
+
+    result["file"] = path
+    result["wall_time"] = time.perf_counter() - t0
+    if result["status"] != "ok":
+        result["log"] = log[-4000:]
+    return result
+
+def run_dispatcher(args):
+    files = [os.path.abspath(f) for f in args.files]
+    missing = [f for f in files if not os.path.isfile(f)]
+    if missing:
+        raise SystemExit("Files not found: " + ", ".join(missing))
+
+    for op_name in args.operators.split(","):
+        if op_name not in OPERATORS:
+            raise SystemExit("Unknown operator %s.  Choose from %s" % (op_name, ", ".join(OPERATORS.keys())))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok = True)
+
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with ThreadPoolExecutor(max_workers = max(1, args.jobs)) as pool:
+            futures = [pool.submit(process_file, args, path, temp_dir, i) for i, path in enumerate(files)]
+
+            results = []
+            for future in futures:
+                result = future.result()
+                results.append(result)
+                print("%-8s %7.2fs  %s" % (result["status"], result["wall_time"] if "wall_time" in result else result["time"], result["file"]))
+    total_time = time.perf_counter() - t0
+
+    failed = [r for r in results if r["status"] != "ok"]
+    summary = {
+        "files": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "objects": sum(len(r.get("objects", [])) for r in results),
+        "faces": sum(r.get("faces", 0) for r in results),
+        "total_time": total_time,
+        "jobs": args.jobs,
+        "operators": args.operators.split(","),
+    }
+
+    print("\n%d files, %d succeeded, %d failed in %.2fs" % (summary["files"], summary["succeeded"], summary["failed"], total_time))
+    for r in failed:
+        print("  %s: %s" % (r["file"], r.get("error", r["status"])))
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"summary": summary, "results": results}, f, indent = 2)
+        print("Report written to " + args.report)
+
+    return len(failed) == 0
+
+
+#---------------------------
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(description = "Apply UV Tools operators to many .blend files")
+    parser.add_argument("files", nargs = "*")
+    parser.add_argument("--operators", default = "triplanar")
+    parser.add_argument("--objects", default = None)
+    parser.add_argument("--set", action = "append", default = [])
+    parser.add_argument("--select-all-faces", action = "store_true")
+    parser.add_argument("--output-dir", default = None)
+    parser.add_argument("--dry-run", action = "store_true")
+    parser.add_argument("--jobs", type = int, default = 4)
+    parser.add_argument("--timeout", type = float, default = None)
+    parser.add_argument("--report", default = None)
+
+    #Used when the script starts itself on a single file
+    parser.add_argument("--worker", action = "store_true")
+    parser.add_argument("--result", default = None)
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    if args.worker:
+        run_worker(args)
+    else:
+        if not run_dispatcher(args):
+            sys.exit(1)
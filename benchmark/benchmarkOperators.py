@@ -0,0 +1,403 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#Times the UV operators on generated meshes of increasing size.
+#
+#Run from the root of the repository with
+#
+#   blender --background --factory-startup --python benchmark/benchmarkOperators.py -- [options]
+#
+#Options:
+#   --out FILE          Write JSON results to FILE (default: print to stdout)
+#   --sizes LIST        Comma separated target face counts (default: 1000,16000,256000,1000000,4000000)
+#   --shapes LIST       Comma separated shapes from grid, suzanne, mixed (default: all)
+#   --operators LIST    Comma separated operator names to run (default: all)
+#   --modes LIST        Comma separated modes from OBJECT, EDIT (default: both)
+#   --repeat N          Number of timed runs per case (default: 3)
+
+import bpy
+import bmesh
+import mathutils
+import sys
+import os
+import math
+import time
+import json
+import argparse
+import importlib
+import platform
+import traceback
+
+DEFAULT_SIZES = [1000, 16000, 256000, 1000000, 4000000]
+SHAPES = ["grid", "suzanne", "mixed"]
+MODES = ["OBJECT", "EDIT"]
+
+#Brush stroke points and radius for each benchmark object, keyed by object name
+BRUSH_STROKES = {}
+
+
+#Import addon modules directly from the source tree so the addon does not need to be installed.
+# Modules are loaded individually so one that fails to load in background mode does not
+# prevent the others from being measured.
+def load_addon_module(name):
+    source_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "source")
+    if source_dir not in sys.path:
+        sys.path.insert(0, source_dir)
+    return importlib.import_module("operators." + name)
+
+
+#---------------------------
+#Mesh generation
+
+def new_mesh_object(name, bm):
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+def create_grid_bmesh(num_faces):
+    bm = bmesh.new()
+    bm.loops.layers.uv.new()
+    segs = max(1, int(math.sqrt(num_faces)))
+    bmesh.ops.create_grid(bm, x_segments = segs, y_segments = segs, size = 1, calc_uvs = True)
+    return bm
+
+def create_suzanne_bmesh(num_faces):
+    bm = bmesh.new()
+    bm.loops.layers.uv.new()
+    bmesh.ops.create_monkey(bm, calc_uvs = True)
+
+    #Each subdivision multiplies face count by four
+    while len(bm.faces) * 4 <= num_faces * 2:
+        bmesh.ops.subdivide_edges(bm, edges = bm.edges[:], cuts = 1, use_grid_fill = True)
+    return bm
+
+#Grid where a third of the quads are triangulated and pairs of the remaining quads are merged into n-gons
+def create_mixed_bmesh(num_faces):
+    bm = create_grid_bmesh(num_faces)
+    bm.faces.ensure_lookup_table()
+    segs = max(1, int(math.sqrt(num_faces)))
+
+    tri_faces = []
+    merge_edges = []
+    for i, face in enumerate(bm.faces):
+        col = i % segs
+        if i % 3 == 0:
+            tri_faces.append(face)
+        elif i % 3 == 1 and col + 1 < segs:
+            neighbor = bm.faces[i + 1]
+            for edge in face.edges:
+                if neighbor in edge.link_faces:
+                    merge_edges.append(edge)
+                    break
+
+    bmesh.ops.triangulate(bm, faces = tri_faces)
+    bmesh.ops.dissolve_edges(bm, edges = merge_edges)
+    return bm
+
+def create_benchmark_object(shape, num_faces):
+    if shape == "grid":
+        bm = create_grid_bmesh(num_faces)
+    elif shape == "suzanne":
+        bm = create_suzanne_bmesh(num_faces)
+    else:
+        bm = create_mixed_bmesh(num_faces)
+
+    obj = new_mesh_object("bench_%s_%d" % (shape, num_faces), bm)
+
+    mesh = obj.data
+    mesh.polygons.foreach_set("select", [True] * len(mesh.polygons))
+    mesh.polygons.active = 0
+    return obj
+
+def remove_object(obj):
+    mesh = obj.data
+    bpy.data.objects.remove(obj)
+    bpy.data.meshes.remove(mesh)
+
+def make_active(obj):
+    for o in bpy.context.view_layer.objects:
+        o.select_set(False)
+    obj.select_set(True)
+    bpy.context.view_layer.objects.active = obj
+
+def set_mode(obj, mode):
+    if obj.mode != mode:
+        bpy.ops.object.mode_set(mode = mode)
+    if mode == 'EDIT':
+        bpy.ops.mesh.select_all(action = 'SELECT')
+        bm = bmesh.from_edit_mesh(obj.data)
+        bm.faces.ensure_lookup_table()
+        bm.faces.active = bm.faces[0]
+
+#Points along the diagonal of the object's bounds, dropped onto its surface.  Returns the points 
+# in world space and a brush radius scaled to the object.
+def stroke_points(obj, num_points = 32):
+    bpy.context.view_layer.update()
+    
+    vertices = obj.data.vertices
+    co = [vertices[i].co for i in range(0, len(vertices), max(1, len(vertices) // 1000))]
+    lo = [min(p[i] for p in co) for i in range(3)]
+    hi = [max(p[i] for p in co) for i in range(3)]
+
+    points = []
+    for i in range(num_points):
+        t = .1 + .8 * i / (num_points - 1)
+        origin = (lo[0] + (hi[0] - lo[0]) * t, lo[1] + (hi[1] - lo[1]) * t, hi[2] + 1)
+        hit, location, normal, index = obj.ray_cast(origin, (0, 0, -1))
+        if hit:
+            points.append(obj.matrix_world @ location)
+
+    diagonal = math.sqrt(sum((hi[i] - lo[i]) ** 2 for i in range(3)))
+    return points, diagonal * .05
+
+
+#---------------------------
+#Operator cases.  Each case runs one timed action on the active object.
+
+#Raised by cases that do not apply to the current mode
+class SkipCase(Exception):
+    pass
+
+def run_operator(op):
+    result = op()
+    if 'FINISHED' not in result:
+        raise RuntimeError("Operator returned %s" % str(result))
+
+#Triplanar unwrap keeps a per mesh cache between runs.  The triplanar case clears it before
+# each timed run so it measures the full projection.  The triplanar_warm case measures a
+# rerun with the cache already built, as when only the scale settings change.
+def case_triplanar(obj):
+    run_operator(bpy.ops.kitfox.triplanar_uv_unwrap)
+
+def case_triplanar_warm(obj):
+    run_operator(bpy.ops.kitfox.triplanar_uv_unwrap)
+
+def prepare_triplanar_cold(obj):
+    load_addon_module("triplanarUvUnwrap").triplanar_caches.clear()
+
+def prepare_triplanar_warm(obj):
+    if obj.data.name_full not in load_addon_module("triplanarUvUnwrap").triplanar_caches:
+        case_triplanar_warm(obj)
+
+def case_faces_to_grid(obj):
+    run_operator(bpy.ops.kitfox.face_uvs_to_grid_unwrap)
+
+def case_copy_face_uvs(obj):
+    run_operator(bpy.ops.kitfox.copy_face_uvs_unwrap)
+
+def case_rot_uvs_cw(obj):
+    run_operator(bpy.ops.kitfox.rot_uvs_cw)
+
+def case_rot_uvs_ccw(obj):
+    run_operator(bpy.ops.kitfox.rot_uvs_ccw)
+
+def case_reverse_face_uvs(obj):
+    run_operator(bpy.ops.kitfox.reverse_face_uvs)
+
+def case_align_face_uvs(obj):
+    run_operator(bpy.ops.kitfox.align_face_uvs)
+
+def case_copy_symmetric(obj):
+    run_operator(bpy.ops.kitfox.copy_symmetric_uvs)
+
+#Create a plane control and move it through a series of projections
+def case_plane_projection(obj):
+    uvLayoutPlane = load_addon_module("uvLayoutPlane")
+    blenderUtil = load_addon_module("blenderUtil")
+
+    context = bpy.context
+    control = uvLayoutPlane.UvPlaneControl(context)
+    start = control.controlMtx.copy()
+    for i in range(8):
+        offset = mathutils.Matrix.Translation((.01 * i, .02 * i, 0))
+        control.updateProjectionMatrix(context, offset @ start)
+        
+        #Timers never fire in background mode, so run the deferred mesh update here
+        blenderUtil.flush_redraws()
+
+#Replay a brush stroke across the surface
+def case_brush_replay(obj):
+    uvBrushTool = load_addon_module("uvBrushTool")
+    meshUvBuffer = load_addon_module("meshUvBuffer")
+
+    points, radius = BRUSH_STROKES[obj.name]
+    buffer = meshUvBuffer.MeshUvBuffer(obj)
+    index = uvBrushTool.WorldVertexIndex(buffer.world_positions())
+    for i in range(1, len(points)):
+        faces = uvBrushTool.brush_dab_uvs(buffer, index, points[i], points[i - 1], radius, 1)
+        if faces is not None:
+            buffer.commit(faces)
+
+#Update the edit mesh after a uv only change, with Blender's default arguments and with the
+# uv only update the tools use.  The difference shows on meshes over about 500k faces.
+def require_edit_mode(obj):
+    if obj.mode != 'EDIT':
+        raise SkipCase("Edit mode only")
+
+def case_edit_update_full(obj):
+    require_edit_mode(obj)
+    bmesh.update_edit_mesh(obj.data)
+
+def case_edit_update_uv_only(obj):
+    require_edit_mode(obj)
+    meshUvBuffer = load_addon_module("meshUvBuffer")
+    meshUvBuffer.update_mesh_uvs(obj.data, True)
+
+OPERATORS = {
+    "triplanar": case_triplanar,
+    "triplanar_warm": case_triplanar_warm,
+    "faces_to_grid": case_faces_to_grid,
+    "copy_face_uvs": case_copy_face_uvs,
+    "rot_uvs_cw": case_rot_uvs_cw,
+    "rot_uvs_ccw": case_rot_uvs_ccw,
+    "reverse_face_uvs": case_reverse_face_uvs,
+    "align_face_uvs": case_align_face_uvs,
+    "copy_symmetric": case_copy_symmetric,
+    "plane_projection": case_plane_projection,
+    "brush_replay": case_brush_replay,
+    "edit_update_full": case_edit_update_full,
+    "edit_update_uv_only": case_edit_update_uv_only,
+}
+
+#Untimed setup run before each timed run of a case
+PREPARE = {
+    "triplanar": prepare_triplanar_cold,
+    "triplanar_warm": prepare_triplanar_warm,
+}
+
+#Modules providing the registered operators and scene settings used by the cases
+ADDON_MODULES = ["triplanarUvUnwrap", "facesToGrid", "copySymmetricUvs", "uvLayoutPlane", "uvBrushTool"]
+
+
+#---------------------------
+
+def time_case(case, obj, repeat, prepare = None):
+    times = []
+    for i in range(repeat):
+        if prepare != None:
+            prepare(obj)
+        t0 = time.perf_counter()
+        case(obj)
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return times
+
+def run_benchmarks(sizes, shapes, operators, modes, repeat):
+    registered = []
+    load_errors = {}
+    for name in ADDON_MODULES:
+        try:
+            module = load_addon_module(name)
+            module.register()
+            registered.append(module)
+        except Exception as e:
+            load_errors[name] = repr(e)
+
+    results = []
+
+    for shape in shapes:
+        for size in sizes:
+            t0 = time.perf_counter()
+            obj = create_benchmark_object(shape, size)
+            build_time = time.perf_counter() - t0
+
+            make_active(obj)
+            BRUSH_STROKES[obj.name] = stroke_points(obj)
+
+            num_faces = len(obj.data.polygons)
+            num_loops = len(obj.data.loops)
+            print("%s: %d faces, %d loops (built in %.2fs)" % (obj.name, num_faces, num_loops, build_time))
+
+            for mode in modes:
+                set_mode(obj, mode)
+
+                for op_name in operators:
+                    entry = {
+                        "shape": shape,
+                        "target_faces": size,
+                        "faces": num_faces,
+                        "loops": num_loops,
+                        "mode": mode,
+                        "operator": op_name,
+                    }
+
+                    try:
+                        times = time_case(OPERATORS[op_name], obj, repeat, PREPARE.get(op_name))
+                        entry["status"] = "ok"
+                        entry["times"] = times
+                        entry["min"] = times[0]
+                        entry["median"] = times[len(times) // 2]
+                        print("  %-8s %-18s min %.4fs  median %.4fs" % (mode, op_name, entry["min"], entry["median"]))
+                    except SkipCase as e:
+                        entry["status"] = "skipped"
+                        entry["reason"] = str(e)
+                    except Exception as e:
+                        entry["status"] = "error"
+                        entry["error"] = repr(e)
+                        print("  %-8s %-18s ERROR %s" % (mode, op_name, repr(e)))
+                        traceback.print_exc()
+
+                    results.append(entry)
+
+            set_mode(obj, 'OBJECT')
+            del BRUSH_STROKES[obj.name]
+            remove_object(obj)
+
+    for module in reversed(registered):
+        module.unregister()
+
+    return {
+        "blender_version": bpy.app.version_string,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeat": repeat,
+        "load_errors": load_errors,
+        "results": results,
+    }
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(description = "Benchmark UV Tools operators")
+    parser.add_argument("--out", default = None)
+    parser.add_argument("--sizes", default = ",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--shapes", default = ",".join(SHAPES))
+    parser.add_argument("--operators", default = ",".join(OPERATORS.keys()))
+    parser.add_argument("--modes", default = ",".join(MODES))
+    parser.add_argument("--repeat", type = int, default = 3)
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    report = run_benchmarks(
+        [int(s) for s in args.sizes.split(",")],
+        args.shapes.split(","),
+        args.operators.split(","),
+        args.modes.split(","),
+        max(1, args.repeat))
+
+    text = json.dumps(report, indent = 2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+        print("Results written to " + args.out)
+    else:
+        print(text)
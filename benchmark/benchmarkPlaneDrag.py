@@ -0,0 +1,214 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#Replays handle drags of the plane projection control on generated meshes and reports the
+# latency of each update.
+#
+#Run from the root of the repository with
+#
+#   blender --background --factory-startup --python benchmark/benchmarkPlaneDrag.py -- [options]
+#
+#Options:
+#   --out FILE              Write JSON results to FILE (default: print to stdout)
+#   --sizes LIST            Comma separated target face counts (default: 16000,256000,1000000)
+#   --shapes LIST           Comma separated shapes from grid, suzanne, mixed (default: grid,suzanne)
+#   --modes LIST            Comma separated modes from OBJECT, EDIT (default: both)
+#   --drags LIST            Comma separated drags from translate, scale, rotate (default: all)
+#   --steps N               Number of updates in each drag (default: 60)
+#   --preview-density F     Enable Preview While Dragging with this density (default: off)
+
+import bpy
+import mathutils
+import sys
+import os
+import math
+import time
+import json
+import argparse
+import platform
+import traceback
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from benchmarkOperators import load_addon_module, create_benchmark_object, remove_object, make_active, set_mode, MODES
+
+DEFAULT_SIZES = [16000, 256000, 1000000]
+DEFAULT_SHAPES = ["grid", "suzanne"]
+
+
+#Drags give the control matrix at step t, from 0 to 1, of a drag starting at matrix start
+
+def drag_translate(start, t):
+    return mathutils.Matrix.Translation(start.col[0].to_3d() * .5 * t) @ start
+
+def drag_scale(start, t):
+    return start @ mathutils.Matrix.Diagonal(mathutils.Vector((1 + t, 1 + t, 1, 1)))
+
+def drag_rotate(start, t):
+    pivot = (start @ mathutils.Vector((.5, .5, 0, 1))).to_3d()
+    axis = start.col[2].to_3d().normalized()
+    rot = mathutils.Matrix.Rotation(math.radians(90) * t, 4, axis)
+    return mathutils.Matrix.Translation(pivot) @ rot @ mathutils.Matrix.Translation(-pivot) @ start
+
+#Drag name -> (drag, name of the control handle that performs it)
+DRAGS = {
+    "translate": (drag_translate, "handle11"),
+    "scale": (drag_scale, "handle22"),
+    "rotate": (drag_rotate, "handleRotZ"),
+}
+
+
+#---------------------------
+
+#Run update and the mesh updates and redraws it queued, as happens before the next event in 
+# the interface.  Returns the profile record of the work done.
+def timed_update(profiler, flush_redraws, name, update):
+    record = profiler.ProfileRecord(name)
+    with profiler.profiler.resume(record):
+        update()
+        flush_redraws()
+    return record
+
+def replay_drag(context, control, drag_name, steps):
+    profiler = load_addon_module("profiler")
+    blenderUtil = load_addon_module("blenderUtil")
+
+    drag, handle_name = DRAGS[drag_name]
+    handle = getattr(control, handle_name)
+    start = control.controlMtx.copy()
+
+    #Handles report dragging while the mouse button is held, which is what enables preview mode
+    handle.dragging = True
+    records = []
+    for i in range(1, steps + 1):
+        matrix = drag(start, i / steps)
+        records.append(timed_update(profiler, blenderUtil.flush_redraws, "update",
+            lambda: control.updateProjectionMatrix(context, matrix)))
+    handle.dragging = False
+
+    release = timed_update(profiler, blenderUtil.flush_redraws, "release",
+        lambda: control.updateUvs(context))
+
+    times = np.array([r.total for r in records])
+    all_records = records + [release]
+    return {
+        "updates": len(records),
+        "mean": float(times.mean()),
+        "p50": float(np.percentile(times, 50)),
+        "p90": float(np.percentile(times, 90)),
+        "p99": float(np.percentile(times, 99)),
+        "max": float(times.max()),
+        "release": release.total,
+        "loops_written": sum(r.counters.get("loops written", 0) for r in all_records),
+        "mesh_updates": sum(r.counters.get("mesh updates", 0) for r in all_records),
+    }
+
+def run_benchmarks(sizes, shapes, modes, drags, steps, preview_density):
+    uvLayoutPlane = load_addon_module("uvLayoutPlane")
+    uvLayoutPlane.register()
+
+    context = bpy.context
+    props = context.scene.kitfox_uv_plane_layout_props
+    props.init_layout = 'BOUNDS'
+    props.selected_faces_only = True
+    props.use_preview = preview_density != None
+    if preview_density != None:
+        props.preview_density = preview_density
+
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            obj = create_benchmark_object(shape, size)
+            make_active(obj)
+
+            num_faces = len(obj.data.polygons)
+            print("%s: %d faces, %d loops" % (obj.name, num_faces, len(obj.data.loops)))
+
+            for mode in modes:
+                set_mode(obj, mode)
+
+                for drag_name in drags:
+                    entry = {
+                        "shape": shape,
+                        "target_faces": size,
+                        "faces": num_faces,
+                        "mode": mode,
+                        "drag": drag_name,
+                    }
+
+                    try:
+                        t0 = time.perf_counter()
+                        control = uvLayoutPlane.UvPlaneControl(context)
+                        entry["start_time"] = time.perf_counter() - t0
+
+                        entry.update(replay_drag(context, control, drag_name, steps))
+                        control.restoreUvs()
+                        entry["status"] = "ok"
+                        print("  %-8s %-10s p50 %.4fs  p90 %.4fs  p99 %.4fs  release %.4fs  %d loops written  %d mesh updates" % (
+                            mode, drag_name, entry["p50"], entry["p90"], entry["p99"], entry["release"], entry["loops_written"], entry["mesh_updates"]))
+                    except Exception as e:
+                        entry["status"] = "error"
+                        entry["error"] = repr(e)
+                        print("  %-8s %-10s ERROR %s" % (mode, drag_name, repr(e)))
+                        traceback.print_exc()
+
+                    results.append(entry)
+
+            set_mode(obj, 'OBJECT')
+            remove_object(obj)
+
+    uvLayoutPlane.unregister()
+
+    return {
+        "blender_version": bpy.app.version_string,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "steps": steps,
+        "preview_density": preview_density,
+        "results": results,
+    }
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(description = "Benchmark dragging the UV plane projection control")
+    parser.add_argument("--out", default = None)
+    parser.add_argument("--sizes", default = ",".join(str(s) for s in DEFAULT_SIZES))
+    parser.add_argument("--shapes", default = ",".join(DEFAULT_SHAPES))
+    parser.add_argument("--modes", default = ",".join(MODES))
+    parser.add_argument("--drags", default = ",".join(DRAGS.keys()))
+    parser.add_argument("--steps", type = int, default = 60)
+    parser.add_argument("--preview-density", type = float, default = None)
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    report = run_benchmarks(
+        [int(s) for s in args.sizes.split(",")],
+        args.shapes.split(","),
+        args.modes.split(","),
+        args.drags.split(","),
+        max(1, args.steps),
+        args.preview_density)
+
+    text = json.dumps(report, indent = 2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+        print("Results written to " + args.out)
+    else:
+        print(text)
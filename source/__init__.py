@@ -31,6 +31,21 @@ import importlib
 
 
 if "bpy" in locals():
+    if "profiler" in locals():
+        importlib.reload(profiler)
+    else:
+        from .operators import profiler
+
+    if "blenderUtil" in locals():
+        importlib.reload(blenderUtil)
+    else:
+        from .operators import blenderUtil
+
+    if "timeSlice" in locals():
+        importlib.reload(timeSlice)
+    else:
+        from .operators import timeSlice
+
     if "uvBrushTool" in locals():
         importlib.reload(uvBrushTool)
     else:
@@ -62,6 +77,9 @@ if "bpy" in locals():
         from .operators import uvToolsPanel
         
 else:
+    from .operators import profiler
+    from .operators import blenderUtil
+    from .operators import timeSlice
     from .operators import uvBrushTool
     from .operators import triplanarUvUnwrap
     from .operators import copySymmetricUvs
@@ -70,6 +88,8 @@ else:
     from .operators import facesToGrid
 
 def register():
+    profiler.register()
+    timeSlice.register()
     uvBrushTool.register()
     triplanarUvUnwrap.register()
     copySymmetricUvs.register()
@@ -85,4 +105,6 @@ def unregister():
     uvLayoutPlane.unregister()
     facesToGrid.unregister()
     uvToolsPanel.unregister()
+    timeSlice.unregister()
+    profiler.unregister()
 
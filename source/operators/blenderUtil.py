@@ -15,11 +15,133 @@
 
 import bpy
 import mathutils
+import gpu
+import time
+import numpy as np
+from .vecmath import *
+from gpu_extras.batch import batch_for_shader
+from .profiler import profiler
+
+#GPU objects are created on first draw so the addon can be imported and its non-interactive 
+# operators run when Blender has no GPU context, such as in background mode.
+_builtin_shaders = {}
+_batches = {}
+
+def get_builtin_shader(name):
+    shader = _builtin_shaders.get(name)
+    if shader == None:
+        shader = gpu.shader.from_builtin(name)
+        _builtin_shaders[name] = shader
+    return shader
+
+#Batch drawn with the given builtin shader.  Batches are cached by key, so content must not 
+# change between calls with the same key.
+def get_batch(key, shader_name, type, content):
+    batch = _batches.get(key)
+    if batch == None:
+        batch = batch_for_shader(get_builtin_shader(shader_name), type, content)
+        _batches[key] = batch
+    return batch
 
 def redraw_all_viewports(context):
-    for area in bpy.context.screen.areas: # iterate through areas in current screen
+    screen = bpy.context.screen
+    if screen == None:
+        #Running in background mode
+        return
+        
+    profiler.count("redraw requests")
+    for area in screen.areas: # iterate through areas in current screen
         if area.type == 'VIEW_3D':
             area.tag_redraw()
+
+#Coalesces redraw requests from modal tools.  Areas asking for a redraw are collected and 
+# tagged together, at most max_rate times a second, in every window.  Mesh updates can be
+# queued too so several edits between redraws cause a single update.
+class RedrawScheduler:
+    def __init__(self, max_rate = 60):
+        self.interval = 1 / max_rate
+        self.last_flush = 0
+        self.all_views = False
+        self.areas = set()
+        self.updates = {}
+        self.scheduled = False
+        #Timers are matched by identity, so keep one bound method to register and unregister
+        self.timer = self.flush_timer
+
+    #Call update before the next redraw of every 3D view.  A later request with the same key 
+    # replaces an update that has not run yet.
+    def request_update(self, key, update):
+        self.updates[key] = update
+        self.request()
+
+    #Request a redraw of area, or of every 3D view if area is None
+    def request(self, area = None):
+        if area == None:
+            self.all_views = True
+        else:
+            self.areas.add(area.as_pointer())
+        profiler.count("redraw requests")
+            
+        if self.scheduled:
+            return
+            
+        wait = self.last_flush + self.interval - time.perf_counter()
+        if wait <= 0:
+            self.flush()
+        else:
+            self.scheduled = True
+            bpy.app.timers.register(self.timer, first_interval = wait)
+
+    def flush_timer(self):
+        self.scheduled = False
+        self.flush()
+        return None
+        
+    def flush(self):
+        #A direct flush does the work of the pending timer, so cancel it and let the next 
+        # request schedule again
+        if self.scheduled:
+            self.scheduled = False
+            if bpy.app.timers.is_registered(self.timer):
+                bpy.app.timers.unregister(self.timer)
+            
+        updates = list(self.updates.values())
+        self.updates.clear()
+        for update in updates:
+            try:
+                update()
+            except ReferenceError:
+                #Data was removed before the update ran
+                pass
+    
+        wm = bpy.context.window_manager
+        if wm != None:
+            for window in wm.windows:
+                for area in window.screen.areas:
+                    if area.type == 'VIEW_3D' and (self.all_views or area.as_pointer() in self.areas):
+                        area.tag_redraw()
+                        
+        self.all_views = False
+        self.areas.clear()
+        self.last_flush = time.perf_counter()
+
+redraw_scheduler = RedrawScheduler()
+
+#Ask for area, or every 3D view if area is None, to be redrawn soon
+def request_redraw(area = None):
+    redraw_scheduler.request(area)
+
+#Run pending mesh updates and redraws now, eg before a modal tool finishes so its undo step 
+# holds the final mesh
+def flush_redraws():
+    redraw_scheduler.flush()
+
+#Grid scale of the 3D viewport.  Returns 1 when there is no viewport, such as when running in background mode.
+def get_grid_scale(context):
+    space = context.space_data
+    if space == None or space.type != 'VIEW_3D':
+        return 1
+    return space.overlay.grid_scale
     
 #Wrap Blender's ray_cast, since the way the method was called changed in verison 2.91
 def ray_cast_scene(context, viewlayer, ray_origin, view_vector):
@@ -29,27 +151,94 @@ def ray_cast_scene(context, viewlayer, ray_origin, view_vector):
         return context.scene.ray_cast(viewlayer, ray_origin, view_vector)
     
         
-def mesh_bounds_world(obj):
+#---------------------------
 
-    minCo = None
-    maxCo = None
+#Vertex positions of a mesh object as an (N, 3) array.
+# selected_faces_only - only include vertices of selected faces
+def mesh_points(obj, selected_faces_only = False):
     mesh = obj.data
+    if obj.mode == 'EDIT':
+        obj.update_from_editmode()
+        
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    co = co.reshape(-1, 3).astype(np.float64)
+    
+    if not selected_faces_only:
+        return co
+        
+    num_faces = len(mesh.polygons)
+    select = np.empty(num_faces, dtype=bool)
+    mesh.polygons.foreach_get("select", select)
+    if select.all():
+        return co
+        
+    loop_total = np.empty(num_faces, dtype=np.int32)
+    loop_vert = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_total)
+    mesh.loops.foreach_get("vertex_index", loop_vert)
+    return co[np.unique(loop_vert[np.repeat(select, loop_total)])]
+
+#Bounds of the vertices of a mesh object.  Tools that already hold a snapshot of the mesh 
+# should call points_bounds on it instead, since this reads the mesh again.
+# world - measure in world space rather than local space
+# selected_faces_only - only include vertices of selected faces
+# matrix - if not None, measure in the space this matrix maps local coordinates into
+#Returns (min, max) numpy arrays, or None if there are no vertices.
+def mesh_bounds(obj, world = True, selected_faces_only = False, matrix = None):
+    if matrix is None and world:
+        matrix = obj.matrix_world
+    return points_bounds(mesh_points(obj, selected_faces_only), matrix)
     
-    for v in mesh.vertices:
-        pos = mathutils.Vector(v.co)
-        pos = obj.matrix_world @ pos
+#---------------------------
+
+#Selected objects that share a single mesh datablock
+class MeshGroup:
+    def __init__(self, obj):
+        self.mesh = obj.data
+        self.objects = [obj]
+        
+    #Object whose transform is used when the mesh is processed
+    @property
+    def obj(self):
+        return self.objects[0]
+        
+    #True if instances of this mesh have different world transforms, so world space tools 
+    # cannot produce uvs that suit all of them
+    def transforms_conflict(self, epsilon = 1e-5):
+        m0 = self.objects[0].matrix_world
+        for obj in self.objects[1:]:
+            m1 = obj.matrix_world
+            for i in range(4):
+                if (m1.col[i] - m0.col[i]).length > epsilon:
+                    return True
+        return False
     
-#            print("pos " + str(pos))
+
+#Group selected mesh objects by mesh datablock so linked duplicates are processed only once.
+# The active object is placed first in its group.
+def plan_mesh_groups(context):
+    groups = {}
+    active = context.active_object
     
-        if minCo == None:
-            minCo = mathutils.Vector(pos)
-            maxCo = mathutils.Vector(pos)
-        else:
-            minCo.x = min(minCo.x, pos.x)
-            minCo.y = min(minCo.y, pos.y)
-            minCo.z = min(minCo.z, pos.z)
-            maxCo.x = max(maxCo.x, pos.x)
-            maxCo.y = max(maxCo.y, pos.y)
-            maxCo.z = max(maxCo.z, pos.z)
+    for obj in context.selected_objects:
+        if obj.type != 'MESH':
+            continue
             
-    return (minCo, maxCo)
+        key = obj.data.as_pointer()
+        if key in groups:
+            group = groups[key]
+            if obj == active:
+                group.objects.insert(0, obj)
+            else:
+                group.objects.append(obj)
+        else:
+            groups[key] = MeshGroup(obj)
+
+    return list(groups.values())
+
+#Warn about meshes whose instances have different transforms.  For use by world space tools.
+def report_conflicting_transforms(operator, groups):
+    for group in groups:
+        if group.transforms_conflict():
+            operator.report({'WARNING'}, "Mesh '%s' is shared by %d objects with different transforms.  Using transform of '%s'." % (group.mesh.name, len(group.objects), group.obj.name))
@@ -17,6 +17,12 @@ import bpy
 import bmesh
 import mathutils
 import math
+import numpy as np
+from .meshUvBuffer import *
+from .vecmath import *
+from .blenderUtil import *
+from .profiler import *
+from .timeSlice import *
 
     
 #--------------------------------------
@@ -42,7 +48,7 @@ class CopySymmetricUvSettings(bpy.types.PropertyGroup):
 
 #--------------------------------------
 
-class CopySymmetricUvsOperator(bpy.types.Operator):
+class CopySymmetricUvsOperator(TimeSlicedOperator, bpy.types.Operator):
     """Copy UVs to faces that are symmetrically opposite of selected faces"""
     bl_idname = "kitfox.copy_symmetric_uvs"
     bl_label = "Copy Symmetric UVs"
@@ -56,111 +62,110 @@ class CopySymmetricUvsOperator(bpy.types.Operator):
     def __del__(self):
         super().__del__()
         
-    def findLoopMap(self, f0, f1, xform, epsilon):
-        #Compare vertex positions
-        if len(f0.loops) != len(f1.loops):
-            return None
-
-        indices = []
-
-        for loop0 in f0.loops:
-            pos0 = xform @ loop0.vert.co
-            foundMatch = False
+    #For each pair of faces (f0, f1), match every loop of f0 to the loop of f1 whose vertex 
+    # is at the mirrored position.
+    #Returns (src, dst) loop index arrays.  Pairs where any loop fails to match are dropped.
+    def findLoopMaps(self, buffer, f0, f1, mirror, epsilon):
+        src = []
+        dst = []
+        
+        co = buffer.vert_co
+        num_loops = buffer.loop_total[f0]
+        
+        for n in np.unique(num_loops).tolist():
+            group = num_loops == n
+            corners = np.arange(n)
+            loops0 = buffer.loop_start[f0[group]][:, None] + corners
+            loops1 = buffer.loop_start[f1[group]][:, None] + corners
+            
+            pos0 = co[buffer.loop_vert[loops0]] * mirror
+            pos1 = co[buffer.loop_vert[loops1]]
+            
+            close = np.linalg.norm(pos0[:, :, None, :] - pos1[:, None, :, :], axis = 3) < epsilon
+            matched = close.any(axis = 2).all(axis = 1)
+            
+            #First matching loop of f1 for each loop of f0
+            match = np.argmax(close[matched], axis = 2)
+            
+            src.append(loops0[matched].ravel())
+            dst.append(np.take_along_axis(loops1[matched], match, axis = 1).ravel())
             
+        if len(src) == 0:
+            return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        return (np.concatenate(src), np.concatenate(dst))
+        
+            
+    #Generator yielding progress, see timeSlice
+    def copy_symmetric_steps(self, groups, mirror, axisIdx, epsilon):
+        work = []
+        for group in groups:
+            buffer = MeshUvBuffer(group.obj)
+            selected = buffer.face_mask()
+            if not selected.any():
+                continue
+                
+            with profiler.phase("match faces"):
+                #Center of bounding box of each face
+                co = buffer.vert_co[buffer.loop_vert]
+                centers = (np.minimum.reduceat(co, buffer.loop_start, axis = 0) + np.maximum.reduceat(co, buffer.loop_start, axis = 0)) / 2
+            work.append((buffer, selected, centers))
             
-            for loop1 in f1.loops:
-                pos1 = loop1.vert.co
+            #Reading a large mesh can use up a whole slice
+            yield 0
             
-                dist = pos0 - pos1
-                if dist.magnitude < epsilon:
-                    foundMatch = True
-                    break
+        total = max(sum(np.count_nonzero(selected) for buffer, selected, centers in work), 1)
+        done = 0
+        copies = []
+        for buffer, selected, centers in work:
+            src = []
+            dst = []
+            for selectedFaces in face_chunks(np.flatnonzero(selected)):
+                with profiler.phase("match faces"):
+                    q, f1 = find_point_pairs_within(centers, centers[selectedFaces] * mirror, epsilon)
+                    f0 = selectedFaces[q]
+
+                    keep = f0 != f1
             
-            if not foundMatch:
-                return None
+                    #If both source face and reflection are selected, copy from positive side of axis to negative
+                    keep &= ~(selected[f1] & (centers[f1, axisIdx] > 0))
+
+                    keep &= buffer.loop_total[f0] == buffer.loop_total[f1]
+                    f0 = f0[keep]
+                    f1 = f1[keep]
+
+                    chunk_src, chunk_dst = self.findLoopMaps(buffer, f0, f1, mirror, epsilon)
+                src.append(chunk_src)
+                dst.append(chunk_dst)
                 
-            indices.append(loop1)
+                done += len(selectedFaces)
+                yield done / total
+                
+            copies.append((buffer, np.concatenate(src), np.concatenate(dst)))
 
-        return indices
-        
+        for buffer, src, dst in copies:
+            if len(dst) == 0:
+                continue
+
+            #Copy uv
+            buffer.uvs[dst] = buffer.uvs[src]
+            buffer.commit(np.unique(buffer.loop_face[dst]))
+        yield 1
             
-    def execute(self, context):
+    def make_steps(self, context):
         props = context.scene.kitfox_copy_symmetric_uvs
         epsilon = props.epsilon
         axis = props.axis
         
-        
-        
         if axis == 'X':
-            mMirror = mathutils.Matrix.Diagonal((-1, 1, 1))
-            axisVec = mathutils.Vector((1, 0, 0))
+            axisIdx = 0
         elif axis == 'Y':
-            mMirror = mathutils.Matrix.Diagonal((1, -1, 1))
-            axisVec = mathutils.Vector((0, 1, 0))
+            axisIdx = 1
         elif axis == 'Z':
-            mMirror = mathutils.Matrix.Diagonal((1, 1, -1))
-            axisVec = mathutils.Vector((0, 0, 1))
-    
-        for obj in context.selected_objects:
-            if obj.type != "MESH":
-                continue
-
-            l2w = obj.matrix_world
-            
-            mesh = obj.data
-            
-            if obj.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(mesh)
-            elif obj.mode == 'OBJECT':
-                bm = bmesh.new()
-                bm.from_mesh(mesh)
-    
-            uv_layer = bm.loops.layers.uv.verify()
-            
-            selectedFaces = []
-    
-            for f in bm.faces:
-                if f.select:
-                    selectedFaces.append(f)
-
-            for f0 in selectedFaces:
-                for f1 in bm.faces:
-                    if f0 == f1.loops:
-                        continue
-                        
-                    center0 = f0.calc_center_bounds()
-                    center1 = f1.calc_center_bounds()
-                    
-                    center1m = mMirror @ center1
-                    
-                    if (center0 - center1m).magnitude > epsilon:
-                        continue
-                        
-                    if f1.select:
-                        if axisVec.dot(center1) > 0:
-                            #If both source face and reflection are selected, copy from positive side of axis to negative
-                            continue
-                     
-                    loopMap = self.findLoopMap(f0, f1, mMirror, epsilon)
-                    if loopMap == None:
-                        continue
-
-                    #Copy uv
-                    for i in range(len(loopMap)):
-                        loop0 = f0.loops[i]
-                        loop1 = loopMap[i]
-                        loop1[uv_layer].uv = loop0[uv_layer].uv
-            
-
-            if obj.mode == 'EDIT':
-                bmesh.update_edit_mesh(mesh)
-            elif obj.mode == 'OBJECT':
-                bm.to_mesh(mesh)
-                bm.free()
+            axisIdx = 2
+        mirror = np.ones(3)
+        mirror[axisIdx] = -1
     
-        
-        
-        return {'FINISHED'}
+        return self.copy_symmetric_steps(plan_mesh_groups(context), mirror, axisIdx, epsilon)
 
 #---------------------------
 
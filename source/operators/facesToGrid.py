@@ -16,8 +16,13 @@
 import bpy
 import bmesh
 import math
+import numpy as np
 from enum import Enum
 from mathutils import *
+from .meshUvBuffer import *
+from .blenderUtil import *
+from .profiler import *
+from .timeSlice import *
 
 class FaceUvsToGridProperties(bpy.types.PropertyGroup):
     
@@ -59,123 +64,165 @@ class ShiftType(Enum):
     CW = 2
     CCW = 3
 
-def redraw_all_viewports(context):
-    for area in bpy.context.screen.areas: # iterate through areas in current screen
-        if area.type == 'VIEW_3D':
-            area.tag_redraw()
-
 
     
 def align_face_uvs(context):
     props = context.scene.faces_to_grid_props
-    uv_align_direction = props.uv_align_direction.to_3d()
+    uv_align_direction = np.array(props.uv_align_direction.to_3d())
 
-    for obj in context.selected_objects:
-        if obj.type != 'MESH':
+    for group in plan_mesh_groups(context):
+        buffer = MeshUvBuffer(group.obj)
+        faces = buffer.face_mask()
+        if not faces.any():
             continue
 
-    
-        mesh = obj.data
-        if obj.mode == 'EDIT':
-            bm = bmesh.from_edit_mesh(mesh)
-        elif obj.mode == 'OBJECT':
-            bm = bmesh.new()
-            bm.from_mesh(mesh)
-
-        uv_layer = bm.loops.layers.uv.verify()
-
-        # adjust uv coordinates
-        for face in bm.faces:
-            if face.select:
-#                print("---face")
-                uvs = []
-                weights = []
+        with profiler.phase("compute"):
+            loop_idx, corner, face_len = buffer.face_loops(faces)
+            weights = buffer.vert_co[buffer.loop_vert[loop_idx]] @ uv_align_direction
+            v = buffer.uvs[loop_idx, 1]
             
-                num_uvs = len(face.loops)
-                for i in range(num_uvs):
-                    loop = face.loops[i]
-                    uvs.append(loop[uv_layer].uv.copy())
-                    weights.append(uv_align_direction.dot(loop.vert.co))
-
-                #Find best weighted sum of Vs for all possible sequences of uvs
-                best_offset = -1
-                best_offset_sum = 0
-                for offset in range(num_uvs):
-                    sum = 0
-                    for i in range(num_uvs):
-                        sum += uvs[(i + offset) % num_uvs].y * weights[i]
-
-#                    print("offset " + str(offset) + " sum " + str(sum))
-                    
-                    if best_offset == -1 or sum > best_offset_sum:
-                        best_offset = offset
-                        best_offset_sum = sum
-
-#                print("best_offset " + str(best_offset) + " best_sum " + str(best_offset_sum))
-
-                for i in range(num_uvs):
-                    loop = face.loops[i]
-                    loop[uv_layer].uv = uvs[(i + best_offset) % num_uvs]
-    
+            #Find best weighted sum of Vs for all possible sequences of uvs.  Faces are 
+            # processed in groups with the same number of corners so each group is a 2D array.
+            src = loop_idx.copy()
+            for num_uvs in np.unique(face_len).tolist():
+                matching = face_len == num_uvs
+                matching_loops = loop_idx[matching].reshape(-1, num_uvs)
+                V = v[matching].reshape(-1, num_uvs)
+                W = weights[matching].reshape(-1, num_uvs)
+                
+                sums = np.stack([(np.roll(V, -offset, axis = 1) * W).sum(axis = 1) for offset in range(num_uvs)], axis = 1)
+                best_offset = np.argmax(sums, axis = 1)
+                
+                cols = (np.arange(num_uvs)[None, :] + best_offset[:, None]) % num_uvs
+                src[matching] = np.take_along_axis(matching_loops, cols, axis = 1).ravel()
 
-        if obj.mode == 'EDIT':
-            bmesh.update_edit_mesh(mesh)
-        elif obj.mode == 'OBJECT':
-            bm.to_mesh(mesh)
-            bm.free()
+            buffer.uvs[loop_idx] = buffer.uvs[src]
+        buffer.commit(faces)
         
     redraw_all_viewports(context)    
 
+#Returns (dst, src) loop index arrays such that uvs[dst] = uvs[src] shifts the uvs of each face
+def shift_permutation(loop_start, loop_total, shift_type):
+    loop_idx, corner, face_len = face_loop_ranges(loop_start, loop_total)
+    
+    if shift_type == ShiftType.CW:
+        src_corner = corner + 1
+        src_corner[src_corner == face_len] = 0
+    elif shift_type == ShiftType.CCW:
+        src_corner = corner - 1
+        src_corner[src_corner < 0] += face_len[src_corner < 0]
+    else:
+        src_corner = face_len - 1 - corner
+        
+    return (loop_idx, loop_idx - corner + src_corner)
+    
 def shift_face_uvs(context, shift_type):
-    props = context.scene.faces_to_grid_props
-    grid_cells_x = props.grid_cells_x
-    grid_cells_y = props.grid_cells_y
-    winding = props.winding
-
-    for obj in context.selected_objects:
-        if obj.type != 'MESH':
+    for group in plan_mesh_groups(context):
+        buffer = MeshUvBuffer(group.obj)
+        faces = buffer.face_mask()
+        if not faces.any():
             continue
 
-    
-        mesh = obj.data
-        if obj.mode == 'EDIT':
-            bm = bmesh.from_edit_mesh(mesh)
-        elif obj.mode == 'OBJECT':
-            bm = bmesh.new()
-            bm.from_mesh(mesh)
-
-
-        uv_layer = bm.loops.layers.uv.verify()
-
-        # adjust uv coordinates
-        for face in bm.faces:
-            if face.select:
-                uvs = []
-                num_uvs = len(face.loops)
-                for i in range(num_uvs):
-                    loop = face.loops[i]
-                    uvs.append(loop[uv_layer].uv.copy())
-
-                for i in range(num_uvs):
-                    loop = face.loops[i]
-                    if shift_type == ShiftType.CW:
-                        iNext = i + 1 if i < num_uvs - 1 else 0
-                    elif shift_type == ShiftType.CCW:
-                        iNext = i - 1 if i > 0 else num_uvs - 1
-                    else:
-                        iNext = num_uvs - 1 - i
-                        
-                    loop[uv_layer].uv = uvs[iNext]
-
-
-        if obj.mode == 'EDIT':
-            bmesh.update_edit_mesh(mesh)
-        elif obj.mode == 'OBJECT':
-            bm.to_mesh(mesh)
-            bm.free()
+        #Single gather over all selected loops
+        with profiler.phase("compute"):
+            dst, src = shift_permutation(buffer.loop_start[faces], buffer.loop_total[faces], shift_type)
+            buffer.uvs[dst] = buffer.uvs[src]
+        profiler.count("faces visited", int(np.count_nonzero(faces)))
+        
+        buffer.commit(faces)
         
     redraw_all_viewports(context)    
 
+#Copy the uvs of the active face onto the selected faces.  Faces with more corners than 
+# the active face reuse its last uv.
+def copy_active_face_uvs(buffer):
+    active = buffer.active_face
+    if active == None:
+        return None
+        
+    faces = buffer.face_mask()
+    faces[active] = False
+    if not faces.any():
+        return None
+
+    start = buffer.loop_start[active]
+    active_row = buffer.uvs[start:start + buffer.loop_total[active]].copy()
+    
+    loop_idx, corner, face_len = buffer.face_loops(faces)
+    buffer.uvs[loop_idx] = active_row[np.minimum(corner, len(active_row) - 1)]
+    return faces
+
+#Fit the uvs of each face to the corners of the grid cell containing the face's uv center
+def fit_faces_to_grid(buffer, faces, grid_cells_x, grid_cells_y, winding):
+    loop_idx, corner, face_len = buffer.face_loops(faces)
+    if len(loop_idx) == 0:
+        return
+        
+    uvs = buffer.uvs[loop_idx].astype(np.float64)
+    grid = np.array((grid_cells_x, grid_cells_y), dtype=np.float64)
+    
+    #Position of each face's first loop in the packed arrays
+    face_first = np.flatnonzero(corner == 0)
+    face_of = np.repeat(np.arange(len(face_first)), face_len[face_first])
+
+    uv_center = np.add.reduceat(uvs, face_first, axis = 0) / face_len[face_first][:, None]
+    cell = np.floor((uv_center - np.floor(uv_center)) * grid)
+    
+    uv_dir = uvs[face_first] - uv_center
+    uv_dir_sign = np.where(uv_dir < 0, -1.0, 1.0)
+    
+    #Signed area of each face in uv space
+    next_loop = np.arange(len(loop_idx))
+    next_loop = np.where(corner == face_len - 1, next_loop - corner, next_loop + 1)
+    cross = uvs[:, 0] * uvs[next_loop, 1] - uvs[:, 1] * uvs[next_loop, 0]
+    area = np.add.reduceat(cross, face_first)
+    
+    if winding == 'KEEP':
+        ccw = area >= 0
+    else:
+        ccw = np.full(len(face_first), winding == 'CCW')
+    
+    #Each corner rotates the sign vector another quarter turn.  A clockwise turn is three
+    # counter-clockwise ones.
+    turns = corner % 4
+    turns = np.where(ccw[face_of], turns, (4 - turns) % 4)
+    
+    sx = uv_dir_sign[face_of, 0]
+    sy = uv_dir_sign[face_of, 1]
+    rx = np.choose(turns, (sx, -sy, -sx, sy))
+    ry = np.choose(turns, (sy, sx, -sy, -sx))
+    
+    uv_pos = np.empty((len(loop_idx), 2), dtype=np.float64)
+    uv_pos[:, 0] = (rx + 1) / (2 * grid[0]) + cell[face_of, 0] / grid[0]
+    uv_pos[:, 1] = (ry + 1) / (2 * grid[1]) + cell[face_of, 1] / grid[1]
+    
+    buffer.uvs[loop_idx] = uv_pos
+
+#Generator yielding progress, see timeSlice
+def fit_faces_to_grid_steps(groups, grid_cells_x, grid_cells_y, winding):
+    work = []
+    for group in groups:
+        buffer = MeshUvBuffer(group.obj)
+        faces = np.flatnonzero(buffer.face_mask())
+        if len(faces) > 0:
+            work.append((buffer, faces))
+            
+        #Reading a large mesh can use up a whole slice
+        yield 0
+        
+    total = max(sum(len(faces) for buffer, faces in work), 1)
+    done = 0
+    for buffer, faces in work:
+        for chunk in face_chunks(faces):
+            with profiler.phase("compute"):
+                fit_faces_to_grid(buffer, chunk, grid_cells_x, grid_cells_y, winding)
+            done += len(chunk)
+            yield done / total
+            
+    for buffer, faces in work:
+        buffer.commit(faces)
+    yield 1
+
 #-------------------------------------
 
 class RotUvsCwOperator(bpy.types.Operator):
@@ -191,7 +238,8 @@ class RotUvsCwOperator(bpy.types.Operator):
 
 
     def execute(self, context):
-        shift_face_uvs(context, ShiftType.CW)
+        with profile_operator(context, self.bl_label):
+            shift_face_uvs(context, ShiftType.CW)
         return {'FINISHED'}
 
 #-------------------------------------
@@ -209,7 +257,8 @@ class RotUvsCcwOperator(bpy.types.Operator):
 
 
     def execute(self, context):
-        shift_face_uvs(context, ShiftType.CCW)
+        with profile_operator(context, self.bl_label):
+            shift_face_uvs(context, ShiftType.CCW)
         return {'FINISHED'}
 
 #-------------------------------------
@@ -227,7 +276,8 @@ class ReverseFaceUvsOperator(bpy.types.Operator):
 
 
     def execute(self, context):
-        shift_face_uvs(context, ShiftType.REVERSE)
+        with profile_operator(context, self.bl_label):
+            shift_face_uvs(context, ShiftType.REVERSE)
         return {'FINISHED'}
 
 #-------------------------------------
@@ -245,55 +295,16 @@ class CopyFaceUvsOperator(bpy.types.Operator):
         return obj and obj.type == 'MESH' and (obj.mode == 'EDIT' or obj.mode == 'OBJECT')
 #        return obj and obj.type == 'MESH' and obj.mode == 'OBJECT'
 
-
     def execute(self, context):
-        props = context.scene.faces_to_grid_props
-        grid_cells_x = props.grid_cells_x
-        grid_cells_y = props.grid_cells_y
-        winding = props.winding
-
-#        print("faceToGrid exec")
-
-        for obj in context.selected_objects:
-            if obj.type != 'MESH':
-                continue
-
-        
-            mesh = obj.data
-            if obj.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(mesh)
-            elif obj.mode == 'OBJECT':
-                bm = bmesh.new()
-                bm.from_mesh(mesh)
-
-
-            uv_layer = bm.loops.layers.uv.verify()
-
-#            print("obj " + obj.name)
-
-            active = bm.faces.active
-            if active == None:
-                continue
+        with profile_operator(context, self.bl_label):
+            for group in plan_mesh_groups(context):
+                buffer = MeshUvBuffer(group.obj)
+                with profiler.phase("compute"):
+                    faces = copy_active_face_uvs(buffer)
+                if faces is not None:
+                    buffer.commit(faces)
                 
-
-            # adjust uv coordinates
-            for face in bm.faces:
-                if face.select and face != active:
-
-                    for i in range(len(face.loops)):
-                        loop = face.loops[i]
-                        activeI = i if i < len(active.loops) else len(active.loops) - 1
-                        
-                        loop[uv_layer].uv = active.loops[activeI][uv_layer].uv.copy()
-
-
-            if obj.mode == 'EDIT':
-                bmesh.update_edit_mesh(mesh)
-            elif obj.mode == 'OBJECT':
-                bm.to_mesh(mesh)
-                bm.free()
-            
-        redraw_all_viewports(context)    
+            redraw_all_viewports(context)    
             
         return {'FINISHED'}
 
@@ -312,13 +323,14 @@ class AlignFaceUvsOperator(bpy.types.Operator):
         return obj and obj.type == 'MESH' and (obj.mode == 'EDIT' or obj.mode == 'OBJECT')
 
     def execute(self, context):
-        align_face_uvs(context)
+        with profile_operator(context, self.bl_label):
+            align_face_uvs(context)
         return {'FINISHED'}
 
 #-------------------------------------
 
 
-class FaceUvsToGridOperator(bpy.types.Operator):
+class FaceUvsToGridOperator(TimeSlicedOperator, bpy.types.Operator):
     """Set UVs per face so that they fit a grid square."""
     bl_idname = "kitfox.face_uvs_to_grid_unwrap"
     bl_label = "Face Uvs to Grid"
@@ -331,107 +343,9 @@ class FaceUvsToGridOperator(bpy.types.Operator):
         return obj and obj.type == 'MESH' and (obj.mode == 'EDIT' or obj.mode == 'OBJECT')
 #        return obj and obj.type == 'MESH' and obj.mode == 'OBJECT'
 
-    def execute(self, context):
+    def make_steps(self, context):
         props = context.scene.faces_to_grid_props
-        grid_cells_x = props.grid_cells_x
-        grid_cells_y = props.grid_cells_y
-        winding = props.winding
-
-#        print("--faceToGrid exec")
-
-        for obj in context.selected_objects:
-            if obj.type != 'MESH':
-                continue
-
-        
-            mesh = obj.data
-            if obj.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(mesh)
-            elif obj.mode == 'OBJECT':
-                bm = bmesh.new()
-                bm.from_mesh(mesh)
-
-            uv_layer = bm.loops.layers.uv.verify()
-
-#            print("obj " + obj.name)
-
-            # adjust uv coordinates
-            for face in bm.faces:
-                if face.select:
-
-                    uvCenter = None
-                    
-                    for loop in face.loops:
-                        if uvCenter == None:
-                            uvCenter = Vector(loop[uv_layer].uv)
-                        else:
-                            uvCenter += Vector(loop[uv_layer].uv)
-                            
-                    if uvCenter == None:
-                        uvCenter = Vector((0, 0))
-                        
-                    uvCenter *= 1.0 / len(face.loops)
-
-#                    print ("Uv center " + str(uvCenter))
-                    
-                    cell_x = int((uvCenter.x - math.floor(uvCenter.x)) * grid_cells_x)
-                    cell_y = int((uvCenter.y - math.floor(uvCenter.y)) * grid_cells_y)
-                        
-#                    print ("cell_x " + str(cell_x))
-#                    print ("cell_y " + str(cell_y))
-                    
-#                    print ("face.loops[0][uv_layer].uv " + str(face.loops[0][uv_layer].uv))
-                        
-                    uvDir = face.loops[0][uv_layer].uv - uvCenter
-                    uvDirSign = Vector((-1 if uvDir.x < 0 else 1, -1 if uvDir.y < 0 else 1))
-
-#                    print ("uvDir " + str(uvDir))
-#                    print ("uvDirSign " + str(uvDirSign))
-                    
-                    area = 0
-                    for i in range(len(face.loops)):
-                        loop0 = face.loops[i]
-                        loop1 = face.loops[0 if i == len(face.loops) - 1 else i + 1]
-                        
-                        uv0 = loop0[uv_layer].uv
-                        uv1 = loop1[uv_layer].uv
-                        area += uv0.x * uv1.y - uv0.y * uv1.x
-                    
-                    
-                    mT = Matrix.Translation((1, 1, 0))
-                    mS = Matrix.Diagonal((1.0 / (grid_cells_x * 2), 1.0 / (grid_cells_y * 2), 1, 1))
-                    mT2 = Matrix.Translation((cell_x / grid_cells_x, cell_y / grid_cells_y, 0))
-                    mUvXlate = mT2 @ mS @ mT
-                        
-                    for i in range(len(face.loops)):
-                        uvPos = mUvXlate @ uvDirSign.to_4d()
-#                        print ("- uvDirSign " + str(uvDirSign))
-#                        print ("- uvPos " + str(uvPos))
-                        
-                        face.loops[i][uv_layer].uv = uvPos.to_2d()
-
-                        ccw = (winding == 'KEEP' and area >= 0) or winding == 'CCW'
-                        if ccw:
-                            #CCW
-                            tmp = uvDirSign.y
-                            uvDirSign.y = uvDirSign.x
-                            uvDirSign.x = -tmp
-                        else:
-                            tmp = uvDirSign.x
-                            uvDirSign.x = uvDirSign.y
-                            uvDirSign.y = -tmp
-                        
-
-                    
-            if obj.mode == 'EDIT':
-                bmesh.update_edit_mesh(mesh)
-            elif obj.mode == 'OBJECT':
-                bm.to_mesh(mesh)
-                bm.free()
-            
-        redraw_all_viewports(context)    
-            
-        return {'FINISHED'}
+        return fit_faces_to_grid_steps(plan_mesh_groups(context), max(props.grid_cells_x, 1), max(props.grid_cells_y, 1), props.winding)
 
 
 #-------------------------------------
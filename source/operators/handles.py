@@ -17,11 +17,12 @@ import bpy
 import mathutils
 import math
 import gpu
+import numpy as np
 
-from gpu_extras.batch import batch_for_shader
 from bpy_extras import view3d_utils
 
 from .vecmath import *
+from .blenderUtil import *
 
 #---------------------------
 
@@ -85,6 +86,22 @@ class HandleBody:
         self.dragging = False
         self.viewportScale = 500
         
+    #Triangle corners as an (N, 3) array.  Shared by all bodies of the same class.
+    def coordsArray(self):
+        cls = type(self)
+        if cls.__dict__.get("_coordsArray") is None:
+            cls._coordsArray = np.array(self.coords, dtype=np.float64)
+        return cls._coordsArray
+
+    @property
+    def shader(self):
+        return get_builtin_shader('UNIFORM_COLOR')
+
+    #All bodies of the same class share one batch
+    @property
+    def batchShape(self):
+        return get_batch(type(self).__name__, 'UNIFORM_COLOR', 'TRIS', {"pos": self.coords})
+
     def setColor(self, color):
         self.color = color
 
@@ -148,23 +165,15 @@ class HandleBody:
         hM = mathutils.Matrix.Translation(trans) @ rot.to_matrix().to_4x4() @ mS
         l2w = hM @ self.transform
         
-        for i in range(len(self.coords) // 3):
-            p0 = self.coords[i * 3]
-            p1 = self.coords[i * 3 + 1]
-            p2 = self.coords[i * 3 + 2]
-            
-            p0w = l2w @ p0
-            p1w = l2w @ p1
-            p2w = l2w @ p2
-            
-            hit = intersect_triangle(p0w, p1w, p2w, pickOrigin, pickRay)
-            if hit != None:
-                # print("hit p0:%s p1:%s p2:%s " % (str(p0w), str(p1w), str(p2w)))
-                # print("hit pickOrigin:%s pickRay:%s" % (str(pickOrigin), str(pickRay)))
-            
-                return hit
+        m = np.array(l2w, dtype=np.float64)
+        tris = (self.coordsArray() @ m[:3, :3].T + m[:3, 3]).reshape(-1, 3, 3)
+        
+        hit, points = intersect_triangle_array(tris[:, 0], tris[:, 1], tris[:, 2], np.array(pickOrigin), np.array(pickRay))
+        if not hit.any():
+            return None
             
-        return None
+        #First triangle hit
+        return mathutils.Vector(points[np.argmax(hit)])
         
 
 class HandleBodyCube(HandleBody):
@@ -173,9 +182,6 @@ class HandleBodyCube(HandleBody):
     
         self.coords, normals, uvs = unitCube()
         
-        self.shader = gpu.shader.from_builtin('UNIFORM_COLOR')
-        self.batchShape = batch_for_shader(self.shader, 'TRIS', {"pos": self.coords})
-        
         
 
 class HandleBodySphere(HandleBody):
@@ -183,9 +189,6 @@ class HandleBodySphere(HandleBody):
         super().__init__(handle, transform, color, colorDrag)
     
         self.coords, normals, uvs = unitSphere()
-        
-        self.shader = gpu.shader.from_builtin('UNIFORM_COLOR')
-        self.batchShape = batch_for_shader(self.shader, 'TRIS', {"pos": self.coords})
 
 
 class HandleBodyCone(HandleBody):
@@ -193,9 +196,6 @@ class HandleBodyCone(HandleBody):
         super().__init__(handle, transform, color, colorDrag)
     
         self.coords, normals, uvs = unitCone(cap = True)
-        
-        self.shader = gpu.shader.from_builtin('UNIFORM_COLOR')
-        self.batchShape = batch_for_shader(self.shader, 'TRIS', {"pos": self.coords})
 
 
 class HandleBodyTorus(HandleBody):
@@ -203,9 +203,6 @@ class HandleBodyTorus(HandleBody):
         super().__init__(handle, transform, color, colorDrag)
     
         self.coords, normals, uvs = unitTorus(radius = 8, ring_radius = .3)
-        
-        self.shader = gpu.shader.from_builtin('UNIFORM_COLOR')
-        self.batchShape = batch_for_shader(self.shader, 'TRIS', {"pos": self.coords})
 
         
 #---------------------------
@@ -539,21 +536,16 @@ class HandleRotateAxis(Handle):
             startPointOffset = self.drag_start_pos - mouse_near_origin
             offsetPerpendicularToViewDir = startPointOffset.project(mouse_ray) - startPointOffset
 
-            print("self.drag_start_pos %s" % (str(self.drag_start_pos)))
 
             # print("posControl %s" % (str(self.posControl)))
             # print("offsetPerpToView %s" % (str(offsetPerpToView)))
             p0 = self.drag_start_pos
             p1 = self.drag_start_pos + offsetPerpendicularToViewDir
 
-            print("p0 %s" % (str(p0)))
-            print("p1 %s" % (str(p1)))
 
             p0 = self.start_constraint.constrain(p0, mouse_ray)
             p1 = self.start_constraint.constrain(p1, mouse_ray)
 
-            print("p0 const %s" % (str(p0)))
-            print("p1 const %s" % (str(p1)))
 
             # offset = self.constraint.constrain(offsetPerpToView, mouse_ray)
 
@@ -561,7 +553,6 @@ class HandleRotateAxis(Handle):
             
             origin = self.startControlProj @ self.pivot
 
-            print("origin %s" % (str(origin)))
 
             # v0 = self.drag_start_pos - origin
             # v1 = (self.drag_start_pos + offset) - origin
@@ -0,0 +1,335 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import bpy
+import bmesh
+import numpy as np
+from .profiler import profiler
+from .blenderUtil import redraw_scheduler
+
+
+#Expand a set of faces into the loops they contain.
+# loop_start, loop_total - per face arrays as stored in mesh.polygons
+#Returns (loop_idx, corner, face_len), one entry per loop.  corner is the position of the
+# loop within its face and face_len is the number of loops in that face.
+def face_loop_ranges(loop_start, loop_total):
+    loop_start = np.asarray(loop_start, dtype=np.int64)
+    loop_total = np.asarray(loop_total, dtype=np.int64)
+
+    face_len = np.repeat(loop_total, loop_total)
+    first = np.repeat(loop_start, loop_total)
+
+    #Offset of the first loop of each face within the packed output
+    packed_start = np.repeat(np.cumsum(loop_total) - loop_total, loop_total)
+    corner = np.arange(len(face_len), dtype=np.int64) - packed_start
+
+    return (first + corner, corner, face_len)
+
+#Returns matrix as a 4x4 numpy array
+def matrix_to_array(matrix):
+    return np.array(matrix, dtype=np.float64).reshape(4, 4)
+
+#Apply a 4x4 affine matrix to an (N, 3) array of points
+def transform_points(matrix, points):
+    m = matrix_to_array(matrix)
+    return points @ m[:3, :3].T + m[:3, 3]
+
+#Apply the inverse transpose of a 4x4 matrix to an (N, 3) array of normals.  Result is not normalized.
+def transform_normals(matrix, normals):
+    m = matrix_to_array(matrix)
+    n2w = np.linalg.inv(m[:3, :3]).T
+    return normals @ n2w.T
+
+
+#Tell Blender the uvs of a mesh changed.  Uv edits leave topology and triangulation alone, so
+# the edit mesh update skips recomputing them.
+def update_mesh_uvs(mesh, edit_mode):
+    profiler.count("mesh updates")
+    with profiler.phase("mesh update"):
+        if edit_mode:
+            bmesh.update_edit_mesh(mesh, loop_triangles = False, destructive = False)
+        else:
+            mesh.update()
+
+#Read the active uvs of bm in mesh loop order into the flat float32 array uvs.  Uv layers of a
+# mesh in edit mode report no data, even after update_from_editmode(), so the uvs are read
+# from a temporary copy of the edit mesh instead.
+def read_bmesh_uvs(bm, uvs):
+    tmp = bpy.data.meshes.new("uv_buffer_read")
+    try:
+        bm.to_mesh(tmp)
+        tmp.uv_layers.active.uv.foreach_get("vector", uvs)
+    finally:
+        bpy.data.meshes.remove(tmp)
+
+
+#---------------------------
+
+#Exposes the uvs and geometry of a mesh object as numpy arrays.
+#
+#In object mode all data is read and written with foreach_get/foreach_set.  Uvs go through
+# the layer's "vector" attribute values, which are copied as one block.  The older per loop
+# "uv" property is copied item by item and is many times slower on large meshes.
+#
+#In edit mode the edit mesh is flushed to the mesh data so it can be read in bulk, uvs are 
+# read from a temporary copy of the edit mesh, and only the loops passed to commit() whose 
+# uvs changed are written back through bmesh.  That write is a Python loop, so edit mode 
+# commits of very large selections are still slow.
+#
+# source - buffer of the same mesh read earlier by the same operator, such as for a linked 
+#   duplicate.  Its arrays are shared instead of reading the mesh again, which saves 
+#   flushing the edit mesh a second time.
+class MeshUvBuffer:
+    def __init__(self, obj, source = None):
+        self.obj = obj
+        self.mesh = obj.data
+        self.edit_mode = obj.mode == 'EDIT'
+
+        self.bm = None
+        self.bm_uv_layer = None
+
+        if source != None and source.mesh == self.mesh and source.edit_mode == self.edit_mode:
+            self.share(source)
+        else:
+            self.read()
+
+    def read(self):
+        with profiler.phase("read"):
+            self.read_arrays()
+
+    def share(self, source):
+        self.bm = source.bm
+        self.bm_uv_layer = source.bm_uv_layer
+        self.bm_uvs = source.bm_uvs
+        self.uv_layer = source.uv_layer
+        
+        self.loop_start = source.loop_start
+        self.loop_total = source.loop_total
+        self.face_select = source.face_select
+        self.loop_vert = source.loop_vert
+        self.uvs = source.uvs
+        self.active_face = source.active_face
+        self.counts = source.counts
+        
+        self._vert_co = source._vert_co
+        self._face_normals = source._face_normals
+        self._loop_face = source._loop_face
+        self._vert_loops = source._vert_loops
+
+    def read_arrays(self):
+        mesh = self.mesh
+
+        if self.edit_mode:
+            with profiler.phase("bmesh conversion"):
+                self.bm = bmesh.from_edit_mesh(mesh)
+                self.bm_uv_layer = self.bm.loops.layers.uv.verify()
+                self.obj.update_from_editmode()
+            profiler.count("conversions")
+        elif len(mesh.uv_layers) == 0:
+            mesh.uv_layers.new()
+
+        self.uv_layer = mesh.uv_layers.active
+
+        num_faces = len(mesh.polygons)
+        num_loops = len(mesh.loops)
+
+        self.loop_start = np.empty(num_faces, dtype=np.int32)
+        self.loop_total = np.empty(num_faces, dtype=np.int32)
+        self.face_select = np.empty(num_faces, dtype=bool)
+        mesh.polygons.foreach_get("loop_start", self.loop_start)
+        mesh.polygons.foreach_get("loop_total", self.loop_total)
+        mesh.polygons.foreach_get("select", self.face_select)
+
+        self.loop_vert = np.empty(num_loops, dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", self.loop_vert)
+
+        self.uvs = np.empty(num_loops * 2, dtype=np.float32)
+        if self.edit_mode:
+            read_bmesh_uvs(self.bm, self.uvs)
+        else:
+            self.uv_layer.uv.foreach_get("vector", self.uvs)
+        self.uvs.shape = (-1, 2)
+
+        profiler.count("loops read", num_loops)
+
+        #Uvs currently held by the edit mesh, so commits can skip loops that did not change
+        self.bm_uvs = self.uvs.copy() if self.edit_mode else None
+
+        active = mesh.polygons.active
+        self.active_face = active if 0 <= active < num_faces else None
+        
+        self.counts = self.topology_counts()
+
+        #Lazily read
+        self._vert_co = None
+        self._face_normals = None
+        self._loop_face = None
+        self._vert_loops = None
+
+    #Element counts of the mesh, or of the edit mesh in edit mode
+    def topology_counts(self):
+        if self.edit_mode:
+            bm = self.bm
+            return (len(bm.verts), len(bm.edges), len(bm.faces))
+        mesh = self.mesh
+        return (len(mesh.vertices), len(mesh.polygons), len(mesh.loops))
+        
+    #True if the buffer's loop indices may no longer match the mesh.  This happens when the 
+    # object changes mode, when its edit mesh is freed, as by undo or a mode toggle, or when 
+    # elements are added or removed.  Also True if the object was deleted.
+    def is_stale(self):
+        try:
+            if self.obj.mode != ('EDIT' if self.edit_mode else 'OBJECT'):
+                return True
+        except ReferenceError:
+            return True
+        if self.edit_mode and not self.bm.is_valid:
+            return True
+        return self.topology_counts() != self.counts
+
+    @property
+    def num_faces(self):
+        return len(self.loop_start)
+
+    @property
+    def num_loops(self):
+        return len(self.loop_vert)
+
+    #Vertex positions in local space
+    @property
+    def vert_co(self):
+        if self._vert_co is None:
+            co = np.empty(len(self.mesh.vertices) * 3, dtype=np.float32)
+            self.mesh.vertices.foreach_get("co", co)
+            self._vert_co = co.reshape(-1, 3).astype(np.float64)
+        return self._vert_co
+
+    #Face normals in local space
+    @property
+    def face_normals(self):
+        if self._face_normals is None:
+            normals = np.empty(self.num_faces * 3, dtype=np.float32)
+            self.mesh.polygons.foreach_get("normal", normals)
+            self._face_normals = normals.reshape(-1, 3).astype(np.float64)
+        return self._face_normals
+
+    #Index of the face each loop belongs to
+    @property
+    def loop_face(self):
+        if self._loop_face is None:
+            self._loop_face = np.repeat(np.arange(self.num_faces, dtype=np.int32), self.loop_total)
+        return self._loop_face
+
+    #Loops grouped by vertex.  Returns (order, start, count) where the loops of vertex v are
+    # order[start[v]:start[v] + count[v]].
+    @property
+    def vert_loops(self):
+        if self._vert_loops is None:
+            order = np.argsort(self.loop_vert, kind = 'stable')
+            count = np.bincount(self.loop_vert, minlength = len(self.mesh.vertices))
+            start = np.cumsum(count) - count
+            self._vert_loops = (order, start, count)
+        return self._vert_loops
+
+    #Loops of an array of vertex indices.  Returns (loops, vert_slot) where vert_slot is the 
+    # position in verts of the vertex of each loop.
+    def loops_of_verts(self, verts):
+        order, start, count = self.vert_loops
+        idx, corner, total = face_loop_ranges(start[verts], count[verts])
+        vert_slot = np.repeat(np.arange(len(verts)), count[verts])
+        return (order[idx], vert_slot)
+
+    def world_positions(self):
+        return transform_points(self.obj.matrix_world, self.vert_co)
+
+    #World positions of an array of vertex indices
+    def world_positions_of(self, verts):
+        return transform_points(self.obj.matrix_world, self.vert_co[verts])
+
+    #Position of the vertex of every loop
+    def loop_positions(self, world = True):
+        co = self.world_positions() if world else self.vert_co
+        return co[self.loop_vert]
+
+    def face_normals_world(self):
+        return transform_normals(self.obj.matrix_world, self.face_normals)
+
+    #Average of vertex positions of each face in local space
+    def face_centers(self):
+        co = self.vert_co[self.loop_vert]
+        sums = np.add.reduceat(co, self.loop_start, axis = 0) if self.num_faces > 0 else co[:0]
+        return sums / self.loop_total[:, None]
+
+    #Average of vertex positions of a single face in local space
+    def face_center(self, face):
+        start = self.loop_start[face]
+        return self.vert_co[self.loop_vert[start:start + self.loop_total[face]]].mean(axis = 0)
+
+    #Boolean mask of faces to operate on
+    def face_mask(self, selected_only = True):
+        if selected_only:
+            return self.face_select.copy()
+        return np.ones(self.num_faces, dtype=bool)
+
+    #Expand a face mask or array of face indices into its loops.  See face_loop_ranges().
+    def face_loops(self, faces):
+        loop_start = self.loop_start[faces]
+        profiler.count("faces visited", len(loop_start))
+        return face_loop_ranges(loop_start, self.loop_total[faces])
+
+    #Write uvs back to the mesh.
+    # faces - mask or indices of the faces whose uvs changed.  If None, all faces are written.
+    # deferred - if True, the mesh update is left to the redraw scheduler so modal tools making
+    #   several edits between redraws only update the mesh once.
+    def commit(self, faces = None, deferred = False):
+        if self.edit_mode:
+            self.write_editmode(faces)
+        else:
+            with profiler.phase("write uvs"):
+                self.uv_layer.uv.foreach_set("vector", self.uvs.ravel())
+            profiler.count("loops written", self.num_loops)
+            
+        mesh = self.mesh
+        edit_mode = self.edit_mode
+        if deferred:
+            redraw_scheduler.request_update(mesh.as_pointer(), lambda: update_mesh_uvs(mesh, edit_mode))
+        else:
+            update_mesh_uvs(mesh, edit_mode)
+
+    def write_editmode(self, faces):
+        if faces is None:
+            face_idx = np.arange(self.num_faces)
+        else:
+            faces = np.asarray(faces)
+            face_idx = np.flatnonzero(faces) if faces.dtype == bool else faces
+
+        if len(face_idx) > 0:
+            with profiler.phase("write uvs"):
+                bm = self.bm
+                uv_layer = self.bm_uv_layer
+                bm.faces.ensure_lookup_table()
+
+                loop_idx, corner, face_len = face_loop_ranges(self.loop_start[face_idx], self.loop_total[face_idx])
+                changed = (self.uvs[loop_idx] != self.bm_uvs[loop_idx]).any(axis = 1)
+                loop_idx = loop_idx[changed]
+                corner = corner[changed]
+                
+                self.bm_uvs[loop_idx] = self.uvs[loop_idx]
+                values = self.uvs[loop_idx].tolist()
+
+                for f, c, uv in zip(self.loop_face[loop_idx].tolist(), corner.tolist(), values):
+                    bm.faces[f].loops[c][uv_layer].uv = uv
+            profiler.count("loops written", len(values))
+
@@ -0,0 +1,252 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import bpy
+import os
+import csv
+import json
+import time
+
+
+#---------------------------
+
+#Timings and counters gathered during one operator execution or modal tick
+class ProfileRecord:
+    def __init__(self, name):
+        self.name = name
+        self.timestamp = time.time()
+        self.total = 0
+        self.phases = {}
+        self.counters = {}
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "total": self.total,
+            "phases": dict(self.phases),
+            "counters": dict(self.counters),
+        }
+
+
+class _NullScope:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+_null_scope = _NullScope()
+
+
+class _RecordScope:
+    def __init__(self, profiler, record, add):
+        self.profiler = profiler
+        self.record = record
+        self.add = add
+
+    def __enter__(self):
+        self.parent = self.profiler.current
+        self.profiler.current = self.record
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.record.total += time.perf_counter() - self.start
+        self.profiler.current = self.parent
+        if self.add:
+            self.profiler.add_record(self.record)
+        return False
+
+
+class _PhaseScope:
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        phases = self.record.phases
+        phases[self.name] = phases.get(self.name, 0) + time.perf_counter() - self.start
+        return False
+
+
+#Collects phase timings and counters.  Phases and counters are only recorded while a record
+# is open, so instrumented code costs almost nothing when profiling is switched off.
+class Profiler:
+    def __init__(self, max_records = 200):
+        self.current = None
+        self.records = []
+        self.max_records = max_records
+
+    #Open a new record.  Returns a context manager.
+    def record(self, name):
+        return _RecordScope(self, ProfileRecord(name), True)
+
+    #Continue timing a record that is not finished yet, such as work spread over several 
+    # timer ticks.  Call add_record() once it is complete.
+    def resume(self, record):
+        if record == None:
+            return _null_scope
+        return _RecordScope(self, record, False)
+
+    #Time a phase of the current record.  Returns a context manager.
+    def phase(self, name):
+        if self.current == None:
+            return _null_scope
+        return _PhaseScope(self.current, name)
+
+    def count(self, name, amount = 1):
+        if self.current != None:
+            counters = self.current.counters
+            counters[name] = counters.get(name, 0) + amount
+
+    def add_record(self, record):
+        #Idle modal ticks that did no measured work would otherwise flood the log
+        if len(record.phases) == 0:
+            return
+            
+        #Nested records are folded into their parent
+        if self.current != None:
+            parent = self.current
+            for key, value in record.phases.items():
+                parent.phases[key] = parent.phases.get(key, 0) + value
+            for key, value in record.counters.items():
+                parent.counters[key] = parent.counters.get(key, 0) + value
+            return
+
+        self.records.append(record)
+        if len(self.records) > self.max_records:
+            self.records.pop(0)
+
+    def clear(self):
+        self.records = []
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump([r.to_dict() for r in self.records], f, indent = 2)
+
+    #One row per measurement so records with different phases share the same columns
+    def export_csv(self, path):
+        with open(path, "w", newline = "") as f:
+            writer = csv.writer(f)
+            writer.writerow(["timestamp", "operator", "kind", "name", "value"])
+            for r in self.records:
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r.timestamp))
+                writer.writerow([stamp, r.name, "total", "total", "%.6f" % r.total])
+                for key, value in r.phases.items():
+                    writer.writerow([stamp, r.name, "phase", key, "%.6f" % value])
+                for key, value in r.counters.items():
+                    writer.writerow([stamp, r.name, "counter", key, value])
+
+
+profiler = Profiler()
+
+
+def profiling_enabled(context):
+    props = getattr(context.scene, "kitfox_profiler_props", None)
+    return props != None and props.enabled
+
+#Open a profile record for an operator or modal tick if profiling is enabled in the scene
+def profile_operator(context, name):
+    if not profiling_enabled(context):
+        return _null_scope
+    return profiler.record(name)
+
+
+#---------------------------
+
+class ProfilerSettings(bpy.types.PropertyGroup):
+    enabled : bpy.props.BoolProperty(
+        name="Enable Profiling",
+        description="Record timings and counters for each operator and modal tool update",
+        default = False
+    )
+
+    log_path : bpy.props.StringProperty(
+        name="Log File",
+        description="File profiling records are exported to.  A .json extension writes JSON, anything else writes CSV",
+        default = "//uvToolsProfile.csv",
+        subtype='FILE_PATH'
+    )
+
+    show_records : bpy.props.IntProperty(
+        name="Show Records",
+        description="Number of recent records to show in the panel",
+        default = 5,
+        min = 0,
+        soft_max = 20
+    )
+
+
+class ProfilerExportOperator(bpy.types.Operator):
+    """Write recorded profiling data to the log file"""
+    bl_idname = "kitfox.profiler_export"
+    bl_label = "Export Profile Log"
+
+    def execute(self, context):
+        props = context.scene.kitfox_profiler_props
+        path = bpy.path.abspath(props.log_path)
+
+        if props.log_path.startswith("//") and bpy.data.filepath == "":
+            self.report({'ERROR'}, "Save the file or use an absolute log path")
+            return {'CANCELLED'}
+
+        try:
+            if os.path.splitext(path)[1].lower() == ".json":
+                profiler.export_json(path)
+            else:
+                profiler.export_csv(path)
+        except OSError as e:
+            self.report({'ERROR'}, "Could not write profile log: " + str(e))
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "Wrote %d profile records to %s" % (len(profiler.records), path))
+        return {'FINISHED'}
+
+
+class ProfilerClearOperator(bpy.types.Operator):
+    """Discard recorded profiling data"""
+    bl_idname = "kitfox.profiler_clear"
+    bl_label = "Clear Profile"
+
+    def execute(self, context):
+        profiler.clear()
+        return {'FINISHED'}
+
+
+#---------------------------
+
+def register():
+    bpy.utils.register_class(ProfilerSettings)
+    bpy.utils.register_class(ProfilerExportOperator)
+    bpy.utils.register_class(ProfilerClearOperator)
+
+    bpy.types.Scene.kitfox_profiler_props = bpy.props.PointerProperty(type=ProfilerSettings)
+
+
+def unregister():
+    bpy.utils.unregister_class(ProfilerSettings)
+    bpy.utils.unregister_class(ProfilerExportOperator)
+    bpy.utils.unregister_class(ProfilerClearOperator)
+
+    del bpy.types.Scene.kitfox_profiler_props
+
+
+if __name__ == "__main__":
+    register()
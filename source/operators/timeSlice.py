@@ -0,0 +1,195 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import bpy
+import time
+from .profiler import *
+from .blenderUtil import *
+
+#Number of faces processed between checks of the time budget
+CHUNK_FACES = 50000
+
+
+#Long running tools are written as generators that do a slice of work between yields and
+# yield their progress as a fraction from 0 to 1.  execute() runs them to completion while
+# invoke() can spread them over timer ticks so the UI stays responsive.  Generators should 
+# also yield after reading each mesh so reading several large meshes is spread over ticks.
+
+#Run steps to completion
+def run_steps(steps):
+    for progress in steps:
+        pass
+
+#Split an array of face indices into slices of at most chunk_size faces
+def face_chunks(faces, chunk_size = CHUNK_FACES):
+    for start in range(0, len(faces), chunk_size):
+        yield faces[start:start + chunk_size]
+
+
+#---------------------------
+
+class TimeSliceSettings(bpy.types.PropertyGroup):
+    enabled : bpy.props.BoolProperty(
+        name="Run in Background",
+        description="Process large meshes in slices so the interface stays responsive.  Press Esc to cancel.",
+        default = True
+    )
+
+    min_faces : bpy.props.IntProperty(
+        name="Minimum Faces",
+        description="Meshes with fewer faces than this are processed all at once",
+        default = 200000,
+        min = 0
+    )
+
+    budget_ms : bpy.props.IntProperty(
+        name="Time Budget (ms)",
+        description="Time spent processing before the interface is updated",
+        default = 30,
+        min = 1,
+        soft_max = 200
+    )
+
+
+#Advances a step generator from bpy.app.timers, stopping each tick once the time budget is used up
+class TimeSlicedTask:
+    def __init__(self, steps, budget, record = None):
+        self.steps = steps
+        self.budget = budget
+        self.record = record
+
+        self.progress = 0
+        self.finished = False
+        self.cancelled = False
+        self.error = None
+
+    def start(self):
+        bpy.app.timers.register(self.tick)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def tick(self):
+        if self.cancelled:
+            self.steps.close()
+            self.finished = True
+            return None
+
+        end = time.perf_counter() + self.budget
+        try:
+            with profiler.resume(self.record):
+                while time.perf_counter() < end:
+                    self.progress = next(self.steps)
+        except StopIteration:
+            self.finished = True
+        except Exception as e:
+            self.error = e
+            self.finished = True
+
+        if self.finished:
+            if self.record != None:
+                profiler.add_record(self.record)
+            return None
+
+        #Give the interface a chance to redraw
+        return .001
+
+
+#Mixin for operators whose execute() runs a step generator.  Subclasses implement
+# make_steps(context), which does any setup that needs the context and returns the generator.
+#
+#Operator only modifies the mesh after the last step, so cancelling leaves it untouched
+# and a finished run is a single undo step.
+class TimeSlicedOperator:
+
+    def execute(self, context):
+        with profile_operator(context, self.bl_label):
+            steps = self.make_steps(context)
+            if steps != None:
+                run_steps(steps)
+            redraw_all_viewports(context)
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        settings = context.scene.kitfox_time_slice_props
+
+        num_faces = sum(len(obj.data.polygons) for obj in set(o for o in context.selected_objects if o.type == 'MESH'))
+        if not settings.enabled or num_faces < settings.min_faces or context.window == None:
+            return self.execute(context)
+
+        steps = self.make_steps(context)
+        if steps == None:
+            return {'FINISHED'}
+
+        record = ProfileRecord(self.bl_label) if profiling_enabled(context) else None
+        self._task = TimeSlicedTask(steps, settings.budget_ms / 1000, record)
+        self._task.start()
+
+        wm = context.window_manager
+        self._timer = wm.event_timer_add(.1, window = context.window)
+        wm.modal_handler_add(self)
+        self.update_status(context)
+        return {'RUNNING_MODAL'}
+
+    def update_status(self, context):
+        context.workspace.status_text_set("%s: %d%%   Esc to cancel" % (self.bl_label, int(self._task.progress * 100)))
+
+    def modal(self, context, event):
+        task = self._task
+
+        if task.finished:
+            context.window_manager.event_timer_remove(self._timer)
+            context.workspace.status_text_set(None)
+            redraw_all_viewports(context)
+
+            if task.error != None:
+                self.report({'ERROR'}, "%s failed: %s" % (self.bl_label, str(task.error)))
+                return {'CANCELLED'}
+            if task.cancelled:
+                self.report({'INFO'}, "%s cancelled" % (self.bl_label))
+                return {'CANCELLED'}
+            return {'FINISHED'}
+
+        if event.type == 'ESC':
+            task.cancel()
+            return {'RUNNING_MODAL'}
+
+        if event.type == 'TIMER':
+            self.update_status(context)
+
+        if event.type in {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'TRACKPADPAN', 'TRACKPADZOOM'}:
+            # allow navigation
+            return {'PASS_THROUGH'}
+
+        #Block edits to the mesh while it is being processed
+        return {'RUNNING_MODAL'}
+
+
+#---------------------------
+
+def register():
+    bpy.utils.register_class(TimeSliceSettings)
+
+    bpy.types.Scene.kitfox_time_slice_props = bpy.props.PointerProperty(type=TimeSliceSettings)
+
+
+def unregister():
+    bpy.utils.unregister_class(TimeSliceSettings)
+
+    del bpy.types.Scene.kitfox_time_slice_props
+
+
+if __name__ == "__main__":
+    register()
@@ -16,6 +16,13 @@
 import bpy
 import bmesh
 import mathutils
+import zlib
+import numpy as np
+from .meshUvBuffer import *
+from .vecmath import *
+from .blenderUtil import *
+from .profiler import *
+from .timeSlice import *
 
 
 class TriplanarSettings(bpy.types.PropertyGroup):
@@ -36,145 +43,144 @@ class TriplanarSettings(bpy.types.PropertyGroup):
         name="Use Grid Scale", description="If true, multiply coords by current grid size.", default = False
     )
 
-def redraw_all_viewports(context):
-    for area in bpy.context.screen.areas: # iterate through areas in current screen
-        if area.type == 'VIEW_3D':
-            area.tag_redraw()
-
-def map_editmode(context):
-    settings = context.scene.triplanar_settings_props
-
-    scale = context.space_data.overlay.grid_scale
-    use_grid_scale = settings.use_grid_scale
-    print("scale %s" % (str(scale)))
-    print("use_grid_scale %s" % (str(use_grid_scale)))
+#Project loops onto the world plane most closely facing their face normal.
+# buffer - MeshUvBuffer to read geometry from
+# faces - mask or indices of faces to project
+#Returns (loop_idx, axis, coords).  axis is the world axis each loop was projected along and
+# coords are the unscaled projected world coordinates.
+def triplanar_axes(buffer, faces):
+    loop_idx, corner, face_len = buffer.face_loops(faces)
     
-    for obj in context.selected_objects:
-        if obj.type != 'MESH':
-            continue
+    wco = transform_points(buffer.obj.matrix_world, buffer.vert_co[buffer.loop_vert[loop_idx]])
+    axis = closest_axis_array(buffer.face_normals[buffer.loop_face[loop_idx]])
+    use_x = axis == 0
+    use_y = axis == 1
     
-        l2w = obj.matrix_world
-        
-        me = obj.data
-        bm = bmesh.from_edit_mesh(me)
-#        bm = bmesh.new()
-#        bm.from_mesh(me)
-
-        uv_layer = bm.loops.layers.uv.verify()
-
-
-        # adjust uv coordinates
-        for face in bm.faces:
-            if face.select:
-                xAbs = abs(face.normal.x)
-                yAbs = abs(face.normal.y)
-                zAbs = abs(face.normal.z)
-
-                for loop in face.loops:
-                    loop_uv = loop[uv_layer]
-                    
-                    wco = l2w @ loop.vert.co
-                    
-                    # use xy position of the vertex as a uv coordinate
-                    uv = None
-                    if (xAbs > yAbs and xAbs > zAbs):
-                        uv = mathutils.Vector(wco.yz)
-                    elif (yAbs > zAbs):
-                        uv = mathutils.Vector(wco.xz)
-                    else:
-                        uv = mathutils.Vector(wco.xy)
-                    
-                    if settings.scale_uniform:
-                        uv.x /= settings.scale_u
-                        uv.y /= settings.scale_u
-                    else:
-                        uv.x /= settings.scale_u
-                        uv.y /= settings.scale_v
-                    
-                    if use_grid_scale:
-                        uv /= scale
-                        
-                    loop_uv.uv = uv
-
-        bmesh.update_edit_mesh(me)
-#        bm.to_mesh(me)
-#        bm.free()
-        
-    redraw_all_viewports(context)    
+    # use xy position of the vertex as a uv coordinate
+    coords = wco[:, 0:2].copy()
+    coords[use_x] = wco[use_x][:, 1:3]
+    coords[use_y] = wco[use_y][:, 0::2]
+    
+    return (loop_idx, axis, coords)
+
+#Project faces and write the result into the buffer's uvs
+def project_triplanar(buffer, faces, scale_u, scale_v):
+    loop_idx, axis, coords = triplanar_axes(buffer, faces)
+    buffer.uvs[loop_idx] = coords / (scale_u, scale_v)
 
 
-def map_objectmode(context):
-    settings = context.scene.triplanar_settings_props
-    scale = context.space_data.overlay.grid_scale
-    use_grid_scale = settings.use_grid_scale
-    print("scale %s" % (str(scale)))
-    print("use_grid_scale %s" % (str(use_grid_scale)))
+#---------------------------
+
+#Projection of every loop of a mesh from a previous run.  Rerunning with different scales only 
+# divides the cached coordinates, and only faces that have not been projected yet are computed.
+class TriplanarCache:
+    def __init__(self, key, num_loops, num_faces):
+        self.key = key
+        self.axis = np.zeros(num_loops, dtype=np.int8)
+        self.coords = np.zeros((num_loops, 2), dtype=np.float64)
+        self.face_valid = np.zeros(num_faces, dtype=bool)
+        
+    def project(self, buffer, faces):
+        loop_idx, axis, coords = triplanar_axes(buffer, faces)
+        self.axis[loop_idx] = axis
+        self.coords[loop_idx] = coords
+        self.face_valid[faces] = True
+        
+    #Write scaled uvs of faces that have been projected
+    def apply(self, buffer, faces, scale_u, scale_v):
+        loop_idx, corner, face_len = buffer.face_loops(faces)
+        buffer.uvs[loop_idx] = self.coords[loop_idx] / (scale_u, scale_v)
+
+#Cache is only valid for the transform and geometry it was built from
+def triplanar_cache_key(buffer):
+    crc = zlib.crc32(buffer.vert_co.tobytes())
+    crc = zlib.crc32(buffer.loop_vert.tobytes(), crc)
+    crc = zlib.crc32(buffer.loop_start.tobytes(), crc)
+    matrix = tuple(v for col in buffer.obj.matrix_world.col for v in col)
+    return (matrix, crc)
+
+#Caches by mesh name.  Oldest entries are dropped once there are more than MAX_TRIPLANAR_CACHES.
+triplanar_caches = {}
+MAX_TRIPLANAR_CACHES = 8
+
+def get_triplanar_cache(buffer):
+    name = buffer.mesh.name_full
+    with profiler.phase("cache key"):
+        key = triplanar_cache_key(buffer)
     
-    for obj in context.selected_objects:
-        if obj.type != 'MESH':
-            continue
+    cache = triplanar_caches.pop(name, None)
+    if cache == None or cache.key != key:
+        cache = TriplanarCache(key, buffer.num_loops, buffer.num_faces)
     
-        l2w = obj.matrix_world
+    triplanar_caches[name] = cache
+    while len(triplanar_caches) > MAX_TRIPLANAR_CACHES:
+        del triplanar_caches[next(iter(triplanar_caches))]
+    return cache
+
+#Returns (scale_u, scale_v).  settings can be the scene settings or the operator.
+def triplanar_scales(context, settings):
+    scale_u = settings.scale_u
+    scale_v = settings.scale_u if settings.scale_uniform else settings.scale_v
+    if settings.use_grid_scale:
+        scale = get_grid_scale(context)
+        scale_u *= scale
+        scale_v *= scale
+    return (scale_u, scale_v)
+
+#Edit mode only affects selected faces, object mode affects the entire mesh.  Generator 
+# yielding progress, see timeSlice.
+def map_uvs_steps(groups, scale_u, scale_v):
+    work = []
+    for group in groups:
+        buffer = MeshUvBuffer(group.obj)
+        faces = np.flatnonzero(buffer.face_mask(selected_only = buffer.edit_mode))
+        cache = get_triplanar_cache(buffer)
+        missing = faces[~cache.face_valid[faces]]
+        profiler.count("cached faces", len(faces) - len(missing))
+        work.append((buffer, faces, cache, missing))
         
-        me = obj.data
-#        bm = bmesh.from_edit_mesh(me)
-        bm = bmesh.new()
-        bm.from_mesh(me)
-
-        uv_layer = bm.loops.layers.uv.verify()
-
-
-        # adjust uv coordinates
-        for face in bm.faces:
-            xAbs = abs(face.normal.x)
-            yAbs = abs(face.normal.y)
-            zAbs = abs(face.normal.z)
-
-            for loop in face.loops:
-                loop_uv = loop[uv_layer]
-                
-                wco = l2w @ loop.vert.co
-                
-                # use xy position of the vertex as a uv coordinate
-                uv = None
-                if (xAbs > yAbs and xAbs > zAbs):
-                    uv = mathutils.Vector(wco.yz)
-                elif (yAbs > zAbs):
-                    uv = mathutils.Vector(wco.xz)
-                else:
-                    uv = mathutils.Vector(wco.xy)
-                
-                if settings.scale_uniform:
-                    uv.x /= settings.scale_u
-                    uv.y /= settings.scale_u
-                else:
-                    uv.x /= settings.scale_u
-                    uv.y /= settings.scale_v
-                    
-                if use_grid_scale:
-                    uv /= scale
-                        
-                loop_uv.uv = uv
-
-#        bmesh.update_edit_mesh(me)
-        bm.to_mesh(me)
-        bm.free()
+        #Reading a large mesh can use up a whole slice
+        yield 0
         
-    redraw_all_viewports(context)    
+    total = max(sum(len(missing) for buffer, faces, cache, missing in work), 1)
+    done = 0
+    for buffer, faces, cache, missing in work:
+        for chunk in face_chunks(missing):
+            with profiler.phase("compute"):
+                cache.project(buffer, chunk)
+            done += len(chunk)
+            yield done / total
+        
+    for buffer, faces, cache, missing in work:
+        with profiler.phase("rescale"):
+            cache.apply(buffer, faces, scale_u, scale_v)
+        buffer.commit(faces)
+    yield 1
         
 
-class TriplanarUvUnwrapOperator(bpy.types.Operator):
+class TriplanarUvUnwrapOperator(TimeSlicedOperator, bpy.types.Operator):
     """Perform cubemap projection using grid coodinates to generate uvs."""
     bl_idname = "kitfox.triplanar_uv_unwrap"
     bl_label = "Triplanar Unwrap"
     bl_options = {'REGISTER', 'UNDO'}
 
-    # scale: FloatProperty(
-        # name="Scale",
-        # description="Scale UVs by this",
-        # soft_min=0.1, soft_max=10.0,
-        # default=0.5,
-    # )
+    #Same as TriplanarSettings so they can be adjusted in the redo panel.  Values not passed to 
+    # the operator are taken from the scene settings, and the settings used are written back.
+    scale_uniform : bpy.props.BoolProperty(
+        name="Scale Uniform", description="If true, both axes will be scaled by the same amount.  Otherwise u and v scaling can be specified separately.", default = True, options={'SKIP_SAVE'}
+    )
+    
+    scale_u : bpy.props.FloatProperty(
+        name="U Scale", description="Scale of texture along horizon", default = 1, min=0, soft_max = 4, options={'SKIP_SAVE'}
+    )
+
+    scale_v : bpy.props.FloatProperty(
+        name="V Scale", description="Scale of texture along vertical", default = 1, min=0, soft_max = 4, options={'SKIP_SAVE'}
+    )
+
+    use_grid_scale : bpy.props.BoolProperty(
+        name="Use Grid Scale", description="If true, multiply coords by current grid size.", default = False, options={'SKIP_SAVE'}
+    )
 
     @classmethod
     def poll(cls, context):
@@ -182,13 +188,34 @@ class TriplanarUvUnwrapOperator(bpy.types.Operator):
         return obj and obj.type == 'MESH' and (obj.mode == 'EDIT' or obj.mode == 'OBJECT')
 #        return obj and obj.type == 'MESH' and obj.mode == 'OBJECT'
 
-    def execute(self, context):
-        obj = context.active_object
-        if obj.mode == 'EDIT':
-            map_editmode(context)
-        elif obj.mode == 'OBJECT':
-            map_objectmode(context)
-        return {'FINISHED'}
+    def make_steps(self, context):
+        groups = plan_mesh_groups(context)
+        report_conflicting_transforms(self, groups)
+        
+        self.sync_settings(context.scene.triplanar_settings_props)
+        scale_u, scale_v = triplanar_scales(context, self)
+        return map_uvs_steps(groups, scale_u, scale_v)
+
+    def sync_settings(self, settings):
+        for name in ("scale_uniform", "scale_u", "scale_v", "use_grid_scale"):
+            if self.properties.is_property_set(name):
+                setattr(settings, name, getattr(self, name))
+            else:
+                setattr(self, name, getattr(settings, name))
+
+    def draw(self, context):
+        layout = self.layout
+        
+        col = layout.column();
+        col.prop(self, "scale_uniform")
+        row = col.row()
+        if self.scale_uniform:
+            row.prop(self, "scale_u", text = "Scale")
+        else:
+            row.prop(self, "scale_u")
+            row.prop(self, "scale_v")
+            
+        col.prop(self, "use_grid_scale")
 
 
 # def menu_func(self, context):
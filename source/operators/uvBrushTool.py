@@ -21,10 +21,13 @@ import gpu
 import mathutils
 import math
 import bmesh
+import zlib
+import numpy as np
 from .vecmath import *
 from .blenderUtil import *
+from .meshUvBuffer import *
+from .profiler import *
 
-from gpu_extras.batch import batch_for_shader
 from bpy_extras import view3d_utils
 
 
@@ -36,9 +39,6 @@ coordsNormal = [(0, 0, 0), (0, 0, 1)]
 vecZ = mathutils.Vector((0, 0, 1))
 vecX = mathutils.Vector((1, 0, 0))
 
-shader = gpu.shader.from_builtin('UNIFORM_COLOR')
-batchLine = batch_for_shader(shader, 'LINES', {"pos": coordsNormal})
-batchCircle = batch_for_shader(shader, 'LINE_STRIP', {"pos": coordsCircle})
 
 #--------------------------------------
 
@@ -56,6 +56,69 @@ class UvBrushToolSettings(bpy.types.PropertyGroup):
         name="Pen Pressure", description="If true, pen pressure is used to adjust strength", default = False
     )
 
+    radius_mode : bpy.props.EnumProperty(
+        name="Radius Mode",
+        description="Units the brush radius is measured in",
+        items=(
+            ('WORLD', "World", "Radius is a distance in the scene"),
+            ('SCREEN', "Screen", "Radius is a number of pixels in the viewport, so the brush looks the same size at any zoom")
+        ),
+        default='WORLD'
+    )
+
+    screen_radius : bpy.props.IntProperty(
+        name="Radius", description="Radius of brush in pixels", default = 50, min = 1, soft_max = 500, subtype = 'PIXEL'
+    )
+
+    mode : bpy.props.EnumProperty(
+        name="Mode",
+        description="What the brush does to the uvs it touches",
+        items=(
+            ('MOVE', "Move", "Drag uvs along the stroke"),
+            ('RELAX', "Relax", "Smooth uvs toward the average of their neighbors.  Uv island borders do not move.")
+        ),
+        default='MOVE'
+    )
+
+    relax_iterations : bpy.props.IntProperty(
+        name="Iterations", description="Number of smoothing passes in each dab of the relax brush", default = 3, min = 1, soft_max = 20
+    )
+
+    mirror : bpy.props.EnumProperty(
+        name="Mirror",
+        description="Also apply the brush to the mirror image of the stroke across an axis of the object",
+        items=(
+            ('NONE', "None", "No symmetry"),
+            ('X', "X", "Mirror across the object's X axis"),
+            ('Y', "Y", "Mirror across the object's Y axis"),
+            ('Z', "Z", "Mirror across the object's Z axis")
+        ),
+        default='NONE'
+    )
+
+    falloff : bpy.props.EnumProperty(
+        name="Falloff",
+        description="How the strength of the brush changes from its center to its edge",
+        items=(
+            ('LINEAR', "Linear", "Strength decreases evenly toward the edge"),
+            ('SMOOTH', "Smooth", "Strength eases in and out"),
+            ('SPHERE', "Sphere", "Strength stays high until close to the edge"),
+            ('SHARP', "Sharp", "Strength drops quickly away from the center"),
+            ('CONSTANT', "Constant", "Full strength across the whole brush"),
+            ('CUSTOM', "Custom", "Strength is interpolated from the custom falloff points")
+        ),
+        default='LINEAR'
+    )
+
+    falloff_points : bpy.props.FloatVectorProperty(
+        name="Custom Falloff", 
+        description="Strength at evenly spaced distances from the center of the brush to its edge", 
+        size = 5,
+        default = (1, .9, .5, .1, 0),
+        min = 0,
+        max = 1
+    )
+
 #--------------------------------------
 
 
@@ -81,6 +144,10 @@ def calc_vertex_transform_world(pos, norm):
 
 
 def draw_callback(self, context):
+    with profile_operator(context, self.bl_label + " draw"), profiler.phase("draw"):
+        draw_cursor(self, context)
+
+def draw_cursor(self, context):
 #    if True:
 #        return
 
@@ -94,11 +161,16 @@ def draw_callback(self, context):
     ray_origin = view3d_utils.region_2d_to_origin_3d(region, rv3d, viewport_center)
 
 
+    shader = get_builtin_shader('UNIFORM_COLOR')
     shader.bind();
 
     #Draw cursor
     if self.show_cursor:
-        brush_radius = context.scene.uv_brush_props.radius
+        settings = context.scene.uv_brush_props
+        if settings.radius_mode == 'SCREEN':
+            brush_radius = screen_radius_to_world(region, rv3d, self.cursor_pos, settings.screen_radius)
+        else:
+            brush_radius = settings.radius
     
         m = calc_vertex_transform_world(self.cursor_pos, self.cursor_normal);
         mS = mathutils.Matrix.Scale(brush_radius, 4)
@@ -110,62 +182,478 @@ def draw_callback(self, context):
         gpu.matrix.multiply_matrix(m)
 
         shader.uniform_float("color", (1, 0, 1, 1))
-        batchCircle.draw(shader)
+        get_batch("uv_brush_circle", 'UNIFORM_COLOR', 'LINE_STRIP', {"pos": coordsCircle}).draw(shader)
         
         gpu.matrix.pop()
 
 
-class UvTracker:
-    def __init__(self, uv, dist, newUv):
-        self.uv = uv
-        self.dist = dist
-        self.newUv = newUv
+#Number of entries in a falloff table
+FALLOFF_TABLE_SIZE = 256
+
+#Strength at distance t from the center of the brush, where t runs from 0 at the center to 1 at the edge
+def falloff_curve(falloff, t, points):
+    if falloff == 'SMOOTH':
+        s = 1 - t
+        return s * s * (3 - 2 * s)
+    elif falloff == 'SPHERE':
+        return np.sqrt(1 - t * t)
+    elif falloff == 'SHARP':
+        return (1 - t) ** 2
+    elif falloff == 'CONSTANT':
+        return np.ones_like(t)
+    elif falloff == 'CUSTOM':
+        return np.interp(t, np.linspace(0, 1, len(points)), points)
+    return 1 - t
+
+#Table of the falloff sampled from the center to the edge of the brush.  Rebuilt only when 
+# the falloff settings change.
+_falloff_table_key = None
+_falloff_table = None
+
+def get_falloff_table(settings):
+    global _falloff_table_key, _falloff_table
+    
+    key = (settings.falloff, tuple(settings.falloff_points))
+    if key != _falloff_table_key:
+        t = np.linspace(0, 1, FALLOFF_TABLE_SIZE)
+        _falloff_table = falloff_curve(key[0], t, key[1]).astype(np.float64)
+        _falloff_table_key = key
+    return _falloff_table
+
+#Look up the falloff of each distance.  Distances are expected to be within radius.
+def sample_falloff(table, dist, radius):
+    idx = (dist * ((len(table) - 1) / radius) + .5).astype(np.int64)
+    return table[np.minimum(idx, len(table) - 1)]
+
+
+#Vertex of the mirror image of every vertex across an axis of the object, or -1 if there 
+# is none.  Built once per stroke so mirrored dabs do not need to search for their faces.
+class MirrorMap:
+    def __init__(self, buffer, axis):
+        self.buffer = buffer
+        self.axis = axis
+        
+        co = buffer.vert_co
+        mirrored = co.copy()
+        mirrored[:, axis] *= -1
+        size = float(np.ptp(co, axis = 0).max()) if len(co) > 0 else 0
+        query_idx, point_idx = find_point_pairs_within(co, mirrored, max(size * 1e-4, 1e-6))
         
-    def toString(self):
-        print("        uv %s  dist %s  newUv %s"  % (str(self.uv), str(self.dist), str(self.newUv)))
+        #Overlapping vertices can match several points; any of them will do
+        self.verts = np.full(len(co), -1, dtype=np.int64)
+        self.verts[query_idx] = point_idx
+        
+        #Reflection in world space
+        l2w = matrix_to_array(buffer.obj.matrix_world)
+        flip = np.identity(4)
+        flip[axis, axis] = -1
+        self.reflect = l2w @ flip @ np.linalg.inv(l2w)
+        
+    def mirror_point(self, point):
+        return self.reflect[:3, :3] @ point + self.reflect[:3, 3]
+
+    #Add the loops of the mirror image of the brushed vertices.  Mirrored loops take the weight
+    # of the loop they mirror.  Loops brushed directly keep their own weight.
+    #Returns (loops, atten, side) where side is 1 for mirrored loops and 0 otherwise.
+    def add_mirrored_loops(self, loops, atten):
+        buffer = self.buffer
+        verts, first = np.unique(buffer.loop_vert[loops], return_index = True)
+        mirror_verts = self.verts[verts]
+        found = mirror_verts >= 0
+        
+        mirror_loops, vert_slot = buffer.loops_of_verts(mirror_verts[found])
+        mirror_atten = atten[first[found]][vert_slot]
+        
+        all_loops = np.concatenate((loops, mirror_loops))
+        all_atten = np.concatenate((atten, mirror_atten))
+        side = np.concatenate((np.zeros(len(loops), dtype=np.int64), np.ones(len(mirror_loops), dtype=np.int64)))
+        
+        all_loops, keep = np.unique(all_loops, return_index = True)
+        return (all_loops, all_atten[keep], side[keep])
+
+
+#World positions of vertices sorted along the axis the mesh is longest in, so the vertices 
+# near a point can be found by measuring only those in a slab as wide as the brush.
+class WorldVertexIndex:
+    def __init__(self, wco):
+        self.axis = int(np.argmax(np.ptp(wco, axis = 0))) if len(wco) > 0 else 0
+        self.order = np.argsort(wco[:, self.axis], kind = 'stable')
+        self.co = wco[self.order]
+        self.coord = np.ascontiguousarray(self.co[:, self.axis])
+
+    #Returns (verts, dist) of the vertices within radius of location
+    def query(self, location, radius):
+        c = location[self.axis]
+        lo, hi = np.searchsorted(self.coord, (c - radius, c + radius))
+        
+        dist = np.linalg.norm(self.co[lo:hi] - location, axis = 1)
+        near = dist < radius
+        return (self.order[lo:hi][near], dist[near])
+
+#Loops within brush_radius of location and the strength the brush applies to each.
+# index - WorldVertexIndex of the buffer's vertices
+# falloff - table from get_falloff_table().  If None, strength falls off linearly.
+#Returns (loops, atten)
+def world_brush_loops(buffer, index, location, brush_radius, strength, falloff = None):
+    location = np.array(location)
+    
+    verts, dist = index.query(location, brush_radius)
+    loops, vert_slot = buffer.loops_of_verts(verts)
+    if falloff is None:
+        atten = (1 - dist / brush_radius)[vert_slot] * strength
+    else:
+        atten = sample_falloff(falloff, dist, brush_radius)[vert_slot] * strength
+    return (loops, atten)
+
+#Loops under a screen space brush and the strength the brush applies to each.  Only vertices 
+# in the screen index that are also within world_radius of location are used, so surfaces 
+# behind the stroke are left alone.
+# index - ScreenVertexIndex of the buffer's vertices
+# center, radius - brush circle in region pixels
+#Returns (loops, atten)
+def screen_brush_loops(buffer, index, center, radius, location, world_radius, strength, falloff):
+    location = np.array(location)
+    
+    verts, dist = index.query(center, radius)
+    near = np.linalg.norm(buffer.world_positions_of(verts) - location, axis = 1) < world_radius
+    verts = verts[near]
+    dist = dist[near]
+    
+    loops, vert_slot = buffer.loops_of_verts(verts)
+    atten = sample_falloff(falloff, dist, radius)[vert_slot] * strength
+    return (loops, atten)
+
+#Move the uvs of loops within brush_radius of location along the drag from prev_location.
+# index - WorldVertexIndex of the buffer's vertices
+# falloff - table from get_falloff_table().  If None, strength falls off linearly.
+# mirror - MirrorMap to also brush the mirror image of the stroke, or None
+#Returns array of the indices of faces that changed, or None if nothing was in range.
+def brush_dab_uvs(buffer, index, location, prev_location, brush_radius, strength, falloff = None, mirror = None):
+    loops, atten = world_brush_loops(buffer, index, location, brush_radius, strength, falloff)
+    if len(loops) == 0:
+        return None
+    return drag_loop_uvs(buffer, loops, atten, location, prev_location, mirror)
+
+#Move loops along the drag from prev_location to location, scaled by the weight of each loop.
+#Each face converts the drag into a uv offset using its own uv basis.  Loops that share a 
+# vertex and a uv all receive the same new uv so uv islands stay connected.
+# mirror - if not None, the mirror images of the loops are dragged along the mirrored drag 
+#   in the same update
+#Returns array of the indices of faces that changed.
+def drag_loop_uvs(buffer, loops, atten, location, prev_location, mirror = None):
+    l2w = buffer.obj.matrix_world
+    location = np.array(location, dtype=np.float64)
+    prev_location = np.array(prev_location, dtype=np.float64)
+    
+    #Drag of each side.  Side 1 is the mirror image.
+    if mirror == None:
+        side = np.zeros(len(loops), dtype=np.int64)
+        locations = location[None, :]
+        prev_locations = prev_location[None, :]
+    else:
+        loops, atten, side = mirror.add_mirrored_loops(loops, atten)
+        locations = np.array((location, mirror.mirror_point(location)))
+        prev_locations = np.array((prev_location, mirror.mirror_point(prev_location)))
+    
+    #Faces touched from both sides of the mirror are dragged once for each side
+    loop_face = buffer.loop_face[loops]
+    face_side, face_slot = np.unique(loop_face.astype(np.int64) * 2 + side, return_inverse = True)
+    face_slot = face_slot.ravel()
+    faces = face_side // 2
+    location = locations[face_side % 2]
+    prev_location = prev_locations[face_side % 2]
+    
+    start = buffer.loop_start[faces]
+    v0pos = buffer.world_positions_of(buffer.loop_vert[start])
+    v1 = buffer.world_positions_of(buffer.loop_vert[start + 1]) - v0pos
+    v2 = buffer.world_positions_of(buffer.loop_vert[start + 2]) - v0pos
+    faceNormal = transform_normals(l2w, buffer.face_normals[faces])
+    
+    #Project drag onto plane of each face and express it in basis (v1, v2, faceNormal).  
+    # Degenerate faces get zero coefficients.
+    offset0 = project_points_onto_plane(prev_location, v0pos, faceNormal) - v0pos
+    offset1 = project_points_onto_plane(location, v0pos, faceNormal) - v0pos
+    locCo0 = express_in_basis_array(offset0, v1, v2, faceNormal)
+    locCo1 = express_in_basis_array(offset1, v1, v2, faceNormal)
+    
+    uv0 = buffer.uvs[start].astype(np.float64)
+    uv1 = buffer.uvs[start + 1].astype(np.float64)
+    uv2 = buffer.uvs[start + 2].astype(np.float64)
     
-class VertexTracker:
+    dCo = locCo1 - locCo0
+    dUv = (uv1 - uv0) * dCo[:, 0:1] + (uv2 - uv0) * dCo[:, 1:2]
+    
+    #Adding zero folds -0.0 into 0.0 so equal uvs compare equal
+    loop_uvs = buffer.uvs[loops] + np.float32(0)
+    newUvs = loop_uvs - atten[:, None] * dUv[face_slot]
+    
+    #Loops sharing a vertex and uv take the new uv of the first such loop
+    key = np.empty((len(loops), 3), dtype=np.int64)
+    key[:, 0] = buffer.loop_vert[loops]
+    key[:, 1:] = loop_uvs.view(np.int32)
+    unique_key, first, inverse = np.unique(key, axis = 0, return_index = True, return_inverse = True)
+    
+    buffer.uvs[loops] = newUvs[first[inverse.ravel()]]
+    
+    return np.unique(faces)
+
 
-    def __init__(self, vert):
-        self.vert = vert
-        self.uvInfo = []
+#Uv connectivity of a mesh used to relax uvs.  Loops that share a vertex and a uv form one uv 
+# vertex.  Built once per mesh the brush touches.
+class UvRelaxGraph:
+    def __init__(self, buffer):
+        self.buffer = buffer
         
-    def considerUv(self, uv_in, dist_in, newUv_in):
-#        print("Adding uv %s  dist %s  newUv %s" % (str(uv_in), str(dist_in), str(newUv_in)))
-    
-        for i in range(len(self.uvInfo)):
-            map = self.uvInfo[i]
+        #Adding zero folds -0.0 into 0.0 so equal uvs compare equal
+        uvs = buffer.uvs + np.float32(0)
+        key = np.empty((buffer.num_loops, 3), dtype=np.int64)
+        key[:, 0] = buffer.loop_vert
+        key[:, 1:] = uvs.view(np.int32)
+        unique_key, first, loop_uv_vert = np.unique(key, axis = 0, return_index = True, return_inverse = True)
+        self.loop_uv_vert = loop_uv_vert.ravel()
+        self.first_loop = first
+        num_verts = len(first)
+        
+        #Uv of each uv vertex.  Refreshed from the buffer before relaxing, since the move brush 
+        # changes the buffer's uvs too.
+        self.pos = buffer.uvs[first].astype(np.float64)
+        
+        #Uv edges between each loop and the next loop of its face
+        loop_idx, corner, face_len = face_loop_ranges(buffer.loop_start, buffer.loop_total)
+        next_loop = loop_idx - corner + (corner + 1) % face_len
+        a = self.loop_uv_vert[loop_idx]
+        b = self.loop_uv_vert[next_loop]
+        edges, count = np.unique(np.minimum(a, b) * num_verts + np.maximum(a, b), return_counts = True)
+        e0 = edges // num_verts
+        e1 = edges % num_verts
+        
+        #Edges used by only one face are on the border of a uv island
+        self.pinned = np.zeros(num_verts, dtype=bool)
+        self.pinned[e0[count == 1]] = True
+        self.pinned[e1[count == 1]] = True
+        
+        #Neighbours of each uv vertex are neighbours[neighbour_start[v]:neighbour_start[v] + neighbour_count[v]]
+        src = np.concatenate((e0, e1))
+        dst = np.concatenate((e1, e0))
+        order = np.argsort(src, kind = 'stable')
+        self.neighbours = dst[order]
+        self.neighbour_count = np.bincount(src, minlength = num_verts)
+        self.neighbour_start = np.cumsum(self.neighbour_count) - self.neighbour_count
+        
+        #Loops of each uv vertex, in the same layout
+        self.uv_vert_loops = np.argsort(self.loop_uv_vert, kind = 'stable')
+        self.loop_count = np.bincount(self.loop_uv_vert, minlength = num_verts)
+        self.loop_start = np.cumsum(self.loop_count) - self.loop_count
+
+    #Move uv vertices of loops toward the average of their neighbours.  Vertices on island 
+    # borders do not move.
+    # atten - strength for each loop.  Values of 1 or more move fully to the average each iteration.
+    #Returns array of the indices of faces that changed, or None if nothing could move.
+    def relax(self, loops, atten, iterations):
+        verts, first = np.unique(self.loop_uv_vert[loops], return_index = True)
+        weight = np.minimum(atten[first], 1)
+        
+        movable = ~self.pinned[verts]
+        verts = verts[movable]
+        weight = weight[movable]
+        if len(verts) == 0:
+            return None
             
-            #Check if uv_in already has an entry for this vertex
-            if map.uv == uv_in:
-#                print("found in map")
-                if map.dist > dist_in:
-#                    print("adding to map")
-                    map.dist = dist_in
-                    map.newUv = newUv_in
-                
-                return
- 
-        #Uv for this vertex not encountered yet.  Create new entry
-        map = UvTracker(uv_in, dist_in, newUv_in)
-        self.uvInfo.append(map)
-                    
-    def getNewUv(self, uv):
-#        print("Looking up uv %s  " % (str(uv)))
-        for map in self.uvInfo:
-#            print("Checking against uv %s  " % (str(map.uv)))
-            if map.uv == uv:
-#                print("Matched!")
-                return map.newUv
+        #Region of the mesh under the brush as a sparse matrix, stored as pairs of (row, column)
+        count = self.neighbour_count[verts]
+        idx, corner, total = face_loop_ranges(self.neighbour_start[verts], count)
+        neighbours = self.neighbours[idx]
+        row = np.repeat(np.arange(len(verts)), count)
+        count = np.maximum(count, 1)
         
-        return None
-         
-    def toString(self):
-        print("    vert_index %d"  % (self.vert_index))
-        for map in self.uvInfo:
-            map.toString()
+        pos = self.pos
+        pos[verts] = self.buffer.uvs[self.first_loop[verts]]
+        pos[neighbours] = self.buffer.uvs[self.first_loop[neighbours]]
+        for i in range(iterations):
+            avg_u = np.bincount(row, weights = pos[neighbours, 0], minlength = len(verts)) / count
+            avg_v = np.bincount(row, weights = pos[neighbours, 1], minlength = len(verts)) / count
+            avg = np.stack((avg_u, avg_v), axis = 1)
+            pos[verts] += weight[:, None] * (avg - pos[verts])
+        
+        idx, corner, total = face_loop_ranges(self.loop_start[verts], self.loop_count[verts])
+        moved = self.uv_vert_loops[idx]
+        self.buffer.uvs[moved] = pos[self.loop_uv_vert[moved]]
+        return np.unique(self.buffer.loop_face[moved])
     
     
+#-------------------------------------
+
+#Size in pixels of the cells of a ScreenVertexIndex
+SCREEN_CELL_PIXELS = 32
+
+#Vertices projected into region pixels and bucketed in a grid of cells, so the vertices under 
+# a screen space brush can be found without measuring the distance to every vertex.
+class ScreenVertexIndex:
+    # key - value identifying the view and geometry the index was built for
+    # wco - (N, 3) world positions of the vertices
+    # perspective - perspective matrix of the region
+    def __init__(self, key, wco, perspective, width, height):
+        self.key = key
+        
+        m = matrix_to_array(perspective)
+        clip = wco @ m[:3, :3].T + m[:3, 3]
+        w = wco @ m[3, :3] + m[3, 3]
+        
+        #Vertices behind the viewer cannot be under the brush
+        verts = np.flatnonzero(w > 1e-6)
+        pos = clip[verts, :2] / w[verts, None]
+        pos = (pos + 1) * np.array((width / 2, height / 2))
+        
+        #Vertices off screen are placed in the border cells
+        self.cols = int(math.ceil(width / SCREEN_CELL_PIXELS)) + 2
+        self.rows = int(math.ceil(height / SCREEN_CELL_PIXELS)) + 2
+        cell = self.cell_of(pos)
+        cell_idx = cell[:, 1] * self.cols + cell[:, 0]
+        
+        order = np.argsort(cell_idx, kind = 'stable')
+        self.verts = verts[order]
+        self.pos = pos[order]
+        self.cell_start = np.searchsorted(cell_idx[order], np.arange(self.rows * self.cols + 1))
+        
+    #(column, row) of the cells containing (N, 2) pixel positions
+    def cell_of(self, pos):
+        cell = np.floor(np.asarray(pos) / SCREEN_CELL_PIXELS).astype(np.int64) + 1
+        return np.clip(cell, 0, (self.cols - 1, self.rows - 1))
+        
+    #Returns (verts, dist) of the vertices within radius pixels of center
+    def query(self, center, radius):
+        center = np.array(center, dtype=np.float64)
+        c0, c1 = self.cell_of([center - radius, center + radius])
+        
+        #Cells of one row are stored together, so each row of the brush is one slice
+        rows = np.arange(c0[1], c1[1] + 1)
+        first = self.cell_start[rows * self.cols + c0[0]]
+        last = self.cell_start[rows * self.cols + c1[0] + 1]
+        idx, corner, total = face_loop_ranges(first, last - first)
+        
+        dist = np.linalg.norm(self.pos[idx] - center, axis = 1)
+        inside = dist < radius
+        return (self.verts[idx[inside]], dist[inside])
+
+#World distance covered by radius pixels at the depth of location
+def screen_radius_to_world(region, rv3d, location, radius):
+    center = view3d_utils.location_3d_to_region_2d(region, rv3d, location)
+    if center == None:
+        return 0
+    edge = view3d_utils.region_2d_to_location_3d(region, rv3d, center + mathutils.Vector((radius, 0)), location)
+    return (edge - location).length
+
+def matrix_key(matrix):
+    return tuple(v for col in matrix.col for v in col)
+
+
+#-------------------------------------
+
+#Data the brush needs for a mesh datablock.  Linked duplicates share it, so their uvs are 
+# read once and every instance edits the same arrays.
+class BrushMeshData:
+    def __init__(self, obj):
+        self.buffer = MeshUvBuffer(obj)
+        
+        self.bvh = None
+        self.relax_graph = None
+        self.crc = None
+        
+    #Tree of the edit mesh in local space
+    def get_bvh(self):
+        if self.bvh == None:
+            self.bvh = mathutils.bvhtree.BVHTree.FromBMesh(self.buffer.bm)
+        return self.bvh
+        
+    #Uv connectivity of the mesh
+    def get_relax_graph(self):
+        if self.relax_graph == None:
+            with profiler.phase("relax graph"):
+                self.relax_graph = UvRelaxGraph(self.buffer)
+        return self.relax_graph
+        
+    #Checksum of the vertex positions
+    def get_crc(self):
+        if self.crc == None:
+            with profiler.phase("geometry checksum"):
+                self.crc = zlib.crc32(self.buffer.vert_co.tobytes())
+        return self.crc
+
+#Data for brushing one object, created the first time a stroke touches the object.  Kept for 
+# later strokes until the brush lets another tool act on the scene, so indices stay valid 
+# while only the view changes.
+class BrushStrokeSession:
+    def __init__(self, obj, mesh_data):
+        self.obj = obj
+        self.mesh_data = mesh_data
+        self.l2w = obj.matrix_world.copy()
+        self.w2l = self.l2w.inverted()
+        
+        self.buffer = MeshUvBuffer(obj, mesh_data.buffer)
+        
+        self.mirror_map = None
+        self.wco = None
+        self.world_index = None
+        self.screen_index = None
+        
+    #True if the object still has the mode, transform and topology the session was made for
+    def matches(self):
+        return not self.buffer.is_stale() and self.obj.matrix_world == self.l2w
+        
+    #Vertex positions in world space.  The object's transform is fixed for the session, so 
+    # they are only computed once.
+    def world_positions(self):
+        if self.wco is None:
+            self.wco = transform_points(self.l2w, self.buffer.vert_co)
+        return self.wco
+        
+    def get_world_index(self):
+        if self.world_index == None:
+            with profiler.phase("world index"):
+                self.world_index = WorldVertexIndex(self.world_positions())
+        return self.world_index
+        
+    #Cast a world space ray against the object.  Returns (hit, location, normal, index) with 
+    # location in world space.
+    def ray_cast(self, ray_origin, view_vector):
+        local_ray_origin = self.w2l @ ray_origin
+        local_view_vector = mul_vector(self.w2l, view_vector)
+        
+        if self.obj.mode == 'EDIT':
+            location, normal, index, distance = self.mesh_data.get_bvh().ray_cast(local_ray_origin, local_view_vector)
+            hit = location != None
+        else:
+            hit, location, normal, index = self.obj.ray_cast(local_ray_origin, local_view_vector)
+            
+        if hit:
+            location = self.l2w @ location
+        return (hit, location, normal, index)
+        
+    #Mirror map of the object.  Returns None if mirroring is off.
+    def get_mirror_map(self, mirror_axis):
+        if mirror_axis == 'NONE':
+            return None
+            
+        axis = "XYZ".index(mirror_axis)
+        if self.mirror_map == None or self.mirror_map.axis != axis:
+            with profiler.phase("mirror map"):
+                self.mirror_map = MirrorMap(self.buffer, axis)
+        return self.mirror_map
+
+    #Index of the object's vertices in region space.  Kept until the view changes.
+    def get_screen_index(self, context):
+        region = context.region
+        rv3d = context.region_data
+        buffer = self.buffer
+        
+        key = (buffer.mesh.name_full, self.mesh_data.get_crc(), matrix_key(self.l2w), 
+            matrix_key(rv3d.perspective_matrix), region.width, region.height)
+        if self.screen_index == None or self.screen_index.key != key:
+            with profiler.phase("screen index"):
+                self.screen_index = ScreenVertexIndex(key, self.world_positions(), rv3d.perspective_matrix, region.width, region.height)
+        return self.screen_index
+
+
 #-------------------------------------
 
 class UvBrushToolOperator(bpy.types.Operator):
@@ -180,9 +668,13 @@ class UvBrushToolOperator(bpy.types.Operator):
         
         self.cursor_pos = None
         self.show_cursor = False
-        self.edit_object = None
         self.stroke_trail = []
         
+        #BrushStrokeSession of each object the brush has touched, by object name
+        self.sessions = {}
+        #BrushMeshData of the meshes of those objects, by mesh name
+        self.meshes = {}
+        
         self.history = []
         self.history_idx = -1
         self.history_limit = 10
@@ -327,150 +819,109 @@ class UvBrushToolOperator(bpy.types.Operator):
         normal = None
         index = None
         
-        if self.edit_object == None:
-            hit_object, location, normal, face_index, object, matrix = ray_cast_scene(context, viewlayer, ray_origin, view_vector)
-        else:
-            l2w = self.edit_object.matrix_world
-            w2l = l2w.inverted()
-            local_ray_origin = w2l @ ray_origin
-            local_view_vector = mul_vector(w2l, view_vector)
-            
-            if self.edit_object.mode == 'OBJECT':
-                hit_object, location, normal, index = self.edit_object.ray_cast(local_ray_origin, local_view_vector)
-                object = self.edit_object
-
-                location = l2w @ location
-                
-            if self.edit_object.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(self.edit_object.data)
-                tree = mathutils.bvhtree.BVHTree.FromBMesh(bm)
-                location, normal, index, distance = tree.ray_cast(local_ray_origin, local_view_vector)
-                hit_object = location != None
-                object = self.edit_object
-            
-                location = l2w @ location
-            
+        with profiler.phase("ray cast"):
+            hit_object, location, normal, index, session = self.ray_cast_stroke(context, viewlayer, ray_origin, view_vector)
             
 #        print("hit obj:%s" % (str(hit_object)))
         
-        center = None
-        center_count = 0
-
-        brush_radius = context.scene.uv_brush_props.radius
-        strength = context.scene.uv_brush_props.strength
-        use_pressure = context.scene.uv_brush_props.use_pressure
+        settings = context.scene.uv_brush_props
+        brush_radius = settings.radius
+        strength = settings.strength
+        use_pressure = settings.use_pressure
+        falloff = get_falloff_table(settings)
         
-        if hit_object and len(self.stroke_trail) > 0:
+        #Moving needs the previous dab to know the direction of the stroke
+        relax = settings.mode == 'RELAX'
+        if hit_object and (len(self.stroke_trail) > 0 or relax):
             
-            if self.edit_object == None:
-                self.edit_object = object
 #            print("--------Edit object uvs") 
             
-            l2w = object.matrix_world
-            n2w = l2w.copy()
-            n2w.invert()
-            n2w.transpose()
-            
-            mesh = object.data
-            if self.edit_object.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(mesh)
-            elif self.edit_object.mode == 'OBJECT':
-                bm = bmesh.new()
-                bm.from_mesh(mesh)
-            
-#            uvLayer = mesh.uv_layers.active.data
-            uv_layer = bm.loops.layers.uv.active
-            
-            vert_trackers = [VertexTracker(v) for v in bm.verts]
-            
-            for face in bm.faces:
-                l0 = face.loops[0]
-                l1 = face.loops[1]
-                l2 = face.loops[2]
-            
-                v0pos = l2w @ l0.vert.co
-                v1pos = l2w @ l1.vert.co
-                v2pos = l2w @ l2.vert.co
+            if use_pressure:
+                strength *= event.pressure
+
+            buffer = session.buffer
+            mirror = session.get_mirror_map(settings.mirror)
+            graph = session.mesh_data.get_relax_graph() if relax else None
+            if settings.radius_mode == 'SCREEN':
+                index = session.get_screen_index(context)
                 
-#                print("v0pos: %s  v1pos: %s  v2pos: %s  " % (str(v0pos), str(v1pos), str(v2pos)))
-
-                v1 = v1pos - v0pos
-                v2 = v2pos - v0pos
-
-#                print("v1: %s  v2: %s  norm: %s  " % (str(v1), str(v2), str(p.normal)))
-
-                faceNormal = mul_vector(n2w, face.normal)
-                
-                dragP0 = project_point_onto_plane(self.stroke_trail[-1], v0pos, faceNormal)
-                dragP1 = project_point_onto_plane(location, v0pos, faceNormal)
-
-#                print("dragP0: %s  dragP1: %s" % (str(dragP0), str(dragP1)))
-
-                uv0 = l0[uv_layer].uv
-                uv1 = l1[uv_layer].uv
-                uv2 = l2[uv_layer].uv
-                # uv0 = uvLayer[p.loop_indices[0]].uv
-                # uv1 = uvLayer[p.loop_indices[1]].uv
-                # uv2 = uvLayer[p.loop_indices[2]].uv
-
-#                print("uv0: %s  uv1: %s  uv2: %s" % (str(uv0), str(uv1), str(uv2)))
-                
-            
-                locCo0 = express_in_basis(dragP0 - v0pos, v1, v2, faceNormal)
-                locCo1 = express_in_basis(dragP1 - v0pos, v1, v2, faceNormal)
-
-#                print("locCo0: %s  locCo1: %s" % (str(locCo0), str(locCo1)))
-            
-                dragUv0 = (uv1 - uv0) * locCo0.x + (uv2 - uv0) * locCo0.y + uv0
-                dragUv1 = (uv1 - uv0) * locCo1.x + (uv2 - uv0) * locCo1.y + uv0
-                dUv = dragUv1 - dragUv0
-
-#                print("dragUv0: %s  dragUv1: %s  dUv: %s" % (str(dragUv0), str(dragUv1), str(dUv)))
-                    
-#                print ("dUv.magnitude " + str(dUv.magnitude))
-            
-#                print("loop total:%d" % (p.loop_total))
-            
-                for loop in face.loops:
-                    
-                    loop_uv = loop[uv_layer].uv
-                    v = loop.vert
-                    pos = l2w @ v.co
-                    dist = (pos - location).magnitude
-#                    print ("dist " + str(dist))
-                    if dist < brush_radius:
-                        atten = 1 - dist / brush_radius
-                        atten *= strength
-                        if use_pressure:
-                            atten *= event.pressure
-                        vert_trackers[v.index].considerUv(loop_uv.copy(), dist, loop_uv - atten * dUv)
-
-            #Write new uvs back to mesh
-            
-            for face in bm.faces:
-                for loop in face.loops:
-#                    loop = mesh.loops[loop_idx]
-#                    print("lookup vertidx %s  uv %s " % (str(loop.vertex_index), str(uvLayer[loop_idx].uv)))
+            with profiler.phase("compute"):
+                if settings.radius_mode == 'SCREEN':
+                    world_radius = screen_radius_to_world(region, rv3d, location, settings.screen_radius)
+                    loops, atten = screen_brush_loops(buffer, index, mouse_pos, settings.screen_radius, location, world_radius, strength, falloff)
+                else:
+                    loops, atten = world_brush_loops(buffer, session.get_world_index(), location, brush_radius, strength, falloff)
                     
-                    loop_uv = loop[uv_layer].uv
-                    tracker = vert_trackers[loop.vert.index]
-                    newUv = tracker.getNewUv(loop_uv)
-                    if newUv != None:
-                        loop[uv_layer].uv = newUv
+                if len(loops) == 0:
+                    faces = None
+                elif relax:
+                    if mirror != None:
+                        loops, atten, side = mirror.add_mirrored_loops(loops, atten)
+                    faces = graph.relax(loops, atten, settings.relax_iterations)
+                else:
+                    faces = drag_loop_uvs(buffer, loops, atten, location, self.stroke_trail[-1], mirror)
                     
-
-            if self.edit_object.mode == 'EDIT':
-                bmesh.update_edit_mesh(mesh)
-            elif self.edit_object.mode == 'OBJECT':
-                bm.to_mesh(mesh)
-                bm.free()
+            if faces is not None:
+                #Dabs between redraws share one mesh update
+                buffer.commit(faces, deferred = True)
         
         if hit_object:        
             self.stroke_trail.append(location)
             
         else:
+            #Objects already touched keep their sessions so the stroke can pick up again
             self.stroke_trail = []
-            self.edit_object = None
+        
+    #Cast ray against the selected mesh under the mouse and the objects the stroke has already 
+    # touched.  The nearest hit is used.
+    #Returns (hit, location, normal, index, session)
+    def ray_cast_stroke(self, context, viewlayer, ray_origin, view_vector):
+        result, location, normal, index, object, matrix = ray_cast_scene(context, viewlayer, ray_origin, view_vector)
+        if result and object.type == 'MESH' and object.select_get():
+            self.get_session(object)
+        
+        best = (False, None, None, None, None)
+        best_dist = None
+        for session in self.sessions.values():
+            hit, location, normal, index = session.ray_cast(ray_origin, view_vector)
+            if not hit:
+                continue
+                
+            dist = (location - ray_origin).length
+            if best_dist == None or dist < best_dist:
+                best = (hit, location, normal, index, session)
+                best_dist = dist
+                    
+        return best
+        
+    def drop_sessions(self):
+        self.sessions = {}
+        self.meshes = {}
+        
+    #Drop the sessions if any of their objects were deleted or changed since they were made.  
+    # Linked duplicates share mesh data, so sessions are dropped together.
+    def drop_stale_sessions(self):
+        for session in self.sessions.values():
+            try:
+                if session.matches():
+                    continue
+            except ReferenceError:
+                pass
+            self.drop_sessions()
+            return
+        
+    #Stroke session of obj.  Created the first time the brush touches obj.
+    def get_session(self, obj):
+        session = self.sessions.get(obj.name_full)
+        if session == None:
+            mesh_data = self.meshes.get(obj.data.name_full)
+            if mesh_data == None:
+                mesh_data = BrushMeshData(obj)
+                self.meshes[obj.data.name_full] = mesh_data
+                    
+            session = BrushStrokeSession(obj, mesh_data)
+            self.sessions[obj.name_full] = session
+        return session
         
     def mouse_move(self, context, event):
         mouse_pos = (event.mouse_region_x, event.mouse_region_y)
@@ -484,7 +935,8 @@ class UvBrushToolOperator(bpy.types.Operator):
         ray_origin = view3d_utils.region_2d_to_origin_3d(region, rv3d, mouse_pos)
 
         viewlayer = bpy.context.view_layer
-        result, location, normal, index, object, matrix = ray_cast_scene(context, viewlayer, ray_origin, view_vector)
+        with profiler.phase("ray cast"):
+            result, location, normal, index, object, matrix = ray_cast_scene(context, viewlayer, ray_origin, view_vector)
         
         #Brush cursor display
         if result:
@@ -515,12 +967,12 @@ class UvBrushToolOperator(bpy.types.Operator):
             result, location, normal, index, object, matrix = ray_cast_scene(context, viewlayer, ray_origin, view_vector)
 
             if result == False or object.select_get() == False or object.type != 'MESH':
+                self.drop_sessions()
                 return {'PASS_THROUGH'}
                             
             self.dragging = True
             self.stroke_trail = []
-            
-            self.edit_object = object
+            self.drop_stale_sessions()
             
             self.dab_brush(context, event)
             
@@ -529,8 +981,8 @@ class UvBrushToolOperator(bpy.types.Operator):
             # self.init_mesh.copyFrom(object)
             
         elif event.value == "RELEASE":
+            flush_redraws()
             self.dragging = False
-            self.edit_object = None
             
             self.history_snapshot(context)
 
@@ -542,8 +994,11 @@ class UvBrushToolOperator(bpy.types.Operator):
         return context.active_object is not None
 
     def modal(self, context, event):
+        with profile_operator(context, self.bl_label + " tick"):
+            return self.handle_event(context, event)
+
+    def handle_event(self, context, event):
 #        print("modal evTyp:%s evVal:%s" % (str(event.type), str(event.value)))
-        context.area.tag_redraw()
 
         if event.type in {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE'}:
             # allow navigation
@@ -554,6 +1009,9 @@ class UvBrushToolOperator(bpy.types.Operator):
         
             self.mouse_move(context, event)
             
+            #Cursor only needs to be redrawn in the view under the mouse
+            request_redraw(context.area)
+            
             if self.dragging:
                 return {'RUNNING_MODAL'}
             else:
@@ -590,21 +1048,28 @@ class UvBrushToolOperator(bpy.types.Operator):
                 context.window.cursor_set("DEFAULT")
                 bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
                 self.history_clear(context)
+                flush_redraws()
                 return {'FINISHED'}
             return {'RUNNING_MODAL'}
 
         elif event.type in {'PAGE_UP', 'RIGHT_BRACKET'}:
             if event.value == "PRESS":
-                brush_radius = context.scene.uv_brush_props.radius
-                brush_radius = brush_radius + .1
-                context.scene.uv_brush_props.radius = brush_radius
+                settings = context.scene.uv_brush_props
+                if settings.radius_mode == 'SCREEN':
+                    settings.screen_radius += 5
+                else:
+                    settings.radius = settings.radius + .1
+                request_redraw(context.area)
             return {'RUNNING_MODAL'}
 
         elif event.type in {'PAGE_DOWN', 'LEFT_BRACKET'}:
             if event.value == "PRESS":
-                brush_radius = context.scene.uv_brush_props.radius
-                brush_radius = max(brush_radius - .1, .1)
-                context.scene.uv_brush_props.radius = brush_radius
+                settings = context.scene.uv_brush_props
+                if settings.radius_mode == 'SCREEN':
+                    settings.screen_radius = max(settings.screen_radius - 5, 1)
+                else:
+                    settings.radius = max(settings.radius - .1, .1)
+                request_redraw(context.area)
             return {'RUNNING_MODAL'}
             
         elif event.type == 'ESC':
@@ -613,9 +1078,12 @@ class UvBrushToolOperator(bpy.types.Operator):
                 context.window.cursor_set("DEFAULT")
                 self.history_restore_bookmark(context, 0)
                 self.history_clear(context)            
+                flush_redraws()
                 return {'CANCELLED'}
             return {'RUNNING_MODAL'}
 
+        #Other tools may change the meshes
+        self.drop_sessions()
         return {'PASS_THROUGH'}
 
 #    def execute(self, context):
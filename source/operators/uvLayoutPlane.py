@@ -22,14 +22,16 @@ import gpu
 import mathutils
 import math
 import bmesh
+import numpy as np
 
-from gpu_extras.batch import batch_for_shader
 from bpy_extras import view3d_utils
 from enum import Enum
 
 from .vecmath import *
 from .handles import *
 from .blenderUtil import *
+from .meshUvBuffer import *
+from .profiler import *
 
 class UvPlaneLayoutSettings(bpy.types.PropertyGroup):
     init_layout : bpy.props.EnumProperty(
@@ -59,6 +61,21 @@ class UvPlaneLayoutSettings(bpy.types.PropertyGroup):
         default = 1
     )
 
+    use_preview : bpy.props.BoolProperty(
+        name="Preview While Dragging", 
+        description="While a handle is dragged, only update an evenly spread subset of faces on large meshes.  All faces are updated when the handle is released.", 
+        default = False
+    )
+
+    preview_density : bpy.props.FloatProperty(
+        name="Preview Density", 
+        description="Fraction of faces updated while dragging in preview mode", 
+        default = .1,
+        min = .001,
+        max = 1,
+        subtype = 'FACTOR'
+    )
+
     relocate_origin : bpy.props.BoolProperty(
         name="Relocate Origin", 
         description="If true, when you start in Face mode, the origin will be relocated to be close to the center of the active face.", 
@@ -68,15 +85,108 @@ class UvPlaneLayoutSettings(bpy.types.PropertyGroup):
 
 #---------------------------
 
+#Meshes with fewer projected loops than this are always updated in full
+PREVIEW_MIN_LOOPS = 40000
+
+#Geometry of a mesh the plane projects onto, read once when the tool starts and shared by 
+# every later update
+class PlaneMeshSnapshot:
+    # buffer - MeshUvBuffer of the mesh
+    # faces - mask of the faces whose uvs are projected
+    def __init__(self, buffer, faces):
+        self.obj = buffer.obj
+        self.buffer = buffer
+        self.active_face = buffer.active_face
+        
+        #Faces whose uvs are projected and their loops
+        self.faces = faces
+        self.loop_idx, corner, face_len = buffer.face_loops(faces)
+        
+        #World position of the vertex of each projected loop
+        self.loop_co = transform_points(self.obj.matrix_world, buffer.vert_co[buffer.loop_vert[self.loop_idx]])
+        
+        #Uvs before the tool changed them, packed in the same order as loop_idx
+        self.original_uvs = self.buffer.uvs[self.loop_idx].copy()
+        
+        #Subset of faces updated while dragging, built on first use
+        self.preview = None
+        self.preview_density = None
+
+    def is_empty(self):
+        return len(self.loop_idx) == 0
+
+    #True if the mesh changed since the snapshot was taken.  See MeshUvBuffer.is_stale().
+    def is_stale(self):
+        return self.buffer.is_stale()
+
+    #Snapshot of the projected faces that are also in mask, sharing this snapshot's buffer
+    def subset(self, mask):
+        return PlaneMeshSnapshot(self.buffer, self.faces & mask)
+
+    #Set uvs from the world to uv transform of the plane.
+    # density - if given, only this fraction of the faces is updated
+    def project(self, w2uv, density = None):
+        faces = self.faces
+        loop_idx = self.loop_idx
+        loop_co = self.loop_co
+        if density != None and density < 1 and len(self.loop_idx) >= PREVIEW_MIN_LOOPS:
+            faces, loop_idx, loop_co = self.previewLoops(density)
+            profiler.count("preview faces", len(faces))
+    
+        with profiler.phase("compute"):
+            self.buffer.uvs[loop_idx] = transform_points(w2uv, loop_co)[:, :2]
+        
+        #Dragging a handle can move the plane several times between redraws
+        self.buffer.commit(faces, deferred = True)
+
+    #Evenly spread subset of the projected faces.  Returns (faces, loop_idx, loop_co).
+    def previewLoops(self, density):
+        if self.preview == None or self.preview_density != density:
+            with profiler.phase("preview sample"):
+                faces = np.flatnonzero(self.faces)
+                order = spatial_order(self.buffer.face_centers()[faces])
+                step = max(int(round(1 / density)), 1)
+                faces = np.sort(faces[order[::step]])
+                
+                loop_idx, corner, face_len = self.buffer.face_loops(faces)
+                loop_co = transform_points(self.obj.matrix_world, self.buffer.vert_co[self.buffer.loop_vert[loop_idx]])
+            
+            self.preview = (faces, loop_idx, loop_co)
+            self.preview_density = density
+        return self.preview
+
+    #Put back the uvs the mesh had when the snapshot was taken
+    def restore(self):
+        self.buffer.uvs[self.loop_idx] = self.original_uvs
+        self.buffer.commit(self.faces)
+
+def read_plane_mesh_snapshot(obj, selected_faces_only):
+    buffer = MeshUvBuffer(obj)
+    return PlaneMeshSnapshot(buffer, buffer.face_mask(selected_faces_only))
+
+#One snapshot for each mesh of the selected objects
+def plane_mesh_snapshots(context):
+    props = context.scene.kitfox_uv_plane_layout_props
+    return [read_plane_mesh_snapshot(group.obj, props.selected_faces_only) for group in plan_mesh_groups(context)]
+
+
 class UvPlaneControl:
     
-    def __init__(self, context):
+    #snapshots - PlaneMeshSnapshots of the meshes to project onto.  Read from the selection if None.
+    # matrix - starting control matrix.  If None, the starting layout setting is used.
+    def __init__(self, context, snapshots = None, matrix = None):
         self.controlMtx = None
 
+        if snapshots == None:
+            snapshots = plane_mesh_snapshots(context)
+        self.snapshots = snapshots
+
         props = context.scene.kitfox_uv_plane_layout_props
         init_layout = props.init_layout
     
-        if init_layout == 'FACE':
+        if matrix != None:
+            self.controlMtx = matrix.copy()
+        elif init_layout == 'FACE':
             self.setProjFromActiveFace(context)
         elif init_layout == 'BOUNDS':
             self.setFromMeshes(context)
@@ -140,58 +250,61 @@ class UvPlaneControl:
 
         return consumed
                 
-    def updateUvs(self, context):
+    #preview - only update a subset of faces if preview mode is on
+    def updateUvs(self, context, preview = False):
         #update uvs
         w2uv = self.controlMtx.inverted()
         
         props = context.scene.kitfox_uv_plane_layout_props
-        selected_faces_only = props.selected_faces_only
-#        print("self.controlMtx %s" % (str(self.controlMtx)))
-#        print("w2uv %s" % (str(w2uv)))
+        density = props.preview_density if preview and props.use_preview else None
         
-        for obj in context.selected_objects:
-            if obj.type != "MESH":
-                continue
+        for snapshot in self.snapshots:
+            snapshot.project(w2uv, density)
 
-            l2w = obj.matrix_world
-            
-            mesh = obj.data
-            
-            if obj.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(mesh)
-            elif obj.mode == 'OBJECT':
-                bm = bmesh.new()
-                bm.from_mesh(mesh)
-                
-
-            uv_layer = bm.loops.layers.uv.verify()
+    def isDragging(self):
+        for handle in self.handles:
+            if handle.dragging:
+                return True
+        return False
+
+    #Undo every change made since the control was created
+    def restoreUvs(self):
+        for snapshot in self.snapshots:
+            snapshot.restore()
+
+    #True if any of the meshes changed since the control read them
+    def isStale(self):
+        for snapshot in self.snapshots:
+            if snapshot.is_stale():
+                return True
+        return False
+
+    #Snapshot of the active object.  Read separately if the active object is not selected.
+    def activeSnapshot(self, context):
+        obj = context.active_object
+        if obj == None or obj.type != 'MESH':
+            return None
             
-            for face in bm.faces:
-                if not selected_faces_only or face.select:
-                    for loop in face.loops:
-                        loop_uv = loop[uv_layer]
-                        
-                        uvPos = w2uv @ l2w @ loop.vert.co
-                        
-                        #print("worldPos %s" % (str(uvPos)))
-                        #print("worldPos %s" % (str(uvPos)))
-                        loop_uv.uv = uvPos.xy
-
-            if obj.mode == 'EDIT':
-                bmesh.update_edit_mesh(mesh)
-            elif obj.mode == 'OBJECT':
-                bm.to_mesh(mesh)
-                bm.free()
-                
+        for snapshot in self.snapshots:
+            if snapshot.obj == obj:
+                return snapshot
                 
+        props = context.scene.kitfox_uv_plane_layout_props
+        return read_plane_mesh_snapshot(obj, props.selected_faces_only)
 
     def mouse_click(self, context, event):
+        was_dragging = self.isDragging()
+        
         consumed = False
         for handle in self.handles:
             if handle.mouse_click(context, event):
                 consumed = True
-                redraw_all_viewports(context)
+                request_redraw()
                 break
+        
+        if was_dragging and not self.isDragging():
+            #Replace the preview with the full projection
+            self.updateUvs(context)
             
         return consumed
 
@@ -259,8 +372,8 @@ class UvPlaneControl:
     def updateProjectionMatrix(self, context, matrix):
         self.controlMtx = matrix
         self.layoutHandles()
-        self.updateUvs(context)
-        redraw_all_viewports(context)
+        self.updateUvs(context, preview = self.isDragging())
+        request_redraw()
         
 
     def findTangent(self, norm):
@@ -273,45 +386,34 @@ class UvPlaneControl:
 
 
     def setProjFromActiveFace(self, context):
-        obj = context.active_object
-        if obj == None or obj.type != 'MESH':
+        snapshot = self.activeSnapshot(context)
+        if snapshot == None:
             self.controlMtx = None        
             return
 
         props = context.scene.kitfox_uv_plane_layout_props
         relocate_origin = props.relocate_origin
 
-        bm = None
+        obj = snapshot.obj
+        buffer = snapshot.buffer
         
-        if obj.mode == 'EDIT':
-            bm = bmesh.from_edit_mesh(obj.data)
-        elif obj.mode == 'OBJECT':
-            bm = bmesh.new()
-            bm.from_mesh(obj.data)
-
-#            print("active face idx " + str(bm.faces.active))
-        face = bm.faces.active
+        face = snapshot.active_face
         if face == None:
-            bm.faces.ensure_lookup_table()
-            face = bm.faces[0]
+            face = 0
 
         l2w = obj.matrix_world
         n2w = l2w.copy()
         n2w.invert()
         n2w.transpose()
             
-        bestNormal = n2w @ face.normal
-        bestCenter = l2w @ face.calc_center_median()
-
-        uv_layer = bm.loops.layers.uv.active
+        bestNormal = n2w @ mathutils.Vector(buffer.face_normals[face])
+        bestCenter = l2w @ mathutils.Vector(buffer.face_center(face))
 
-        l0 = face.loops[0]
-        l1 = face.loops[1]
-        l2 = face.loops[2]
-
-        p0 = l2w @ face.verts[0].co
-        p1 = l2w @ face.verts[1].co
-        p2 = l2w @ face.verts[2].co
+        start = buffer.loop_start[face]
+        
+        p0 = l2w @ mathutils.Vector(buffer.vert_co[buffer.loop_vert[start]])
+        p1 = l2w @ mathutils.Vector(buffer.vert_co[buffer.loop_vert[start + 1]])
+        p2 = l2w @ mathutils.Vector(buffer.vert_co[buffer.loop_vert[start + 2]])
         
         # print("p0 " + str(p0))
         # print("p1 " + str(p1))
@@ -319,9 +421,9 @@ class UvPlaneControl:
         
         p3 = p0 - bestNormal
         
-        uv0 = l0[uv_layer].uv
-        uv1 = l1[uv_layer].uv
-        uv2 = l2[uv_layer].uv
+        uv0 = mathutils.Vector(buffer.uvs[start])
+        uv1 = mathutils.Vector(buffer.uvs[start + 1])
+        uv2 = mathutils.Vector(buffer.uvs[start + 2])
 
         #if uvs don't form the basis of a plane, artificially create one
         duv1 = uv1 - uv0
@@ -388,44 +490,32 @@ class UvPlaneControl:
         # CI = C.copy()
         # CI.invert()
 #        print("mtx C-1 " + str(CI))
-
-        if obj.mode == 'OBJECT':
-            bm.free()
         
 
     def setFromGrid(self, context):
-        obj = context.active_object
-        if obj == None or obj.type != 'MESH':
+        snapshot = self.activeSnapshot(context)
+        if snapshot == None:
             self.controlMtx = None        
             return
 
         #Find active face
-        bm = None
-        if obj.mode == 'EDIT':
-            bm = bmesh.from_edit_mesh(obj.data)
-        elif obj.mode == 'OBJECT':
-            bm = bmesh.new()
-            bm.from_mesh(obj.data)
-
-#            print("active face idx " + str(bm.faces.active))
-        face = bm.faces.active
+        obj = snapshot.obj
+        buffer = snapshot.buffer
+        
+        face = snapshot.active_face
         if face == None:
-            bm.faces.ensure_lookup_table()
-            face = bm.faces[0]
+            face = 0
 
         l2w = obj.matrix_world
         n2w = l2w.copy()
         n2w.invert()
         n2w.transpose()
             
-        activeNormal = n2w @ face.normal
-        activeCenter = l2w @ face.calc_center_median()
-
-        if obj.mode == 'OBJECT':
-            bm.free()
+        activeNormal = n2w @ mathutils.Vector(buffer.face_normals[face])
+        activeCenter = l2w @ mathutils.Vector(buffer.face_center(face))
             
         #Grid projection
-        scale = context.space_data.overlay.grid_scale
+        scale = get_grid_scale(context)
         center = snap_to_grid(activeCenter, scale)
         
         axis = closest_axis(activeNormal)
@@ -459,43 +549,24 @@ class UvPlaneControl:
 
     def setFromMeshes(self, context):
     
-        obj = context.active_object
-        if obj == None or obj.type != 'MESH':
+        snapshot = self.activeSnapshot(context)
+        if snapshot == None:
             self.controlMtx = None        
             return
 
-        props = context.scene.kitfox_uv_plane_layout_props
-        selected_faces_only = props.selected_faces_only
-
-        mesh = obj.data
+        obj = snapshot.obj
         l2w = obj.matrix_world
         n2w = l2w.copy()
         n2w.invert()
         n2w.transpose()
 
-        mesh = obj.data
-        bestNormal = None
-        bestCenter = None
-        
-        bm = None
-        
-        if obj.mode == 'EDIT':
-            bm = bmesh.from_edit_mesh(mesh)
-            print("active face idx " + str(bm.faces.active))
-            face = bm.faces.active
-            if face == None:
-                face = bm.faces[0]
-            bestNormal = n2w @ face.normal
-            bestCenter = l2w @ face.calc_center_median()
-        elif obj.mode == 'OBJECT':
-            print("active poly idx " + str(mesh.polygons.active))
-            bestPoly = mesh.polygons[mesh.polygons.active]
-                
-            bestNormal = n2w @ bestPoly.normal
-            bestCenter = l2w @ bestPoly.center
-            
-            bm = bmesh.new()
-            bm.from_mesh(mesh)
+        buffer = snapshot.buffer
+        
+        face = snapshot.active_face
+        if face == None:
+            face = 0
+        bestNormal = n2w @ mathutils.Vector(buffer.face_normals[face])
+        bestCenter = l2w @ mathutils.Vector(buffer.face_center(face))
             
             
         #Build matrix from world space to face space
@@ -520,44 +591,15 @@ class UvPlaneControl:
         #print("w2poly %s\n" % (str(w2poly)))
 
         #find bounds of mesh projected along normal of chosen polygon
-        minX = None
-        maxX = None
-        minY = None
-        maxY = None
-        for obj in context.selected_objects:
-            if obj.type != "MESH":
-                continue
+        bounds = None
+        for snapshot in self.snapshots:
+            bounds = union_bounds(bounds, points_bounds(snapshot.loop_co, w2poly))
 
-            mesh = obj.data
-            if obj.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(mesh)
-            elif obj.mode == 'OBJECT':
-                bm = bmesh.new()
-                bm.from_mesh(mesh)
-            
-            
-            l2w = obj.matrix_world
-            l2poly = w2poly @ l2w
-            
-            for f in bm.faces:
-                if not selected_faces_only or f.select:
-                    for v in f.verts:
-#                        v = mesh.vertices[vIdx]
-                        
-                        faceV = l2poly @ v.co
-                        
-    #                    print("mapping v %s -> %s " % (str(v.co), str(faceV)))
-               
-                        minX = faceV.x if minX == None else min(faceV.x, minX)
-                        maxX = faceV.x if maxX == None else max(faceV.x, maxX)
-                        minY = faceV.y if minY == None else min(faceV.y, minY)
-                        maxY = faceV.y if maxY == None else max(faceV.y, maxY)
-                    
-            if obj.mode == 'OBJECT':
-                bm.free()
-
-        if minX == None:
+        if bounds == None:
             return
+            
+        minX, minY = bounds[0][:2]
+        maxX, maxY = bounds[1][:2]
 
         #print("minX %s  maxX %s  minY %s  maxY %s " % (str(minX), str(maxX), str(minY), str(maxY)))
 
@@ -581,7 +623,9 @@ class UvPlaneControl:
     
 
     
-    def draw(self, context):
+    # color - color of the plane outline
+    # show_handles - if False, only the outline is drawn
+    def draw(self, context, color = (1, 0, 1, 1), show_handles = True):
         #print("draign control")
         
 #        rv3d = context.space_data.region_3d
@@ -601,9 +645,9 @@ class UvPlaneControl:
 #        print("perspective_matrix I " + str(persp.inverted()))
     
         #---------------------------
-        shader = gpu.shader.from_builtin('UNIFORM_COLOR')
+        shader = get_builtin_shader('UNIFORM_COLOR')
 #        batchCube = batch_for_shader(shader, 'LINES', {"pos": coordsCube})
-        batchCube = batch_for_shader(shader, 'LINE_STRIP', {"pos": coordsSquare_strip})
+        batchCube = get_batch("uv_plane_square", 'UNIFORM_COLOR', 'LINE_STRIP', {"pos": coordsSquare_strip})
             
         
         if self.controlMtx == None:
@@ -615,7 +659,7 @@ class UvPlaneControl:
         gpu.matrix.push()
         
         gpu.matrix.multiply_matrix(self.controlMtx)
-        shader.uniform_float("color", (1, 0, 1, 1))
+        shader.uniform_float("color", color)
         batchCube.draw(shader)
         
         gpu.matrix.pop()
@@ -623,12 +667,129 @@ class UvPlaneControl:
         #bgl.glDisable(bgl.GL_DEPTH_TEST)
         
 #        print("  DRAW HANDLESs")
+        if not show_handles:
+            return
+            
         for handle in self.handles:
 #            print("  Drawing handle " + str(handle))
             handle.draw(context)
 
 #---------------------------
 
+#Sides of the box as (normal, right, up) in the order returned by classify_box_sides().  Right 
+# and up are chosen so the texture is not mirrored when a side is viewed from outside.
+BOX_SIDES = [
+    (vecX, vecY, vecZ),
+    (-vecX, -vecY, vecZ),
+    (vecY, -vecX, vecZ),
+    (-vecY, vecX, vecZ),
+    (vecZ, vecX, vecY),
+    (-vecZ, vecX, -vecY),
+]
+
+#Index into BOX_SIDES of the side each (N, 3) normal faces
+def classify_box_sides(normals):
+    axis = closest_axis_array(normals).astype(np.int64)
+    negative = np.take_along_axis(normals, axis[:, None], axis = 1)[:, 0] < 0
+    return axis * 2 + negative
+
+#Several plane controls projecting onto the sides of a box.  Every face is assigned to the side 
+# its normal faces when the control is created, and each plane only updates the faces 
+# assigned to it.  Only the active plane shows handles; Tab cycles through the planes.
+class UvBoxControl:
+
+    def __init__(self, context, snapshots = None):
+        if snapshots == None:
+            snapshots = plane_mesh_snapshots(context)
+        self.snapshots = snapshots
+        
+        #Side of every face of each mesh
+        with profiler.phase("classify"):
+            sides = [classify_box_sides(s.buffer.face_normals_world()) for s in snapshots]
+
+        #Cube around the selection so every side has the same texel density
+        bounds = None
+        for snapshot in snapshots:
+            bounds = union_bounds(bounds, points_bounds(snapshot.loop_co))
+        center = mathutils.Vector((bounds[0] + bounds[1]) / 2)
+        size = max(float((bounds[1] - bounds[0]).max()), .0001)
+        
+        active = context.active_object
+        
+        self.planes = []
+        self.active_idx = 0
+        for side_idx, (normal, right, up) in enumerate(BOX_SIDES):
+            side_snapshots = [s.subset(side == side_idx) for s, side in zip(snapshots, sides)]
+            side_snapshots = [s for s in side_snapshots if not s.is_empty()]
+            if len(side_snapshots) == 0:
+                continue
+            
+            i = (right * size).to_4d()
+            i.w = 0
+            j = (up * size).to_4d()
+            j.w = 0
+            k = (normal * size).to_4d()
+            k.w = 0
+            h = (center + (normal - right - up) * size / 2).to_4d()
+            
+            matrix = mathutils.Matrix((i, j, k, h))
+            matrix.transpose()
+            
+            #Start with the side holding the active face
+            for s in side_snapshots:
+                if s.obj == active and s.active_face != None and s.faces[s.active_face]:
+                    self.active_idx = len(self.planes)
+            
+            self.planes.append(UvPlaneControl(context, side_snapshots, matrix))
+
+    @property
+    def activePlane(self):
+        return self.planes[self.active_idx]
+        
+    @property
+    def controlMtx(self):
+        return self.activePlane.controlMtx
+
+    def cycleActivePlane(self):
+        if not self.isDragging():
+            self.active_idx = (self.active_idx + 1) % len(self.planes)
+        
+    def mouse_move(self, context, event):
+        return self.activePlane.mouse_move(context, event)
+
+    def mouse_click(self, context, event):
+        return self.activePlane.mouse_click(context, event)
+
+    def isDragging(self):
+        return self.activePlane.isDragging()
+
+    def updateProjectionMatrix(self, context, matrix):
+        self.activePlane.updateProjectionMatrix(context, matrix)
+
+    #Recomputes every plane
+    def updateUvs(self, context, preview = False):
+        for plane in self.planes:
+            plane.updateUvs(context, preview)
+
+    def restoreUvs(self):
+        for plane in self.planes:
+            plane.restoreUvs()
+
+    def isStale(self):
+        for plane in self.planes:
+            if plane.isStale():
+                return True
+        return False
+
+    def draw(self, context):
+        for plane in self.planes:
+            if plane != self.activePlane:
+                plane.draw(context, color = (.5, 0, .5, 1), show_handles = False)
+        self.activePlane.draw(context)
+
+
+#---------------------------
+
 
 
 def draw_callback(self, context):
@@ -636,7 +797,8 @@ def draw_callback(self, context):
     ctx = bpy.context
 
     if self.control != None:
-        self.control.draw(context)
+        with profile_operator(context, self.bl_label + " draw"), profiler.phase("draw"):
+            self.control.draw(context)
 
 
 #---------------------------
@@ -697,9 +859,19 @@ class UvLayoutPlaneOperator(bpy.types.Operator):
             
 
     def modal(self, context, event):
-        
-#        context.area.tag_redraw()
-        redraw_all_viewports(context)
+        #Events passed through can run tools that change the meshes, such as undo, mode 
+        # switches or deleting faces.  The snapshots no longer match those meshes, so stop 
+        # without writing to them.
+        if self.control.isStale():
+            bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+            self.report({'WARNING'}, "Mesh changed while the tool was running")
+            request_redraw()
+            return {'CANCELLED'}
+            
+        with profile_operator(context, self.bl_label + " tick"):
+            return self.handle_event(context, event)
+
+    def handle_event(self, context, event):
 
         if event.type in {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE'}:
             # allow navigation
@@ -739,47 +911,44 @@ class UvLayoutPlaneOperator(bpy.types.Operator):
         
         elif event.type in {'RET'}:
             bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+            if self.control.isDragging():
+                self.control.updateUvs(context)
+            request_redraw()
+            flush_redraws()
             return {'FINISHED'}
             
         elif event.type in {'RIGHTMOUSE', 'ESC'}:
             bpy.types.SpaceView3D.draw_handler_remove(self._handle, 'WINDOW')
+            self.control.restoreUvs()
+            request_redraw()
+            flush_redraws()
             return {'CANCELLED'}
 
         return {'PASS_THROUGH'}
 #        return {'RUNNING_MODAL'}
 
-    def isEmpty(self, context):
-        props = context.scene.kitfox_uv_plane_layout_props
-        selected_faces_only = props.selected_faces_only
-        
-        for obj in context.selected_objects:
-            if obj.type == 'MESH':
-                mesh = obj.data
-                
-                if selected_faces_only:
-                    if obj.mode == 'EDIT':
-                        bm = bmesh.from_edit_mesh(mesh)
-                        for f in bm.faces:
-                            if f.select:
-                                return False
-                        
-                    else:
-                            
-                        for p in mesh.polygons:
-                            if p.select:
-                                return False
-                        
-                else:
-                    return False
+    def createControl(self, context, snapshots):
+        return UvPlaneControl(context, snapshots)
+
+    def isEmpty(self, snapshots):
+        for snapshot in snapshots:
+            if not snapshot.is_empty():
+                return False
                     
         return True
 
     def invoke(self, context, event):
         
         if context.area.type == 'VIEW_3D':
-            if self.isEmpty(context):
+            #Meshes are read once and shared by everything the control does
+            with profile_operator(context, self.bl_label + " snapshot"):
+                snapshots = plane_mesh_snapshots(context)
+            
+            if self.isEmpty(snapshots):
                 self.report({'WARNING'}, "Nothing selected to apply projection to")
                 return {'CANCELLED'}
+
+            report_conflicting_transforms(self, plan_mesh_groups(context))
                 
             args = (self, context)
             
@@ -798,7 +967,8 @@ class UvLayoutPlaneOperator(bpy.types.Operator):
             # for mt in self.mesh_trackers:
                 # del mt            
 
-            self.control = UvPlaneControl(context)
+            with profile_operator(context, self.bl_label):
+                self.control = self.createControl(context, snapshots)
 
             # self.mesh_trackers = []
             # for obj in context.selected_objects:
@@ -812,12 +982,32 @@ class UvLayoutPlaneOperator(bpy.types.Operator):
             return {'CANCELLED'}
 
 
+class UvLayoutBoxOperator(UvLayoutPlaneOperator):
+    """Box projection for UVs using a plane for each side of the box"""
+    bl_idname = "kitfox.uv_box_layout_op"
+    bl_label = "Uv Box Layout"
+    bl_options = {"REGISTER", "UNDO"}
+
+    def createControl(self, context, snapshots):
+        return UvBoxControl(context, snapshots)
+
+    def handle_event(self, context, event):
+        if event.type == 'TAB':
+            if event.value == 'PRESS':
+                self.control.cycleActivePlane()
+                request_redraw()
+            return {'RUNNING_MODAL'}
+            
+        return super().handle_event(context, event)
+
+
 #---------------------------
 
 
 def register():
     bpy.utils.register_class(UvPlaneLayoutSettings)
     bpy.utils.register_class(UvLayoutPlaneOperator)
+    bpy.utils.register_class(UvLayoutBoxOperator)
 
     bpy.types.Scene.kitfox_uv_plane_layout_props = bpy.props.PointerProperty(type=UvPlaneLayoutSettings)
 
@@ -826,6 +1016,7 @@ def unregister():
     
     bpy.utils.unregister_class(UvPlaneLayoutSettings)
     bpy.utils.unregister_class(UvLayoutPlaneOperator)
+    bpy.utils.unregister_class(UvLayoutBoxOperator)
     
     del bpy.types.Scene.kitfox_uv_plane_layout_props
 
@@ -16,6 +16,7 @@
 import bpy
 import bpy.utils.previews
 import os
+from .profiler import profiler
 
 preview_collections = {}
 
@@ -51,9 +52,20 @@ class UvBrushPanel(bpy.types.Panel):
         col = layout.column();
         col.operator("kitfox.uv_brush_operator", text="Uv Brush", icon_value = pcoll["uvBrush"].icon_id)
         
-        col.prop(settings, "radius")
+        col.prop(settings, "mode", expand = True)
+        if settings.mode == 'RELAX':
+            col.prop(settings, "relax_iterations")
+        col.prop(settings, "radius_mode", expand = True)
+        if settings.radius_mode == 'SCREEN':
+            col.prop(settings, "screen_radius")
+        else:
+            col.prop(settings, "radius")
         col.prop(settings, "strength")
         col.prop(settings, "use_pressure")
+        col.prop(settings, "mirror", expand = True)
+        col.prop(settings, "falloff")
+        if settings.falloff == 'CUSTOM':
+            col.prop(settings, "falloff_points", text = "")
 
         layout.separator()
 
@@ -90,9 +102,13 @@ class UvPlaneProjectionPanel(bpy.types.Panel):
 
         col = layout.column();
         col.operator("kitfox.uv_plane_layout_op", text="Uv Plane Project", icon_value = pcoll["uvBrush"].icon_id)
+        col.operator("kitfox.uv_box_layout_op", text="Uv Box Project")
         col.prop(planeLayout_props, "selected_faces_only")
         col.prop(planeLayout_props, "clamp_to_basis")
         col.prop(planeLayout_props, "clamp_scalar")
+        col.prop(planeLayout_props, "use_preview")
+        if planeLayout_props.use_preview:
+            col.prop(planeLayout_props, "preview_density")
         col.label(text = "Starting Layout:")
         col.prop(planeLayout_props, "init_layout", expand = True)
         if planeLayout_props.init_layout == 'FACE':
@@ -215,6 +231,48 @@ class UvToolsPanel(bpy.types.Panel):
         col = layout.column();
         col.prop(bpy.context.scene.tool_settings, "use_transform_correct_face_attributes")
         
+        time_slice_props = scene.kitfox_time_slice_props
+        col.prop(time_slice_props, "enabled")
+        if time_slice_props.enabled:
+            col.prop(time_slice_props, "min_faces")
+            col.prop(time_slice_props, "budget_ms")
+        
+#---------------------------
+
+class ProfilerPanel(bpy.types.Panel):
+
+    """Timings and counters recorded for the UV tools"""
+    bl_label = "Profiling"
+    bl_idname = "OBJECT_PT_kitfox_uv_profiling"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "Kitfox - UV"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw(self, context):
+        layout = self.layout
+
+        props = context.scene.kitfox_profiler_props
+        
+        col = layout.column();
+        col.prop(props, "enabled")
+        col.prop(props, "log_path")
+        row = col.row()
+        row.operator("kitfox.profiler_export", text="Export")
+        row.operator("kitfox.profiler_clear", text="Clear")
+        col.prop(props, "show_records")
+        
+        #Most recent first
+        for record in reversed(profiler.records[-props.show_records:] if props.show_records > 0 else []):
+            box = layout.box()
+            box.label(text = "%s: %.1f ms" % (record.name, record.total * 1000))
+            
+            sub = box.column(align = True)
+            for key, value in record.phases.items():
+                sub.label(text = "  %s: %.1f ms" % (key, value * 1000))
+            for key, value in record.counters.items():
+                sub.label(text = "  %s: %d" % (key, value))
+        
 #---------------------------
 
 
@@ -253,6 +311,7 @@ def register():
     bpy.utils.register_class(CopySymmetricUvsPanel)
     bpy.utils.register_class(TriplanarUnwrapPanel)
     bpy.utils.register_class(UvToolsPanel)
+    bpy.utils.register_class(ProfilerPanel)
     
     #Register menus
     bpy.types.VIEW3D_MT_uv_map.append(menu_start_uvBrush)
@@ -267,6 +326,7 @@ def unregister():
     bpy.utils.unregister_class(CopySymmetricUvsPanel)
     bpy.utils.unregister_class(TriplanarUnwrapPanel)
     bpy.utils.unregister_class(UvToolsPanel)
+    bpy.utils.unregister_class(ProfilerPanel)
 
     #Unregister menus
     bpy.types.VIEW3D_MT_uv_map.remove(menu_start_uvBrush)
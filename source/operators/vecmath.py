@@ -15,6 +15,7 @@
 
 import mathutils
 import math
+import numpy as np
 from bpy_extras import view3d_utils
 from enum import Enum
 
@@ -702,7 +703,183 @@ def intersect_triangle(p0, p1, p2, pickOrigin, pickRay):
     
     return hitPoint
 
+
+
+#---------------------------
+#Array versions of the helpers above.  Each takes (N, 3) arrays and processes N points, 
+# lines or triangles per call.  Arguments that are shared by every item can be passed as a
+# single (3,) vector.  Results match the scalar versions, with NaN standing in for None.
+
+def _dot(a, b):
+    return (a * b).sum(axis = -1)
+
+#Returns array of scalars s so that line_point + s * line_dir lies on plane.  NaN where the 
+# line is parallel to the plane.
+def isect_line_plane_array(line_point, line_dir, plane_point, plane_norm):
+    line_point, line_dir, plane_point, plane_norm = np.broadcast_arrays(
+        np.asarray(line_point, dtype=np.float64), np.asarray(line_dir, dtype=np.float64), 
+        np.asarray(plane_point, dtype=np.float64), np.asarray(plane_norm, dtype=np.float64))
+    
+    denom = _dot(line_dir, plane_norm)
+    parallel = denom == 0
+    
+    s = np.full(denom.shape, np.nan)
+    s[~parallel] = _dot(plane_point - line_point, plane_norm)[~parallel] / denom[~parallel]
+    return s
+
+#Points moved along plane_norm onto the plane.  Points are unchanged where the normal is zero.
+def project_points_onto_plane(point, plane_pt, plane_norm):
+    point = np.asarray(point, dtype=np.float64)
+    plane_norm = np.asarray(plane_norm, dtype=np.float64)
+    
+    nn = _dot(plane_norm, plane_norm)
+    nn = np.where(nn == 0, 1, nn)
+    s = _dot(point - plane_pt, plane_norm) / nn
+    return point - s[..., None] * plane_norm
+
+#Returns (N, 3) array of coefficients [a, b, c] such that vec = a * v0 + b * v1 + c * v2.
+# Rows whose basis has a zero determinant get zero coefficients.  Determinants within rounding 
+# error of zero count as zero, since dependent vectors rarely give exactly zero in double precision.
+def express_in_basis_array(vec, v0, v1, v2):
+    vec, v0, v1, v2 = np.broadcast_arrays(np.asarray(vec, dtype=np.float64), 
+        np.asarray(v0, dtype=np.float64), np.asarray(v1, dtype=np.float64), np.asarray(v2, dtype=np.float64))
+    
+    #Basis vectors are the columns
+    basis = np.stack((v0, v1, v2), axis = -1).reshape(-1, 3, 3)
+    vec = vec.reshape(-1, 3)
+    
+    scale = np.linalg.norm(basis, axis = 1).prod(axis = 1)
+    valid = np.abs(np.linalg.det(basis)) > scale * 1e-12
+    
+    coeffs = np.zeros(vec.shape)
+    if valid.any():
+        coeffs[valid] = np.linalg.solve(basis[valid], vec[valid][:, :, None])[:, :, 0]
+    return coeffs.reshape(v0.shape)
+
+#Round each point to the nearest multiple of unit
+def snap_to_grid_array(pos, unit):
+    return np.floor(np.asarray(pos, dtype=np.float64) / unit + .5) * unit
+
+#Returns array of the index (0, 1 or 2) of the axis each vector is most closely aligned with.
+# Ties are resolved the same way as closest_axis().
+def closest_axis_array(vector):
+    a = np.abs(np.asarray(vector))
+    use_x = (a[..., 0] > a[..., 1]) & (a[..., 0] > a[..., 2])
+    use_y = ~use_x & (a[..., 1] > a[..., 2])
+    
+    axis = np.full(a.shape[:-1], 2, dtype=np.int8)
+    axis[use_x] = 0
+    axis[use_y] = 1
+    return axis
+
+#Intersect a ray with N triangles.
+#Returns (hit, points) where hit is a boolean mask of the triangles that were hit and points 
+# are the hit positions.  points is NaN for triangles that were missed.
+def intersect_triangle_array(p0, p1, p2, pickOrigin, pickRay):
+    p0 = np.asarray(p0, dtype=np.float64)
+    p1 = np.asarray(p1, dtype=np.float64)
+    p2 = np.asarray(p2, dtype=np.float64)
+    
+    v10 = p1 - p0
+    v20 = p2 - p0
+    v21 = p2 - p1
+    norm = np.cross(v10, v20)
+    
+    #Degenerate triangles have no plane to hit
+    length = np.linalg.norm(norm, axis = -1)
+    degenerate = length == 0
+    norm = norm / np.where(degenerate, 1, length)[..., None]
+    
+    scalar = isect_line_plane_array(pickOrigin, pickRay, p0, norm)
+    scalar[degenerate] = np.nan
+    
+    hitPoint = np.asarray(pickOrigin, dtype=np.float64) + scalar[..., None] * np.asarray(pickRay, dtype=np.float64)
+    
+    vh0 = hitPoint - p0
+    vh1 = hitPoint - p1
+    v01 = -v10
+    
+    hit = ~np.isnan(scalar)
+    with np.errstate(invalid = 'ignore'):
+        hit &= _dot(np.cross(vh0, v20), np.cross(v10, v20)) >= 0
+        hit &= _dot(np.cross(vh0, v10), np.cross(v20, v10)) >= 0
+        hit &= _dot(np.cross(vh1, v21), np.cross(v01, v21)) >= 0
+    
+    hitPoint[~hit] = np.nan
+    return (hit, hitPoint)
+
+#Spread the low 10 bits of each value so there are two zero bits between each of them
+def _spread_bits(v):
+    v = v & 0x3ff
+    v = (v | (v << 16)) & 0x030000ff
+    v = (v | (v << 8)) & 0x0300f00f
+    v = (v | (v << 4)) & 0x030c30c3
+    v = (v | (v << 2)) & 0x09249249
+    return v
+
+#Order of an (N, 3) array of points along a Morton curve through their bounds.  Points close 
+# together in the ordering are close together in space, so taking every k-th point of the 
+# ordering gives an evenly spread sample.
+def spatial_order(points):
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) == 0:
+        return np.zeros(0, dtype=np.int64)
+        
+    lo = points.min(axis = 0)
+    extent = points.max(axis = 0) - lo
+    extent[extent == 0] = 1
+    cells = ((points - lo) / extent * 1023).astype(np.int64)
+    
+    code = _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << 1) | (_spread_bits(cells[:, 2]) << 2)
+    return np.argsort(code, kind = 'stable')
+
+    
+#Find all pairs of points closer than epsilon.
+# points - (N, 3) array of points to search
+# queries - (M, 3) array of points to search around
+#Returns (query_idx, point_idx) arrays listing every pair where |queries[q] - points[p]| < epsilon
+def find_point_pairs_within(points, queries, epsilon):
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+    if epsilon <= 0 or len(points) == 0 or len(queries) == 0:
+        return empty
+        
+    #Hash points into cells of size epsilon so each query only has to check neighboring cells
+    def cell_key(cells):
+        return (cells[:, 0] * 73856093) ^ (cells[:, 1] * 19349663) ^ (cells[:, 2] * 83492791)
+        
+    point_cells = np.floor(points / epsilon).astype(np.int64)
+    keys = cell_key(point_cells)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    
+    query_cells = np.floor(queries / epsilon).astype(np.int64)
+    
+    query_idx = []
+    point_idx = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            for dz in (-1, 0, 1):
+                q_keys = cell_key(query_cells + np.array((dx, dy, dz), dtype=np.int64))
+                lo = np.searchsorted(sorted_keys, q_keys, 'left')
+                hi = np.searchsorted(sorted_keys, q_keys, 'right')
+                count = hi - lo
+                
+                q = np.repeat(np.arange(len(queries)), count)
+                offset = np.arange(len(q)) - np.repeat(np.cumsum(count) - count, count)
+                query_idx.append(q)
+                point_idx.append(order[np.repeat(lo, count) + offset])
+    
+    query_idx = np.concatenate(query_idx)
+    point_idx = np.concatenate(point_idx)
     
+    #Different cells may hash to the same key, so drop duplicates and check real distance
+    pairs = np.unique(np.stack((query_idx, point_idx), axis = 1), axis = 0)
+    query_idx = pairs[:, 0]
+    point_idx = pairs[:, 1]
+    
+    dist = np.linalg.norm(queries[query_idx] - points[point_idx], axis = 1)
+    close = dist < epsilon
+    return (query_idx[close], point_idx[close])
 
 
 class Bounds:
@@ -719,84 +896,27 @@ class Bounds:
         self.maxBound.z = max(self.maxBound.z, point.z)
     
     def include_bounds(self, bounds):
-        include_point(bounds.minBound)
-        include_point(bounds.maxBound)
-    
-    
-def mesh_bounds(obj, world = True, selected_faces_only = False):
-    
-    bounds = None
-
-    # minCo = None
-    # maxCo = None
-    mesh = obj.data
-
-    for p in mesh.polygons:
-        if selected_faces_only and not p.select:
-            continue
-            
-        for vIdx in p.vertices:
-            v = mesh.vertices[vIdx]
-            pos = mathutils.Vector(v.co)
-            
-            if world:
-                pos = obj.matrix_world @ pos
-                
-            if bounds == None:
-                bounds = Bounds(pos)
-            else:
-                bounds.include_point(pos)
-
-    
-    # for v in mesh.vertices:
-        # pos = mathutils.Vector(v.co)
-        # if world:
-            # pos = obj.matrix_world @ pos
-    
-        # if bounds == None:
-            # bounds = Bounds(pos)
-        # else:
-            # bounds.include_point(pos)
-    
-            
-    return bounds
-
+        self.include_point(bounds.minBound)
+        self.include_point(bounds.maxBound)
     
     
-def bmesh_bounds(obj, bmesh, world = True, selected_faces_only = False):
-
-    bounds = None
-    
-    for f in bmesh.faces:
-        if selected_faces_only and not p.select:
-            continue
-
-        for v in f.verts:
-            pos = mathutils.Vector(v.co)
-            if world:
-                pos = obj.matrix_world @ pos
+#Axis aligned bounds of an (N, 3) array of points, optionally transformed by a 4x4 matrix first.
+#Returns (min, max) numpy arrays, or None if there are no points.
+def points_bounds(points, matrix = None):
+    if len(points) == 0:
+        return None
         
-            if bounds == None:
-                bounds = Bounds(pos)
-            else:
-                bounds.include_point(pos)
-
-    
-    # for v in bmesh.verts:
-        # pos = mathutils.Vector(v.co)
-        # if world:
-            # pos = obj.matrix_world @ pos
-    
-# #            print("pos " + str(pos))
-
-        # if bounds == None:
-            # bounds = Bounds(pos)
-        # else:
-            # bounds.include_point(pos)
-     
-    return bounds
+    if matrix is not None:
+        m = np.array(matrix, dtype=np.float64).reshape(4, 4)
+        points = points @ m[:3, :3].T + m[:3, 3]
+        
+    return (points.min(axis = 0), points.max(axis = 0))
 
+#Smallest bounds containing both bounds.  Either may be None.
+def union_bounds(b0, b1):
+    if b0 == None:
+        return b1
+    if b1 == None:
+        return b0
+    return (np.minimum(b0[0], b1[0]), np.maximum(b0[1], b1[1]))
 
-    
-    
-    
@@ -0,0 +1,40 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#Runs the tests in the test*.py files of this directory.
+#
+#Run from the root of the repository with
+#
+#   blender --background --factory-startup --python test/runTests.py -- [pattern]
+#
+#pattern limits the run to matching test files, eg testVecmath.py.  Blender exits with a
+# non-zero status if any test fails.
+
+import bpy
+import sys
+import os
+import unittest
+
+if __name__ == '__main__':
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    pattern = argv[0] if len(argv) > 0 else "test*.py"
+
+    test_dir = os.path.dirname(os.path.abspath(__file__))
+    if test_dir not in sys.path:
+        sys.path.insert(0, test_dir)
+
+    suite = unittest.defaultTestLoader.discover(test_dir, pattern = pattern)
+    result = unittest.TextTestRunner(verbosity = 2).run(suite)
+    sys.exit(0 if result.wasSuccessful() else 1)
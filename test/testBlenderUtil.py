@@ -0,0 +1,86 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import bpy
+import unittest
+import numpy as np
+from mathutils import Vector, Matrix
+from testUtil import *
+
+blenderUtil = load_addon_module("blenderUtil")
+
+
+#Per vertex bounds of the vertices of selected faces
+def mesh_bounds_reference(obj, matrix, selected_faces_only):
+    mesh = obj.data
+    points = []
+    for p in mesh.polygons:
+        if selected_faces_only and not p.select:
+            continue
+        for v_idx in p.vertices:
+            points.append(matrix @ Vector(mesh.vertices[v_idx].co))
+    return (np.min(points, axis = 0), np.max(points, axis = 0))
+
+
+class MeshBoundsTest(unittest.TestCase):
+    def setUp(self):
+        self.obj = create_test_object("mesh_bounds", seed = 2, select_fraction = .1)
+        self.obj.matrix_world = Matrix.Translation((3, -1, 2)) @ Matrix.Rotation(.7, 4, (1, 2, 3)) @ Matrix.Diagonal((2, 1, .5, 1))
+
+    def tearDown(self):
+        remove_object(self.obj)
+
+    def check(self, result, expected):
+        np.testing.assert_allclose(result[0], expected[0], atol = 1e-5)
+        np.testing.assert_allclose(result[1], expected[1], atol = 1e-5)
+
+    def test_world(self):
+        self.check(blenderUtil.mesh_bounds(self.obj), mesh_bounds_reference(self.obj, self.obj.matrix_world, False))
+
+    def test_local_selected(self):
+        result = blenderUtil.mesh_bounds(self.obj, world = False, selected_faces_only = True)
+        self.check(result, mesh_bounds_reference(self.obj, Matrix(), True))
+
+    def test_matrix_selected(self):
+        matrix = Matrix.Rotation(.3, 4, 'Z')
+        result = blenderUtil.mesh_bounds(self.obj, selected_faces_only = True, matrix = matrix)
+        self.check(result, mesh_bounds_reference(self.obj, matrix, True))
+
+
+class RedrawSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = blenderUtil.RedrawScheduler(max_rate = 1)
+        self.ran = []
+
+    def tearDown(self):
+        if bpy.app.timers.is_registered(self.scheduler.timer):
+            bpy.app.timers.unregister(self.scheduler.timer)
+
+    #A direct flush runs the pending update and cancels the timer, so a later request is 
+    # not lost waiting for a flush that already happened
+    def test_flush_cancels_timer(self):
+        self.scheduler.request_update("a", lambda: self.ran.append("a"))
+        self.scheduler.request_update("b", lambda: self.ran.append("b"))
+        self.assertEqual(self.ran, ["a"])
+        self.assertTrue(self.scheduler.scheduled)
+
+        self.scheduler.flush()
+        self.assertEqual(self.ran, ["a", "b"])
+        self.assertFalse(self.scheduler.scheduled)
+        self.assertFalse(bpy.app.timers.is_registered(self.scheduler.timer))
+
+        self.scheduler.request_update("c", lambda: self.ran.append("c"))
+        self.assertTrue(self.scheduler.scheduled)
+        self.assertTrue(bpy.app.timers.is_registered(self.scheduler.timer))
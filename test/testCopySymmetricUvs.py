@@ -0,0 +1,112 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import bpy
+import unittest
+import mathutils
+import numpy as np
+from testUtil import *
+
+copySymmetricUvs = load_addon_module("copySymmetricUvs")
+
+
+def setUpModule():
+    copySymmetricUvs.register()
+
+def tearDownModule():
+    copySymmetricUvs.unregister()
+
+
+#Loop of f1 at the mirror image of each loop of f0, from the original operator
+def find_loop_map_reference(f0, f1, xform, epsilon):
+    if len(f0.loops) != len(f1.loops):
+        return None
+
+    indices = []
+    for loop0 in f0.loops:
+        pos0 = xform @ loop0.vert.co
+        foundMatch = False
+        for loop1 in f1.loops:
+            if (pos0 - loop1.vert.co).magnitude < epsilon:
+                foundMatch = True
+                break
+
+        if not foundMatch:
+            return None
+        indices.append(loop1)
+    return indices
+
+#Per face loop of the original operator.  The original compared f0 with f1.loops, so faces 
+# lying across the axis were matched with themselves.  Here they are skipped as the array 
+# version does.
+def copy_symmetric_reference(bm, axisIdx, epsilon):
+    mMirror = mathutils.Matrix.Diagonal([-1 if i == axisIdx else 1 for i in range(3)])
+    axisVec = mathutils.Vector([1 if i == axisIdx else 0 for i in range(3)])
+    uv_layer = bm.loops.layers.uv.verify()
+
+    selectedFaces = [f for f in bm.faces if f.select]
+    for f0 in selectedFaces:
+        for f1 in bm.faces:
+            if f0 == f1:
+                continue
+
+            center0 = f0.calc_center_bounds()
+            center1 = f1.calc_center_bounds()
+            if (center0 - mMirror @ center1).magnitude > epsilon:
+                continue
+
+            #If both source face and reflection are selected, copy from positive side of axis to negative
+            if f1.select and axisVec.dot(center1) > 0:
+                continue
+
+            loopMap = find_loop_map_reference(f0, f1, mMirror, epsilon)
+            if loopMap == None:
+                continue
+
+            for i in range(len(loopMap)):
+                loopMap[i][uv_layer].uv = f0.loops[i][uv_layer].uv
+
+
+class CopySymmetricUvsTest(unittest.TestCase):
+    def setUp(self):
+        #Odd number of columns puts a row of faces across each axis
+        self.obj = create_test_object("copy_symmetric", segs = 9, seed = 8)
+        make_active(self.obj)
+
+    def tearDown(self):
+        remove_object(self.obj)
+
+    def check(self, axis):
+        props = bpy.context.scene.kitfox_copy_symmetric_uvs
+        props.axis = axis
+
+        bm = mesh_to_bmesh(self.obj)
+        copy_symmetric_reference(bm, "XYZ".index(axis), props.epsilon)
+        expected = bmesh_uvs(bm)
+        bm.free()
+
+        original = read_uvs(self.obj)
+        result = bpy.ops.kitfox.copy_symmetric_uvs()
+        self.assertIn('FINISHED', result)
+
+        uvs = read_uvs(self.obj)
+        self.assertFalse(np.allclose(uvs, original))
+        np.testing.assert_allclose(uvs, expected, atol = 1e-6)
+
+    def test_x_axis(self):
+        self.check('X')
+
+    def test_y_axis(self):
+        self.check('Y')
@@ -0,0 +1,169 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import math
+import numpy as np
+from mathutils import Vector, Matrix
+from testUtil import *
+
+facesToGrid = load_addon_module("facesToGrid")
+meshUvBuffer = load_addon_module("meshUvBuffer")
+blenderUtil = load_addon_module("blenderUtil")
+timeSlice = load_addon_module("timeSlice")
+ShiftType = facesToGrid.ShiftType
+
+
+#Per face shift of the original shift_face_uvs().  Returns the new value of each loop.
+def shift_face_uvs_reference(values, loop_start, loop_total, shift_type):
+    result = list(values)
+    for start, num_uvs in zip(loop_start.tolist(), loop_total.tolist()):
+        uvs = values[start:start + num_uvs]
+        for i in range(num_uvs):
+            if shift_type == ShiftType.CW:
+                iNext = i + 1 if i < num_uvs - 1 else 0
+            elif shift_type == ShiftType.CCW:
+                iNext = i - 1 if i > 0 else num_uvs - 1
+            else:
+                iNext = num_uvs - 1 - i
+
+            result[start + i] = uvs[iNext]
+    return result
+
+
+class ShiftPermutationTest(unittest.TestCase):
+    def check(self, shift_type):
+        rng = np.random.default_rng(3)
+        loop_start, loop_total = random_face_ranges(rng, 300)
+        faces = np.flatnonzero(rng.random(300) < .5)
+
+        values = np.arange(int(loop_total.sum()))
+        dst, src = facesToGrid.shift_permutation(loop_start[faces], loop_total[faces], shift_type)
+        result = values.copy()
+        result[dst] = values[src]
+
+        expected = shift_face_uvs_reference(values.tolist(), loop_start[faces], loop_total[faces], shift_type)
+        self.assertEqual(result.tolist(), expected)
+
+    def test_cw(self):
+        self.check(ShiftType.CW)
+
+    def test_ccw(self):
+        self.check(ShiftType.CCW)
+
+    def test_reverse(self):
+        self.check(ShiftType.REVERSE)
+
+
+#Per face loop of the original Face Uvs to Grid operator, applied to the selected faces of bm
+def fit_faces_to_grid_reference(bm, grid_cells_x, grid_cells_y, winding):
+    uv_layer = bm.loops.layers.uv.verify()
+
+    for face in bm.faces:
+        if face.select:
+            uvCenter = Vector((0, 0))
+            for loop in face.loops:
+                uvCenter += Vector(loop[uv_layer].uv)
+            uvCenter *= 1.0 / len(face.loops)
+
+            cell_x = int((uvCenter.x - math.floor(uvCenter.x)) * grid_cells_x)
+            cell_y = int((uvCenter.y - math.floor(uvCenter.y)) * grid_cells_y)
+
+            uvDir = face.loops[0][uv_layer].uv - uvCenter
+            uvDirSign = Vector((-1 if uvDir.x < 0 else 1, -1 if uvDir.y < 0 else 1))
+
+            area = 0
+            for i in range(len(face.loops)):
+                uv0 = face.loops[i][uv_layer].uv
+                uv1 = face.loops[0 if i == len(face.loops) - 1 else i + 1][uv_layer].uv
+                area += uv0.x * uv1.y - uv0.y * uv1.x
+
+            mT = Matrix.Translation((1, 1, 0))
+            mS = Matrix.Diagonal((1.0 / (grid_cells_x * 2), 1.0 / (grid_cells_y * 2), 1, 1))
+            mT2 = Matrix.Translation((cell_x / grid_cells_x, cell_y / grid_cells_y, 0))
+            mUvXlate = mT2 @ mS @ mT
+
+            for i in range(len(face.loops)):
+                uvPos = mUvXlate @ uvDirSign.to_4d()
+                face.loops[i][uv_layer].uv = uvPos.to_2d()
+
+                ccw = (winding == 'KEEP' and area >= 0) or winding == 'CCW'
+                if ccw:
+                    tmp = uvDirSign.y
+                    uvDirSign.y = uvDirSign.x
+                    uvDirSign.x = -tmp
+                else:
+                    tmp = uvDirSign.x
+                    uvDirSign.x = uvDirSign.y
+                    uvDirSign.y = -tmp
+
+
+class FitFacesToGridTest(unittest.TestCase):
+    def setUp(self):
+        self.obj = create_test_object("fit_faces_to_grid", seed = 4)
+
+    def tearDown(self):
+        remove_object(self.obj)
+
+    def check(self, grid_cells_x, grid_cells_y, winding):
+        bm = mesh_to_bmesh(self.obj)
+        fit_faces_to_grid_reference(bm, grid_cells_x, grid_cells_y, winding)
+        expected = bmesh_uvs(bm)
+        bm.free()
+
+        buffer = meshUvBuffer.MeshUvBuffer(self.obj)
+        facesToGrid.fit_faces_to_grid(buffer, buffer.face_mask(), grid_cells_x, grid_cells_y, winding)
+        np.testing.assert_allclose(buffer.uvs, expected, atol = 1e-5)
+
+    def test_keep_winding(self):
+        self.check(1, 1, 'KEEP')
+
+    def test_ccw(self):
+        self.check(4, 3, 'CCW')
+
+    def test_cw(self):
+        self.check(2, 5, 'CW')
+
+
+class FitFacesToGridStepsTest(unittest.TestCase):
+    #Enough faces to be processed in more than one chunk
+    def setUp(self):
+        self.obj = create_test_object("fit_faces_to_grid_steps", segs = 230, seed = 9, select_fraction = 1)
+
+    def tearDown(self):
+        remove_object(self.obj)
+
+    def test_matches_reference(self):
+        self.assertGreater(len(self.obj.data.polygons), timeSlice.CHUNK_FACES)
+
+        bm = mesh_to_bmesh(self.obj)
+        fit_faces_to_grid_reference(bm, 3, 2, 'KEEP')
+        expected = bmesh_uvs(bm)
+        bm.free()
+
+        original = read_uvs(self.obj)
+        steps = facesToGrid.fit_faces_to_grid_steps([blenderUtil.MeshGroup(self.obj)], 3, 2, 'KEEP')
+
+        #Mesh must not change until the last step so cancelling leaves it untouched
+        progress = []
+        for p in steps:
+            if p < 1:
+                np.testing.assert_array_equal(read_uvs(self.obj), original)
+            progress.append(p)
+
+        self.assertGreater(len(progress), 2)
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], 1)
+        np.testing.assert_allclose(read_uvs(self.obj), expected, atol = 1e-5)
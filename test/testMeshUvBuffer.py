@@ -0,0 +1,102 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import bpy
+import bmesh
+import numpy as np
+from testUtil import *
+
+meshUvBuffer = load_addon_module("meshUvBuffer")
+
+
+#Per face loop the array version replaces
+def face_loop_ranges_reference(loop_start, loop_total):
+    loop_idx = []
+    corner = []
+    face_len = []
+    for start, total in zip(loop_start.tolist(), loop_total.tolist()):
+        for i in range(total):
+            loop_idx.append(start + i)
+            corner.append(i)
+            face_len.append(total)
+    return (loop_idx, corner, face_len)
+
+
+class FaceLoopRangesTest(unittest.TestCase):
+    def check(self, loop_start, loop_total):
+        result = meshUvBuffer.face_loop_ranges(loop_start, loop_total)
+        expected = face_loop_ranges_reference(np.asarray(loop_start), np.asarray(loop_total))
+        for r, e in zip(result, expected):
+            self.assertEqual(r.tolist(), e)
+
+    def test_all_faces(self):
+        rng = np.random.default_rng(1)
+        loop_start, loop_total = random_face_ranges(rng, 200)
+        self.check(loop_start, loop_total)
+
+    def test_subset_of_faces(self):
+        rng = np.random.default_rng(2)
+        loop_start, loop_total = random_face_ranges(rng, 200)
+        faces = np.flatnonzero(rng.random(200) < .3)
+        self.check(loop_start[faces], loop_total[faces])
+
+    def test_no_faces(self):
+        self.check(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+
+
+class EditModeTest(unittest.TestCase):
+    def setUp(self):
+        self.obj = create_test_object("edit_mode_buffer", seed = 3)
+        make_active(self.obj)
+        bpy.ops.object.mode_set(mode = 'EDIT')
+
+    def tearDown(self):
+        bpy.ops.object.mode_set(mode = 'OBJECT')
+        remove_object(self.obj)
+
+    def edit_uvs(self):
+        bm = bmesh.from_edit_mesh(self.obj.data)
+        return bmesh_uvs(bm)
+
+    def test_read_and_commit(self):
+        buffer = meshUvBuffer.MeshUvBuffer(self.obj)
+        self.assertTrue(buffer.edit_mode)
+        np.testing.assert_array_equal(buffer.uvs, self.edit_uvs())
+
+        faces = buffer.face_mask()
+        loop_idx, corner, face_len = buffer.face_loops(faces)
+        buffer.uvs[loop_idx] += (.5, -.25)
+        expected = buffer.uvs.copy()
+        buffer.commit(faces)
+
+        np.testing.assert_array_equal(self.edit_uvs(), expected)
+
+    def test_stale_after_edit(self):
+        buffer = meshUvBuffer.MeshUvBuffer(self.obj)
+        self.assertFalse(buffer.is_stale())
+
+        bm = bmesh.from_edit_mesh(self.obj.data)
+        bm.faces.ensure_lookup_table()
+        bmesh.ops.delete(bm, geom = [bm.faces[0]], context = 'FACES')
+        bmesh.update_edit_mesh(self.obj.data)
+        self.assertTrue(buffer.is_stale())
+
+    def test_stale_after_mode_toggle(self):
+        buffer = meshUvBuffer.MeshUvBuffer(self.obj)
+        bpy.ops.object.mode_set(mode = 'OBJECT')
+        self.assertTrue(buffer.is_stale())
+        bpy.ops.object.mode_set(mode = 'EDIT')
+        self.assertTrue(buffer.is_stale())
@@ -0,0 +1,116 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+#Helpers shared by the tests
+
+import bpy
+import bmesh
+import sys
+import os
+import importlib
+import numpy as np
+
+
+#Import addon modules directly from the source tree so the addon does not need to be installed
+def load_addon_module(name):
+    source_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "source")
+    if source_dir not in sys.path:
+        sys.path.insert(0, source_dir)
+    return importlib.import_module("operators." + name)
+
+#Random face sizes and the loop ranges they occupy.  Returns (loop_start, loop_total).
+def random_face_ranges(rng, num_faces, max_corners = 7):
+    loop_total = rng.integers(3, max_corners + 1, num_faces).astype(np.int32)
+    loop_start = (np.cumsum(loop_total) - loop_total).astype(np.int32)
+    return (loop_start, loop_total)
+
+
+#---------------------------
+#Mesh objects
+
+#Grid of segs x segs quads from -1 to 1 on the x and y axes.  Every third quad is split into triangles
+# and some pairs of neighboring quads are merged into n-gons.  Loops get random uvs and a
+# random set of faces is selected.
+def create_test_object(name, segs = 9, seed = 0, select_fraction = .6):
+    rng = np.random.default_rng(seed)
+
+    bm = bmesh.new()
+    bm.loops.layers.uv.new()
+    bmesh.ops.create_grid(bm, x_segments = segs, y_segments = segs, size = 1)
+    bm.faces.ensure_lookup_table()
+
+    #Place vertices exactly symmetric about the axes so mirrored faces match exactly
+    for v in bm.verts:
+        v.co.x = (2 * round((v.co.x + 1) * segs / 2) - segs) / segs
+        v.co.y = (2 * round((v.co.y + 1) * segs / 2) - segs) / segs
+
+    tri_faces = []
+    merge_edges = []
+    for i, face in enumerate(bm.faces):
+        col = i % segs
+        if i % 3 == 0:
+            tri_faces.append(face)
+        elif i % 6 == 1 and col + 1 < segs:
+            neighbor = bm.faces[i + 1]
+            for edge in face.edges:
+                if neighbor in edge.link_faces:
+                    merge_edges.append(edge)
+                    break
+
+    bmesh.ops.triangulate(bm, faces = tri_faces)
+    bmesh.ops.dissolve_edges(bm, edges = merge_edges)
+
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    uvs = rng.uniform(-1.5, 2.5, len(mesh.loops) * 2)
+    mesh.uv_layers.active.data.foreach_set("uv", uvs)
+    mesh.polygons.foreach_set("select", rng.random(len(mesh.polygons)) < select_fraction)
+    mesh.update()
+
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+def remove_object(obj):
+    mesh = obj.data
+    bpy.data.objects.remove(obj)
+    bpy.data.meshes.remove(mesh)
+
+def make_active(obj):
+    for o in bpy.context.view_layer.objects:
+        o.select_set(False)
+    obj.select_set(True)
+    bpy.context.view_layer.objects.active = obj
+
+#Uvs of the active uv layer as an (N, 2) array
+def read_uvs(obj):
+    mesh = obj.data
+    uvs = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+    mesh.uv_layers.active.data.foreach_get("uv", uvs)
+    return uvs.reshape(-1, 2)
+
+#Bmesh copy of the object's mesh, for the per face reference implementations
+def mesh_to_bmesh(obj):
+    bm = bmesh.new()
+    bm.from_mesh(obj.data)
+    bm.faces.ensure_lookup_table()
+    return bm
+
+#Uvs of a bmesh in mesh loop order as an (N, 2) array
+def bmesh_uvs(bm):
+    uv_layer = bm.loops.layers.uv.verify()
+    return np.array([tuple(loop[uv_layer].uv) for face in bm.faces for loop in face.loops], dtype=np.float64)
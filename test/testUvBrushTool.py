@@ -0,0 +1,69 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import bpy
+import bmesh
+from mathutils import Matrix
+from testUtil import *
+
+uvBrushTool = load_addon_module("uvBrushTool")
+
+
+class BrushStrokeSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.obj = create_test_object("brush_session", seed = 5)
+        make_active(self.obj)
+
+    def tearDown(self):
+        if self.obj.mode != 'OBJECT':
+            bpy.ops.object.mode_set(mode = 'OBJECT')
+        remove_object(self.obj)
+
+    def create_session(self):
+        return uvBrushTool.BrushStrokeSession(self.obj, uvBrushTool.BrushMeshData(self.obj))
+
+    def test_object_mode(self):
+        session = self.create_session()
+        self.assertTrue(session.matches())
+
+        self.obj.matrix_world = Matrix.Translation((1, 0, 0))
+        self.assertFalse(session.matches())
+
+        session = self.create_session()
+        bm = mesh_to_bmesh(self.obj)
+        bmesh.ops.delete(bm, geom = [bm.faces[0]], context = 'FACES_ONLY')
+        bm.to_mesh(self.obj.data)
+        bm.free()
+        self.assertFalse(session.matches())
+
+    #Edits made between strokes without leaving edit mode
+    def test_edit_mode_topology(self):
+        bpy.ops.object.mode_set(mode = 'EDIT')
+        session = self.create_session()
+        self.assertTrue(session.matches())
+
+        bm = bmesh.from_edit_mesh(self.obj.data)
+        bmesh.ops.subdivide_edges(bm, edges = bm.edges[:4], cuts = 1)
+        bmesh.update_edit_mesh(self.obj.data)
+        self.assertFalse(session.matches())
+
+    def test_edit_mode_toggle(self):
+        bpy.ops.object.mode_set(mode = 'EDIT')
+        session = self.create_session()
+
+        bpy.ops.object.mode_set(mode = 'OBJECT')
+        bpy.ops.object.mode_set(mode = 'EDIT')
+        self.assertFalse(session.matches())
@@ -0,0 +1,208 @@
+# This file is part of the Kitfox Normal Brush distribution (https://github.com/blackears/blenderUvTools).
+# Copyright (c) 2021 Mark McKay
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+import numpy as np
+from mathutils import Vector
+from testUtil import *
+
+vecmath = load_addon_module("vecmath")
+
+
+class FindPointPairsWithinTest(unittest.TestCase):
+    #Compare every query with every point
+    def check(self, points, queries, epsilon):
+        query_idx, point_idx = vecmath.find_point_pairs_within(points, queries, epsilon)
+        result = sorted(zip(query_idx.tolist(), point_idx.tolist()))
+        
+        expected = []
+        for q in range(len(queries)):
+            for p in range(len(points)):
+                if np.linalg.norm(queries[q] - points[p]) < epsilon:
+                    expected.append((q, p))
+        self.assertEqual(result, expected)
+
+    def test_random_points(self):
+        rng = np.random.default_rng(5)
+        points = rng.uniform(-1, 1, (300, 3))
+        queries = rng.uniform(-1, 1, (200, 3))
+        self.check(points, queries, .15)
+
+    #Points a little either side of cell boundaries and several points in the same place
+    def test_clustered_points(self):
+        rng = np.random.default_rng(6)
+        epsilon = .1
+        centers = np.floor(rng.uniform(-5, 5, (40, 3))) * epsilon
+        points = np.repeat(centers, 3, axis = 0) + rng.normal(0, epsilon * .3, (120, 3))
+        queries = np.concatenate((points[::2], centers))
+        self.check(points, queries, epsilon)
+
+    def test_mirrored_points(self):
+        rng = np.random.default_rng(7)
+        points = rng.uniform(-1, 1, (100, 3))
+        points[:20, 0] = 0
+        self.check(points, points * (-1, 1, 1), 1e-4)
+
+    def test_empty(self):
+        points = np.zeros((0, 3))
+        self.check(points, np.ones((4, 3)), .1)
+        self.check(np.ones((4, 3)), points, .1)
+        self.check(np.ones((4, 3)), np.ones((4, 3)), 0)
+
+
+#Convert the result of a scalar helper to an array, with NaN standing in for None
+def as_array(value, size = 3):
+    if value == None:
+        return np.full(size, np.nan)
+    return np.array(value, dtype=np.float64)
+
+def vectors(array):
+    return [Vector(v) for v in array.tolist()]
+
+
+class ArrayHelpersTest(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(10)
+
+    def random_vectors(self, n = 100):
+        return self.rng.uniform(-2, 2, (n, 3))
+
+    def test_isect_line_plane(self):
+        line_point, line_dir, plane_point, plane_norm = [self.random_vectors() for i in range(4)]
+        #Lines parallel to their plane
+        plane_norm[:10, :2] = 0
+        line_dir[:10, 2] = 0
+
+        result = vecmath.isect_line_plane_array(line_point, line_dir, plane_point, plane_norm)
+        for i, args in enumerate(zip(*[vectors(a) for a in (line_point, line_dir, plane_point, plane_norm)])):
+            s = vecmath.isect_line_plane(*args)
+            if i < 10:
+                self.assertTrue(np.isnan(result[i]))
+            elif s == None:
+                self.assertTrue(np.isnan(result[i]))
+            else:
+                self.assertAlmostEqual(result[i], s, delta = 1e-4 * max(1, abs(s)))
+
+    def test_project_points_onto_plane(self):
+        point, plane_pt, plane_norm = [self.random_vectors() for i in range(3)]
+        result = vecmath.project_points_onto_plane(point, plane_pt, plane_norm)
+        for i, args in enumerate(zip(*[vectors(a) for a in (point, plane_pt, plane_norm)])):
+            np.testing.assert_allclose(result[i], as_array(vecmath.project_point_onto_plane(*args)), atol = 1e-4)
+
+    #The scalar version returns NaN for a zero normal
+    def test_project_points_onto_zero_normal(self):
+        point = self.random_vectors(5)
+        result = vecmath.project_points_onto_plane(point, np.zeros(3), np.zeros(3))
+        np.testing.assert_array_equal(result, point)
+
+    def test_express_in_basis(self):
+        vec, v0, v1, v2 = [self.random_vectors() for i in range(4)]
+        #Bases with a zero determinant
+        v2[:10] = v0[:10] * 2
+        v1[10:20] = 0
+
+        result = vecmath.express_in_basis_array(vec, v0, v1, v2)
+        for i, args in enumerate(zip(*[vectors(a) for a in (vec, v0, v1, v2)])):
+            expected = as_array(vecmath.express_in_basis(*args))
+            if i < 20:
+                np.testing.assert_array_equal(result[i], 0)
+            np.testing.assert_allclose(result[i], expected, rtol = 1e-3, atol = 1e-3)
+
+    def test_snap_to_grid(self):
+        pos = self.random_vectors()
+        #Points exactly half way between grid lines
+        pos[:10] = np.floor(pos[:10] * 4) / 4 + .125
+        for unit in (1, .25, 3):
+            result = vecmath.snap_to_grid_array(pos, unit)
+            for i, p in enumerate(vectors(pos)):
+                np.testing.assert_allclose(result[i], as_array(vecmath.snap_to_grid(p, unit)), atol = 1e-5)
+
+    def test_closest_axis(self):
+        vec = self.random_vectors()
+        #Ties between axes
+        vec[:27] = [(x, y, z) for x in (0, 1, -1) for y in (0, 1, -1) for z in (0, 1, -1)]
+
+        result = vecmath.closest_axis_array(vec)
+        axes = [vecmath.Axis.X, vecmath.Axis.Y, vecmath.Axis.Z]
+        for i, v in enumerate(vectors(vec)):
+            self.assertEqual(axes[result[i]], vecmath.closest_axis(v))
+
+    def test_intersect_triangle(self):
+        p0, p1, p2 = [self.random_vectors() for i in range(3)]
+
+        #Aim at points well inside or well outside of each triangle so single precision
+        # rounding in the scalar version cannot change the result
+        weights = self.rng.uniform(.1, 1, (100, 3))
+        weights[::2, 0] = -weights[::2, 0]
+        weights /= weights.sum(axis = 1)[:, None]
+        target = weights[:, 0, None] * p0 + weights[:, 1, None] * p1 + weights[:, 2, None] * p2
+        origin = np.array((0, 0, 10))
+
+        for i, args in enumerate(zip(*[vectors(a) for a in (p0, p1, p2)])):
+            ray = target[i] - origin
+            hit, points = vecmath.intersect_triangle_array(p0[i:i + 1], p1[i:i + 1], p2[i:i + 1], origin, ray)
+            expected = vecmath.intersect_triangle(*args, Vector(origin), Vector(ray))
+
+            self.assertEqual(bool(hit[0]), expected != None)
+            np.testing.assert_allclose(points[0], as_array(expected), rtol = 1e-4, atol = 1e-4)
+
+    #The scalar version returns a NaN point for a triangle with no area
+    def test_intersect_degenerate_triangle(self):
+        p0 = np.zeros((1, 3))
+        p1 = np.array(((1, 0, 0),))
+        hit, points = vecmath.intersect_triangle_array(p0, p1, p1 * 2, (0, 0, 1), (0, 0, -1))
+        self.assertFalse(hit[0])
+        self.assertTrue(np.isnan(points[0]).all())
+
+
+#Morton code of a single point, built one bit at a time
+def morton_code_reference(cell):
+    code = 0
+    for bit in range(10):
+        for axis in range(3):
+            code |= ((cell[axis] >> bit) & 1) << (bit * 3 + axis)
+    return code
+
+
+class SpatialOrderTest(unittest.TestCase):
+    def check(self, points):
+        order = vecmath.spatial_order(points)
+        self.assertEqual(sorted(order.tolist()), list(range(len(points))))
+
+        lo = points.min(axis = 0)
+        extent = points.max(axis = 0) - lo
+        extent[extent == 0] = 1
+        codes = []
+        for p in points:
+            cell = [int((p[axis] - lo[axis]) / extent[axis] * 1023) for axis in range(3)]
+            codes.append(morton_code_reference(cell))
+
+        expected = sorted(range(len(points)), key = lambda i: codes[i])
+        self.assertEqual(order.tolist(), expected)
+
+    def test_random_points(self):
+        rng = np.random.default_rng(11)
+        self.check(rng.uniform(-3, 5, (500, 3)))
+
+    #Flat meshes have no extent along one axis.  Repeated points keep their original order.
+    def test_flat_points(self):
+        rng = np.random.default_rng(12)
+        points = rng.uniform(-1, 1, (200, 3))
+        points[:, 2] = 4
+        points[100:] = points[:100]
+        self.check(points)
+
+    def test_empty(self):
+        self.assertEqual(len(vecmath.spatial_order(np.zeros((0, 3)))), 0)